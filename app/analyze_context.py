@@ -1,42 +1,45 @@
 import os
-import json
-from datetime import datetime
-from geopy.distance import geodesic
+import ipaddress
+from typing import List, Optional
 
-CONTEXT_CACHE_DIR = "context_cache"
-DEVICE_PROFILES_DIR = "device_profiles"
+from app.geo import geo_shift_scores
+from app.metrics import metrics
+from app.context_store import context_store, CONTEXT_CACHE_DIR, DEVICE_PROFILES_DIR
+from app.ip_index import get_ip_index
 
-# Ensure folders exist
-os.makedirs(CONTEXT_CACHE_DIR, exist_ok=True)
-os.makedirs(DEVICE_PROFILES_DIR, exist_ok=True)
+# Prefix length treated as "same subnet" for IPv6 when the IP index cannot
+# resolve an address (a typical customer site allocation)
+IPV6_SUBNET_PREFIX = int(os.environ.get("IPV6_SUBNET_PREFIX", "48"))
+
+# Sentinel: "not supplied, load it from the context store"
+_LOAD = object()
 
 
 def load_cached_context(user_id):
-    cache_path = os.path.join(CONTEXT_CACHE_DIR, f"{user_id}.json")
-    if os.path.exists(cache_path):
-        with open(cache_path, "r") as f:
-            return json.load(f)
-    return None
+    return context_store.get_context(user_id)
 
 
 def save_cached_context(user_id, context):
-    cache_path = os.path.join(CONTEXT_CACHE_DIR, f"{user_id}.json")
-    with open(cache_path, "w") as f:
-        json.dump(context, f)
+    context_store.set_context(user_id, context)
 
 
 def load_device_profile(user_id):
-    profile_path = os.path.join(DEVICE_PROFILES_DIR, f"{user_id}.json")
-    if os.path.exists(profile_path):
-        with open(profile_path, "r") as f:
-            return json.load(f)
-    return None
+    return context_store.get_profile(user_id)
 
 def is_different_subnet(ip1, ip2, level=2):
+    # Same /(8 * level) for IPv4, same IPV6_SUBNET_PREFIX for IPv6; a
+    # family change or a malformed address counts as different
+    if ip1 == ip2:
+        return False
     try:
-        return ip1.split(".")[:level] != ip2.split(".")[:level]
-    except Exception:
-        return True  # Treat malformed IPs as different
+        a, b = ipaddress.ip_address(ip1), ipaddress.ip_address(ip2)
+    except (TypeError, ValueError):
+        return True
+    if a.version != b.version:
+        return True
+    prefix = 8 * level if a.version == 4 else IPV6_SUBNET_PREFIX
+    shift = a.max_prefixlen - prefix
+    return int(a) >> shift != int(b) >> shift
 
 
 def compute_network_shift_score(last_net: dict, current_net: dict) -> float:
@@ -46,45 +49,91 @@ def compute_network_shift_score(last_net: dict, current_net: dict) -> float:
     # Weights for each signal
     weights = {
         "network_type_change": 0.5,   # High signal (e.g., WiFi → Mobile)
-        "ip_subnet_change": 0.3,      # Medium signal
-        "isp_change": 0.2             # Low-medium signal
+        "ip_prefix_change": 0.3,      # Medium signal
+        "asn_change": 0.2             # Low-medium signal
     }
 
     # Check 1: Network type change (WiFi <-> Mobile)
     if last_net.get("network_type") != current_net.get("network_type"):
         score += weights["network_type_change"]
 
-    # Check 2: Subnet change in IP
-    if is_different_subnet(
-        last_net.get("ip_address", ""), current_net.get("ip_address", ""), level=2
-    ):
-        score += weights["ip_subnet_change"]
-
-    # Check 3: ISP change
-    if (
-        last_net.get("isp")
-        and current_net.get("isp")
-        and last_net["isp"] != current_net["isp"]
-    ):
-        score += weights["isp_change"]
+    last_ip = last_net.get("ip_address", "")
+    current_ip = current_net.get("ip_address", "")
+    if last_ip != current_ip:
+        # Resolved locally; the client-reported "isp" is not used
+        ip_index = get_ip_index()
+        last_info = ip_index.lookup(last_ip) if ip_index and isinstance(last_ip, str) else None
+        current_info = ip_index.lookup(current_ip) if ip_index and isinstance(current_ip, str) else None
+
+        if last_info and current_info:
+            # Check 2: announced prefix change
+            if last_info["prefix"] != current_info["prefix"]:
+                score += weights["ip_prefix_change"]
+            # Check 3: ASN change
+            if last_info["asn"] != current_info["asn"]:
+                score += weights["asn_change"]
+        elif is_different_subnet(last_ip, current_ip, level=2):
+            # Private, unrouted or no index: subnet comparison only
+            score += weights["ip_prefix_change"]
 
     # Final score out of 100
     return round(score * 100, 2)
 
 
-def analyze_context(user_id, context):
-    geo_shift_score = 0.0
+def analyze_context(user_id, context, base_profile=_LOAD, last_context=_LOAD):
+    # base_profile / last_context can be passed in pre-loaded; only when
+    # they are loaded here is the new context written back to the store
+    load_state = last_context is _LOAD
+    if base_profile is _LOAD:
+        base_profile = load_device_profile(user_id)
+    if last_context is _LOAD:
+        last_context = load_cached_context(user_id)
+
+    scores = compute_context_scores(base_profile, last_context, context)
+
+    # Update the context cache
+    if load_state:
+        save_cached_context(user_id, context)
+
+    return scores
+
+
+def analyze_session_context(user_id, contexts: List[dict], base_profile=_LOAD, last_context=_LOAD) -> List[dict]:
+    # Score a sequence of contexts in order, each against the one before it,
+    # touching the store at most once for loading and once for saving
+    save_state = last_context is _LOAD
+    if base_profile is _LOAD:
+        base_profile = load_device_profile(user_id)
+    if last_context is _LOAD:
+        last_context = load_cached_context(user_id)
+
+    # Geo scores for the whole session in one vectorized backend call
+    previous_contexts = [last_context] + list(contexts[:-1])
+    with metrics.timer("geo_distance"):
+        geo_scores = geo_shift_scores(previous_contexts, contexts)
+
+    scores_list = [
+        compute_context_scores(base_profile, previous, context, geo_shift_score=geo_score)
+        for previous, context, geo_score in zip(previous_contexts, contexts, geo_scores)
+    ]
+
+    if save_state and contexts:
+        save_cached_context(user_id, contexts[-1])
+
+    return scores_list
+
+
+def compute_context_scores(base_profile: Optional[dict], last_context: Optional[dict], context: dict,
+                           geo_shift_score: Optional[float] = None) -> dict:
     network_shift_score = 0.0
     device_mismatch_score = 0.0
 
-    current_loc = context.get("location", {})
     current_net = context.get("network_info", {})
     current_dev = context.get("device_info", {})
 
     # -------------------------------
     # Device profile mismatch score
     # -------------------------------
-    base_profile = load_device_profile(user_id)
     if base_profile:
         mismatches = sum(
             1 for key in ["os", "os_version", "device_model"]
@@ -95,46 +144,20 @@ def analyze_context(user_id, context):
     # -------------------------------
     # Geolocation and Network shift
     # -------------------------------
-    last_context = load_cached_context(user_id)
+    if geo_shift_score is None:
+        # Single pair: same backend as the session path
+        with metrics.timer("geo_distance"):
+            geo_shift_score = geo_shift_scores([last_context], [context])[0]
 
     if last_context:
-        # Geolocation shift
-        last_loc = last_context.get("location", {})
-        if "latitude" in last_loc and "longitude" in last_loc:
-            coords1 = (last_loc["latitude"], last_loc["longitude"])
-            coords2 = (current_loc["latitude"], current_loc["longitude"])
-            distance_km = geodesic(coords1, coords2).kilometers
-
-            # Define scoring: beyond 1000km in short time = 100 score
-            # Parse timestamps
-            last_time_str = last_loc.get("timestamp")
-            current_time_str = current_loc.get("timestamp")
-
-            last_time = datetime.fromisoformat(last_time_str)
-            current_time = datetime.fromisoformat(current_time_str)
-
-            # Compute time difference in hours
-            if current_time <= last_time:
-                geo_shift_score = 0
-            else:
-                time_diff_hours = abs((current_time - last_time).total_seconds()) / 3600
-                expected_max_distance = time_diff_hours * 80
-                geo_shift_score = min((distance_km / expected_max_distance) * 100, 100)
-
-
         # Network shift
         last_net = last_context.get("network_info", {})
 
         network_shift_score = compute_network_shift_score(last_net, current_net)
 
 
-    # Update the context cache
-    save_cached_context(user_id, context)
-
     return {
-        "geo_shift_score": round(geo_shift_score, 2),
+        "geo_shift_score": round(float(geo_shift_score), 2),
         "network_shift_score": round(network_shift_score, 2),
         "device_mismatch_score": round(device_mismatch_score, 2)
     }
-
-
@@ -0,0 +1,211 @@
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import List, Optional
+
+import pandas as pd
+
+from app.model_manager import ModelManager, MODEL_DIR
+from app.feature_store import FeatureStore, FEATURES, DATA_DIR
+from app.model_store import atomic_write
+
+BULK_STATE_PATH = os.path.join(MODEL_DIR, "bulk_retrain_state.json")
+# Rows read from the feature store and scored per decision_function call
+RESCORE_BATCH_ROWS = int(os.environ.get("RESCORE_BATCH_ROWS", "10000"))
+
+
+def _get_rescore_path(user_id: str) -> str:
+    return os.path.join(MODEL_DIR, f"{user_id}_rescore.json")
+
+
+def discover_users(dataset_root: str, feature_store: FeatureStore) -> List[str]:
+    # Anyone with CSV sessions or a feature store directory
+    users = set(feature_store.list_users())
+    if os.path.isdir(dataset_root):
+        users.update(
+            name for name in os.listdir(dataset_root)
+            if os.path.isdir(os.path.join(dataset_root, name))
+        )
+    return sorted(users)
+
+
+def rescore_user(manager: ModelManager, user_id: str, batch_rows: int = RESCORE_BATCH_ROWS) -> dict:
+    # Scores every stored snapshot under the current model, batch_rows at a
+    # time, and summarizes per session
+    row_count = manager.feature_store.info(user_id)["row_count"]
+    sessions = []
+    for start in range(0, row_count, batch_rows):
+        batch = manager.feature_store.read_rows(user_id, start, start + batch_rows)
+        batch["risk"] = manager.predict_risk_many(user_id, batch[FEATURES])
+        sessions.append(batch[["session_id", "risk"]])
+
+    if sessions:
+        rows = pd.concat(sessions, ignore_index=True)
+        # A session can straddle two batches, so group after concatenating
+        grouped = rows.groupby("session_id")["risk"].agg(["count", "mean", "max"])
+    else:
+        grouped = pd.DataFrame(columns=["count", "mean", "max"])
+
+    return {
+        "user_id": user_id,
+        "rescored_at": datetime.now().isoformat(),
+        "snapshot_count": int(row_count),
+        "sessions": {
+            str(int(session_id)): {
+                "snapshots": int(row["count"]),
+                "mean_risk": round(float(row["mean"]), 2),
+                "max_risk": round(float(row["max"]), 2),
+            }
+            for session_id, row in grouped.iterrows()
+        },
+    }
+
+
+def process_user(user_id: str, dataset_root: str, rescore: bool, batch_rows: int) -> dict:
+    # Runs in a pool process; every file it writes goes through atomic_write
+    started = time.perf_counter()
+    manager = ModelManager(dataset_root)
+
+    train_started = time.perf_counter()
+    metadata = manager._train_model(user_id, {"reason": "bulk"})
+    train_sec = time.perf_counter() - train_started
+
+    result = {
+        "user_id": user_id,
+        "trained": metadata is not None,
+        "model_version": metadata["model_version"] if metadata else None,
+        "train_sec": round(train_sec, 3),
+        "rescored_snapshots": 0,
+        "rescore_sec": 0.0,
+    }
+
+    if rescore and manager.has_model(user_id):
+        rescore_started = time.perf_counter()
+        summary = rescore_user(manager, user_id, batch_rows)
+        summary["model_version"] = result["model_version"]
+        atomic_write(_get_rescore_path(user_id), "w", lambda f: json.dump(summary, f, indent=2))
+        result["rescored_snapshots"] = summary["snapshot_count"]
+        result["rescore_sec"] = round(time.perf_counter() - rescore_started, 3)
+
+    result["total_sec"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def load_state(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_state(path: str, state: dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    state["updated_at"] = datetime.now().isoformat()
+    atomic_write(path, "w", lambda f: json.dump(state, f, indent=2))
+
+
+def run_bulk(dataset_root: str = DATA_DIR, workers: Optional[int] = None, rescore: bool = True,
+             batch_rows: int = RESCORE_BATCH_ROWS, state_path: str = BULK_STATE_PATH,
+             resume: bool = False, users: Optional[List[str]] = None) -> dict:
+    workers = workers or os.cpu_count() or 1
+    feature_store = FeatureStore(data_root=dataset_root)
+
+    state = load_state(state_path) if resume else None
+    if state is None:
+        state = {"started_at": datetime.now().isoformat(), "completed": {}, "failed": {}}
+    # Failed users are retried on resume, completed ones are skipped
+    state["failed"] = {}
+
+    all_users = users or discover_users(dataset_root, feature_store)
+    pending = [u for u in all_users if u not in state["completed"]]
+    skipped = len(all_users) - len(pending)
+    print(f"🔁 Bulk retrain: {len(pending)} users ({skipped} already done), {workers} workers")
+
+    # Migrate CSV-only users up front so pool processes never race on it
+    for user_id in pending:
+        feature_store.info(user_id)
+
+    started = time.perf_counter()
+    save_state(state_path, state)
+    if pending:
+        # spawn matches the training scheduler; forked children would inherit
+        # the parent's BLAS threads
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)), mp_context=ctx) as pool:
+            futures = {
+                pool.submit(process_user, user_id, dataset_root, rescore, batch_rows): user_id
+                for user_id in pending
+            }
+            for future in as_completed(futures):
+                user_id = futures[future]
+                try:
+                    state["completed"][user_id] = future.result()
+                except Exception as e:
+                    state["failed"][user_id] = f"{type(e).__name__}: {e}"
+                    print(f"[{user_id}] ❌ Bulk retrain failed: {e}")
+                # Checkpoint after every user so an interrupted run can resume
+                save_state(state_path, state)
+
+    elapsed = time.perf_counter() - started
+    done = [state["completed"][u] for u in pending if u in state["completed"]]
+    snapshots = sum(r["rescored_snapshots"] for r in done)
+    state["last_run"] = {
+        "users": len(pending),
+        "skipped": skipped,
+        "completed": len(done),
+        "trained": sum(1 for r in done if r["trained"]),
+        "failed": len(state["failed"]),
+        "workers": workers,
+        "elapsed_sec": round(elapsed, 3),
+        "users_per_sec": round(len(done) / elapsed, 2) if elapsed > 0 else None,
+        "snapshots_per_sec": round(snapshots / elapsed, 1) if elapsed > 0 else None,
+    }
+    save_state(state_path, state)
+    return state
+
+
+def print_report(state: dict):
+    print(f"\n{'user_id':<24} {'trained':>7} {'train_s':>8} {'rescored':>9} {'rescore_s':>9} {'total_s':>8}")
+    for user_id, r in sorted(state["completed"].items(), key=lambda item: -item[1]["total_sec"]):
+        print(f"{user_id:<24} {str(r['trained']):>7} {r['train_sec']:>8.3f} "
+              f"{r['rescored_snapshots']:>9} {r['rescore_sec']:>9.3f} {r['total_sec']:>8.3f}")
+    for user_id, error in sorted(state["failed"].items()):
+        print(f"{user_id:<24} FAILED  {error}")
+
+    run = state["last_run"]
+    print(f"\n✅ {run['completed']}/{run['users']} users in {run['elapsed_sec']}s "
+          f"({run['users_per_sec']} users/s, {run['snapshots_per_sec']} snapshots/s), "
+          f"{run['trained']} trained, {run['failed']} failed, {run['skipped']} skipped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrain every user's model and rescore their stored sessions")
+    parser.add_argument("--data-root", default=DATA_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="pool size (default: CPU count)")
+    parser.add_argument("--no-rescore", action="store_true", help="retrain only")
+    parser.add_argument("--batch-rows", type=int, default=RESCORE_BATCH_ROWS)
+    parser.add_argument("--state", default=BULK_STATE_PATH, help="checkpoint / report file")
+    parser.add_argument("--resume", action="store_true", help="skip users completed by a previous run")
+    parser.add_argument("--user", action="append", dest="users", help="limit to these users (repeatable)")
+    args = parser.parse_args()
+
+    state = run_bulk(
+        dataset_root=args.data_root,
+        workers=args.workers,
+        rescore=not args.no_rescore,
+        batch_rows=args.batch_rows,
+        state_path=args.state,
+        resume=args.resume,
+        users=args.users,
+    )
+    print_report(state)
+    sys.exit(1 if state["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import numpy as np
+
+CALIBRATION_VERSION = 1
+
+# Below this many stored isolation scores the percentile clip is unreliable
+# and a plain sigmoid on the raw score is used instead
+MIN_CALIBRATION_SCORES = 10
+
+ISO_WEIGHT = 0.6
+Z_WEIGHT = 0.4
+
+
+def build_calibration(iso_scores, scaler) -> dict:
+    # Everything predict_risk needs that depends only on the trained model:
+    #
+    #   z        = (clip(score, clip_low, clip_high) - (center + center_weight * score)) / scale
+    #   norm     = sigmoid(z * gain)
+    #   iso_risk = round((1 - norm) * 100, 2)
+    #
+    # With enough scores the center is the sample's own score
+    # (center_weight=1) and scale is 0.01, exactly as the original
+    # per-request code computed it. The fallback is sigmoid(score * 20),
+    # i.e. no clipping, center 0, scale 1, gain 20.
+    iso_scores = np.asarray(iso_scores if iso_scores is not None else [], dtype=float)
+
+    if len(iso_scores) >= MIN_CALIBRATION_SCORES:
+        clip_low, clip_high = np.percentile(iso_scores, [5, 95])
+        center, center_weight, scale, gain = 0.0, 1.0, 0.01, 1.5
+    else:
+        clip_low, clip_high = -np.inf, np.inf
+        center, center_weight, scale, gain = 0.0, 0.0, 1.0, 20.0
+
+    mus = np.asarray(scaler.mean_, dtype=float)
+    return {
+        "version": np.array(CALIBRATION_VERSION),
+        "n_scores": np.array(len(iso_scores)),
+        "clip_low": np.array(clip_low, dtype=float),
+        "clip_high": np.array(clip_high, dtype=float),
+        "center": np.array(center),
+        "center_weight": np.array(center_weight),
+        "scale": np.array(scale),
+        "gain": np.array(gain),
+        # StandardScaler parameters and the z-score constants
+        "feature_mean": mus,
+        "feature_scale": np.asarray(scaler.scale_, dtype=float),
+        "feature_sigma": np.where(scaler.scale_ > 0, scaler.scale_, 0.01).astype(float),
+    }
+
+
+def scale_features(calibration: dict, X) -> np.ndarray:
+    # Same arithmetic as StandardScaler.transform, without its input validation
+    return (np.asarray(X, dtype=float) - calibration["feature_mean"]) / calibration["feature_scale"]
+
+
+def apply_calibration(calibration: dict, X_scaled: np.ndarray, iso_score: np.ndarray):
+    # Works on any number of rows; returns (iso_risk, z_risk, final_risk)
+    z_score = (
+        np.clip(iso_score, calibration["clip_low"], calibration["clip_high"])
+        - (calibration["center"] + calibration["center_weight"] * iso_score)
+    ) / calibration["scale"]
+    norm_score = 1 / (1 + np.exp(-z_score * calibration["gain"]))
+
+    # Convert to iso_risk (0 = safest, 100 = riskiest)
+    iso_risk = np.round((1 - norm_score) * 100, 2)
+
+    mus = calibration["feature_mean"]
+    sigmas = calibration["feature_sigma"]
+    z_feats = np.abs((X_scaled * sigmas + mus - mus) / sigmas)
+    z_risk = np.round(z_feats.mean(axis=1) * 10, 2)
+
+    final_risk = np.round(ISO_WEIGHT * iso_risk + Z_WEIGHT * z_risk, 2)
+    return iso_risk, z_risk, np.minimum(final_risk, 100)
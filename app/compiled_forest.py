@@ -0,0 +1,130 @@
+import numpy as np
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from sklearn.ensemble import IsolationForest
+
+COMPILED_FOREST_VERSION = 1
+
+# Rows per traversal chunk; bounds the (n_trees, rows) index arrays
+CHUNK_ROWS = 4096
+
+
+def compile_isolation_forest(model: "IsolationForest") -> dict:
+    # Flatten every tree into shared node arrays. Global node ids index
+    # feature/threshold/children/leaf_value; each tree starts at roots[t].
+    # Leaves point to themselves, so a fixed number of traversal steps
+    # (the deepest tree's depth) lands every row on its leaf without any
+    # per-node branching.
+    from sklearn.ensemble._iforest import _average_path_length
+
+    features, thresholds, lefts, rights, leaf_values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+
+    # Trees only see a feature subset when max_features < n_features
+    subsample_features = model._max_features != model.n_features_in_
+
+    for tree_idx, estimator in enumerate(model.estimators_):
+        tree = estimator.tree_
+        node_ids = np.arange(tree.node_count)
+        is_leaf = tree.children_left == -1
+
+        feature = np.where(is_leaf, 0, tree.feature)
+        if subsample_features:
+            feature = np.asarray(model.estimators_features_[tree_idx])[feature]
+
+        features.append(feature.astype(np.int32))
+        thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+        lefts.append((np.where(is_leaf, node_ids, tree.children_left) + offset).astype(np.int32))
+        rights.append((np.where(is_leaf, node_ids, tree.children_right) + offset).astype(np.int32))
+
+        # Same expression sklearn adds per tree in _parallel_compute_tree_depths
+        leaf_values.append(
+            model._decision_path_lengths[tree_idx]
+            + model._average_path_length_per_tree[tree_idx]
+            - 1.0
+        )
+
+        roots.append(offset)
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    denominator = len(model.estimators_) * _average_path_length([model._max_samples])[0]
+
+    return {
+        "version": np.array(COMPILED_FOREST_VERSION),
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds).astype(np.float64),
+        "children_left": np.concatenate(lefts),
+        "children_right": np.concatenate(rights),
+        "leaf_value": np.concatenate(leaf_values).astype(np.float64),
+        "roots": np.array(roots, dtype=np.int32),
+        "max_depth": np.array(max_depth),
+        "denominator": np.array(denominator, dtype=np.float64),
+        "offset": np.array(model.offset_, dtype=np.float64),
+        "n_features": np.array(model.n_features_in_),
+    }
+
+
+class CompiledForest:
+    # Evaluates a compiled IsolationForest. Works directly on the (possibly
+    # memory-mapped) arrays from compile_isolation_forest and exposes the
+    # same decision_function / score_samples as the sklearn estimator.
+
+    def __init__(self, arrays: dict):
+        self.arrays = arrays
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.children_left = arrays["children_left"]
+        self.children_right = arrays["children_right"]
+        self.leaf_value = arrays["leaf_value"]
+        self.roots = arrays["roots"]
+        self.max_depth = int(arrays["max_depth"])
+        self.denominator = float(arrays["denominator"])
+        self.offset_ = float(arrays["offset"])
+        self.n_features_in_ = int(arrays["n_features"])
+
+    @classmethod
+    def from_isolation_forest(cls, model: "IsolationForest") -> "CompiledForest":
+        return cls(compile_isolation_forest(model))
+
+    @property
+    def n_estimators(self) -> int:
+        return len(self.roots)
+
+    def _depths(self, X: np.ndarray) -> np.ndarray:
+        n_samples = X.shape[0]
+        rows = np.arange(n_samples)
+
+        # (n_trees, n_samples): every tree walks every row in lockstep
+        nodes = np.repeat(self.roots[:, None], n_samples, axis=1)
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[nodes]]
+            nodes = np.where(
+                x <= self.threshold[nodes],
+                self.children_left[nodes],
+                self.children_right[nodes],
+            )
+
+        # Summing over axis 0 accumulates tree by tree, in the same order
+        # as sklearn's depths += ..., so the float sums match
+        return self.leaf_value[nodes].sum(axis=0)
+
+    def score_samples(self, X) -> np.ndarray:
+        # sklearn trees compare float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        depths = np.empty(X.shape[0])
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            depths[start:start + CHUNK_ROWS] = self._depths(X[start:start + CHUNK_ROWS])
+
+        if self.denominator == 0:
+            # A single training sample: sklearn sets the score to 1
+            return -np.ones_like(depths)
+        return -(2 ** (-(depths / self.denominator)))
+
+    def decision_function(self, X) -> np.ndarray:
+        return self.score_samples(X) - self.offset_
@@ -0,0 +1,99 @@
+import os
+import zlib
+import fcntl
+import sqlite3
+import asyncio
+import functools
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads for scoring, context analysis and training-data math. numpy and
+# the compiled forest release the GIL for most of their work, so this scales
+# with cores; keeping it bounded stops a burst of requests from
+# oversubscribing the CPU
+CPU_WORKERS = int(os.environ.get("CPU_WORKERS", str(os.cpu_count() or 1)))
+# Threads for blocking file / SQLite calls, which mostly wait on the disk
+IO_WORKERS = int(os.environ.get("IO_WORKERS", "16"))
+# Per-user locks are striped: a fixed pool of locks, user -> lock by hash
+USER_LOCK_STRIPES = int(os.environ.get("USER_LOCK_STRIPES", "256"))
+
+_cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+_io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+
+
+async def run_cpu(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_cpu_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def run_io(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_executor, functools.partial(fn, *args, **kwargs))
+
+
+class StripedLocks:
+    # asyncio locks shared by hash stripe. Two users on the same stripe
+    # serialize against each other, which only costs parallelism; the number
+    # of locks stays fixed however many users there are. Locks are created
+    # lazily and recreated if the event loop changes (e.g. test clients).
+
+    def __init__(self, stripes: int = USER_LOCK_STRIPES):
+        self.stripes = stripes
+        self._locks = [None] * stripes
+        self._loop = None
+
+    def stripe(self, user_id: str) -> int:
+        # crc32 rather than hash(): stable across processes and restarts
+        return zlib.crc32(user_id.encode()) % self.stripes
+
+    def __call__(self, user_id: str) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._locks = [None] * self.stripes
+            self._loop = loop
+
+        index = self.stripe(user_id)
+        lock = self._locks[index]
+        if lock is None:
+            lock = self._locks[index] = asyncio.Lock()
+        return lock
+
+
+user_lock = StripedLocks()
+
+
+@contextmanager
+def file_lock(path: str):
+    # Exclusive flock on path (created if missing), held for the with block.
+    # Serializes per-user file updates across gunicorn workers and pool
+    # processes; like any flock it is not reentrant.
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class SQLiteConnections:
+    # One WAL-mode connection per thread to db_path; sqlite3 connections
+    # can't be shared across threads. Call it to get this thread's.
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+    def __call__(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
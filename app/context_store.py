@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import atexit
+import threading
+from typing import Optional
+
+from app.metrics import metrics
+from app.model_manager import training_lock
+from app.model_store import atomic_write
+
+CONTEXT_CACHE_DIR = "context_cache"
+DEVICE_PROFILES_DIR = "device_profiles"
+
+# Seconds between write-behind flushes of changed contexts
+CONTEXT_FLUSH_INTERVAL = float(os.environ.get("CONTEXT_FLUSH_INTERVAL", "2.0"))
+# Clean entries older than this are re-read, so another worker's update is
+# picked up eventually; dirty entries are always authoritative
+CONTEXT_CACHE_TTL = float(os.environ.get("CONTEXT_CACHE_TTL", "30.0"))
+
+_MISSING = object()
+
+
+def _read_json(path: str):
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return None
+
+
+def _write_json(path: str, data, **dump_kwargs):
+    atomic_write(path, "w", lambda f: json.dump(data, f, **dump_kwargs))
+
+
+class ContextStore:
+    # In-process cache for cached contexts and device profiles. Context
+    # updates stay in memory and are written to disk in batches by a
+    # background flusher; profiles are written through immediately since
+    # they change rarely. Without a running flusher, writes go straight to disk.
+
+    def __init__(self, cache_dir: str = CONTEXT_CACHE_DIR, profile_dir: str = DEVICE_PROFILES_DIR,
+                 flush_interval: float = CONTEXT_FLUSH_INTERVAL, ttl: float = CONTEXT_CACHE_TTL):
+        self.cache_dir = cache_dir
+        self.profile_dir = profile_dir
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+
+        self._contexts = {}  # user_id -> (context or None, loaded_at)
+        self._generations = {}  # user_id -> reset generation the context was loaded under
+        self._profiles = {}  # user_id -> (profile, loaded_at)
+        self._dirty = set()
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        os.makedirs(cache_dir, exist_ok=True)
+        os.makedirs(profile_dir, exist_ok=True)
+
+    def _context_path(self, user_id: str) -> str:
+        return os.path.join(self.cache_dir, f"{user_id}.json")
+
+    def _profile_path(self, user_id: str) -> str:
+        return os.path.join(self.profile_dir, f"{user_id}.json")
+
+    def _cached(self, entries: dict, user_id: str, dirty: bool):
+        entry = entries.get(user_id)
+        if entry is None:
+            return _MISSING
+        value, loaded_at = entry
+        if not dirty and time.monotonic() - loaded_at > self.ttl:
+            return _MISSING
+        return value
+
+    # -------------------------------
+    # Cached context
+    # -------------------------------
+    def get_context(self, user_id: str) -> Optional[dict]:
+        with self._lock:
+            value = self._cached(self._contexts, user_id, user_id in self._dirty)
+            if value is not _MISSING:
+                return value
+
+        with metrics.timer("context_read"):
+            with training_lock(user_id) as generation:
+                value = _read_json(self._context_path(user_id))
+        with self._lock:
+            # A concurrent set_context wins over what we just read
+            if user_id not in self._dirty:
+                self._contexts[user_id] = (value, time.monotonic())
+                self._generations[user_id] = generation
+            return self._contexts[user_id][0]
+
+    def set_context(self, user_id: str, context: dict):
+        generation = None
+        if user_id not in self._generations:
+            with training_lock(user_id) as generation:
+                pass
+        with self._lock:
+            if generation is not None:
+                self._generations.setdefault(user_id, generation)
+            self._contexts[user_id] = (context, time.monotonic())
+            self._dirty.add(user_id)
+        if not self.is_running():
+            self.flush(user_id)
+
+    # -------------------------------
+    # Device profile
+    # -------------------------------
+    def get_profile(self, user_id: str) -> Optional[dict]:
+        with self._lock:
+            value = self._cached(self._profiles, user_id, False)
+            if value is not _MISSING:
+                return value
+
+        with metrics.timer("profile_read"):
+            value = _read_json(self._profile_path(user_id))
+        if value is not None:
+            # A missing profile is not cached, so one stored through another
+            # worker counts from the next request
+            with self._lock:
+                self._profiles[user_id] = (value, time.monotonic())
+        return value
+
+    def set_profile(self, user_id: str, profile: dict):
+        _write_json(self._profile_path(user_id), profile, indent=4)
+        with self._lock:
+            self._profiles[user_id] = (profile, time.monotonic())
+
+    # -------------------------------
+    # Write-behind
+    # -------------------------------
+    def flush(self, user_id: Optional[str] = None) -> int:
+        with self._lock:
+            users = [user_id] if user_id is not None else list(self._dirty)
+            pending = [
+                (uid, self._contexts[uid][0], self._generations.get(uid)) for uid in users
+                if uid in self._dirty
+            ]
+            self._dirty.difference_update(uid for uid, _, _ in pending)
+
+        written = 0
+        for uid, context, generation in pending:
+            try:
+                # Under the user's reset lock: a reset in any worker since the
+                # context was loaded means it belongs to the deleted data
+                with training_lock(uid) as current:
+                    if current != generation:
+                        self.discard(uid)
+                        continue
+                    _write_json(self._context_path(uid), context)
+                written += 1
+            except OSError as e:
+                print(f"[{uid}] ⚠️ Failed to flush cached context: {e}")
+                with self._lock:
+                    self._dirty.add(uid)
+        return written
+
+    def discard(self, user_id: str):
+        # Forget a user without writing anything back (used on reset; other
+        # workers drop their copy at flush time through the generation)
+        with self._lock:
+            self._dirty.discard(user_id)
+            self._contexts.pop(user_id, None)
+            self._generations.pop(user_id, None)
+            self._profiles.pop(user_id, None)
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="context-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+
+context_store = ContextStore()
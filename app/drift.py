@@ -0,0 +1,151 @@
+import os
+import json
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from app.concurrency import file_lock
+from app.feature_store import FEATURE_DIR, FEATURES
+from app.model_store import atomic_write
+
+# Standardized shift of any feature mean (in units of the training std)
+DRIFT_MEAN_SHIFT_THRESHOLD = float(os.environ.get("DRIFT_MEAN_SHIFT_THRESHOLD", "0.5"))
+# |log| of the variance ratio against the training variance, any feature
+DRIFT_VARIANCE_RATIO_THRESHOLD = float(os.environ.get("DRIFT_VARIANCE_RATIO_THRESHOLD", "1.0"))
+# Share of recent isolation scores outside the calibration clip band. The
+# band is the 5th-95th percentile of the already trimmed training scores,
+# so a model that still fits sees roughly 20% outside it
+DRIFT_SCORE_OUTSIDE_THRESHOLD = float(os.environ.get("DRIFT_SCORE_OUTSIDE_THRESHOLD", "0.4"))
+# Snapshots needed since the last retrain before drift is judged at all
+DRIFT_MIN_SNAPSHOTS = int(os.environ.get("DRIFT_MIN_SNAPSHOTS", "30"))
+# Isolation scores kept for the rolling score distribution
+DRIFT_SCORE_WINDOW = int(os.environ.get("DRIFT_SCORE_WINDOW", "200"))
+
+# Staleness limits: retrain anyway after this long / this many sessions
+RETRAIN_MAX_AGE_HOURS = float(os.environ.get("RETRAIN_MAX_AGE_HOURS", str(7 * 24)))
+RETRAIN_MAX_SESSIONS = int(os.environ.get("RETRAIN_MAX_SESSIONS", "20"))
+
+
+class DriftMonitor:
+    # Per-user running statistics of the snapshots stored since the last
+    # retrain, kept in features/{user_id}/drift.json:
+    #   - Welford count / mean / M2 per feature, merged one session at a time
+    #   - the last DRIFT_SCORE_WINDOW isolation scores under the current model
+    # should_retrain compares them with the current model's scaler and
+    # calibration, and falls back to the staleness limits.
+
+    def __init__(self, root: str = FEATURE_DIR):
+        self.root = root
+
+    def _stats_path(self, user_id: str) -> str:
+        return os.path.join(self.root, user_id, "drift.json")
+
+    def _locked(self, user_id: str):
+        return file_lock(os.path.join(self.root, user_id, ".drift.lock"))
+
+    def _empty_stats(self) -> dict:
+        return {
+            "count": 0,
+            "mean": [0.0] * len(FEATURES),
+            "m2": [0.0] * len(FEATURES),
+            "scores": [],
+            "sessions_since_train": 0,
+            "trained_at": None,
+        }
+
+    def load(self, user_id: str) -> dict:
+        path = self._stats_path(user_id)
+        if not os.path.exists(path):
+            return self._empty_stats()
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def _save(self, user_id: str, stats: dict):
+        atomic_write(self._stats_path(user_id), "w", lambda f: json.dump(stats, f))
+
+    def update(self, user_id: str, X: np.ndarray, iso_scores: Optional[np.ndarray] = None):
+        # Merge one session's complete rows into the running stats (Chan et
+        # al. parallel form of Welford's update, vectorized over features)
+        X = np.asarray(X, dtype=float)
+        with self._locked(user_id):
+            stats = self.load(user_id)
+            stats["sessions_since_train"] += 1
+
+            if len(X):
+                n_a = stats["count"]
+                mean_a = np.array(stats["mean"])
+                m2_a = np.array(stats["m2"])
+
+                n_b = len(X)
+                mean_b = X.mean(axis=0)
+                m2_b = ((X - mean_b) ** 2).sum(axis=0)
+
+                n = n_a + n_b
+                delta = mean_b - mean_a
+                stats["count"] = n
+                stats["mean"] = (mean_a + delta * n_b / n).tolist()
+                stats["m2"] = (m2_a + m2_b + delta ** 2 * n_a * n_b / n).tolist()
+
+            if iso_scores is not None and len(iso_scores):
+                stats["scores"] = (stats["scores"] + np.asarray(iso_scores, dtype=float).tolist())[-DRIFT_SCORE_WINDOW:]
+
+            self._save(user_id, stats)
+
+    def reset(self, user_id: str, trained_at: Optional[float] = None):
+        with self._locked(user_id):
+            stats = self._empty_stats()
+            stats["trained_at"] = trained_at or time.time()
+            self._save(user_id, stats)
+
+    def measure(self, user_id: str, calibration: dict) -> dict:
+        stats = self.load(user_id)
+        drift = {
+            "snapshots": stats["count"],
+            "sessions_since_train": stats["sessions_since_train"],
+            "mean_shift": None,
+            "variance_ratio": None,
+            "score_outside_band": None,
+        }
+
+        if stats["count"] >= DRIFT_MIN_SNAPSHOTS:
+            train_mean = np.asarray(calibration["feature_mean"], dtype=float)
+            train_scale = np.asarray(calibration["feature_sigma"], dtype=float)
+            mean = np.array(stats["mean"])
+            var = np.array(stats["m2"]) / max(stats["count"] - 1, 1)
+
+            drift["mean_shift"] = round(float(np.max(np.abs(mean - train_mean) / train_scale)), 4)
+            ratio = np.maximum(var, 1e-12) / np.maximum(train_scale ** 2, 1e-12)
+            drift["variance_ratio"] = round(float(np.max(np.abs(np.log(ratio)))), 4)
+
+        scores = np.array(stats["scores"])
+        if len(scores) >= DRIFT_MIN_SNAPSHOTS and np.isfinite(calibration["clip_low"]):
+            outside = (scores < calibration["clip_low"]) | (scores > calibration["clip_high"])
+            drift["score_outside_band"] = round(float(outside.mean()), 4)
+
+        return drift
+
+    def should_retrain(self, user_id: str, calibration: Optional[dict], last_trained: Optional[float]) -> Tuple[bool, dict]:
+        # Returns (retrain?, trigger) where trigger goes into _meta.json
+        if calibration is None:
+            return True, {"reason": "no_model"}
+
+        drift = self.measure(user_id, calibration)
+        checks = [
+            ("mean_shift", DRIFT_MEAN_SHIFT_THRESHOLD),
+            ("variance_ratio", DRIFT_VARIANCE_RATIO_THRESHOLD),
+            ("score_outside_band", DRIFT_SCORE_OUTSIDE_THRESHOLD),
+        ]
+        for metric, threshold in checks:
+            if drift[metric] is not None and drift[metric] > threshold:
+                return True, {"reason": "drift", "metric": metric, "threshold": threshold, "drift": drift}
+
+        if last_trained is not None:
+            age_hours = (time.time() - last_trained) / 3600
+            if age_hours > RETRAIN_MAX_AGE_HOURS:
+                return True, {"reason": "stale_age", "age_hours": round(age_hours, 2), "drift": drift}
+
+        if drift["sessions_since_train"] >= RETRAIN_MAX_SESSIONS:
+            return True, {"reason": "stale_sessions", "drift": drift}
+
+        return False, {"reason": "no_drift", "drift": drift}
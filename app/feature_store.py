@@ -0,0 +1,213 @@
+import os
+import re
+import json
+import time
+import shutil
+import argparse
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from app.concurrency import file_lock
+from app.model_store import atomic_write
+
+FEATURE_DIR = os.environ.get("FEATURE_DIR", "features")
+DATA_DIR = "data"
+
+FEATURES = [
+    "tap_duration", "swipe_speed", "swipe_angle",
+    "scroll_distance", "scroll_velocity",
+    "inter_key_delay_avg", "key_press_duration_avg", "typing_error_rate",
+    "gyro_variance", "accelerometer_noise",
+    "screen_transition_count", "avg_dwell_time_per_screen",
+    "session_start_hour", "session_duration_sec"
+]
+
+# float64 keeps stored values bit-identical to what the CSVs round-trip,
+# so models retrained from the store match models trained from CSV
+ROW_DTYPE = np.dtype([
+    ("session_id", "<i8"),
+    ("timestamp", "<f8"),
+    ("features", "<f8", (len(FEATURES),)),
+])
+
+SESSION_FILE_RE = re.compile(r"^session_(\d+)\.csv$")
+
+
+class FeatureStore:
+    # Per-user append-only feature log:
+    #   features/{user_id}/rows.bin    fixed-size ROW_DTYPE records
+    #   features/{user_id}/index.json  counters (rows, sessions, ...)
+    # Appends write one block at the end of rows.bin and rewrite the small
+    # index; "last K rows" reads seek straight to the tail. Users that only
+    # have data/{user_id}/session_*.csv files are migrated on first access.
+
+    def __init__(self, root: str = FEATURE_DIR, data_root: str = DATA_DIR):
+        self.root = root
+        self.data_root = data_root
+        os.makedirs(root, exist_ok=True)
+
+    def _user_dir(self, user_id: str) -> str:
+        return os.path.join(self.root, user_id)
+
+    def _rows_path(self, user_id: str) -> str:
+        return os.path.join(self._user_dir(user_id), "rows.bin")
+
+    def _index_path(self, user_id: str) -> str:
+        return os.path.join(self._user_dir(user_id), "index.json")
+
+    def _locked(self, user_id: str):
+        # Serializes appends and migration for one user across processes
+        return file_lock(os.path.join(self._user_dir(user_id), ".lock"))
+
+    def _read_index(self, user_id: str) -> Optional[dict]:
+        path = self._index_path(user_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def _write_index(self, user_id: str, index: dict):
+        atomic_write(self._index_path(user_id), "w", lambda f: json.dump(index, f))
+
+    def _empty_index(self) -> dict:
+        return {
+            "features": FEATURES,
+            "row_count": 0,
+            "session_count": 0,
+            "nonempty_sessions": 0,
+            "updated_at": None,
+        }
+
+    def _append_locked(self, user_id: str, index: dict, frame: pd.DataFrame, timestamp: float) -> int:
+        session_id = index["session_count"] + 1
+        values = frame.reindex(columns=FEATURES).to_numpy(dtype=float)
+
+        rows = np.zeros(len(values), dtype=ROW_DTYPE)
+        rows["session_id"] = session_id
+        rows["timestamp"] = timestamp
+        rows["features"] = values
+
+        with open(self._rows_path(user_id), "ab") as f:
+            # Drop rows from an append that died before updating the index
+            expected = index["row_count"] * ROW_DTYPE.itemsize
+            if f.tell() != expected:
+                f.truncate(expected)
+            f.write(rows.tobytes())
+
+        index["row_count"] += len(rows)
+        index["session_count"] = session_id
+        if len(values) and (~np.isnan(values).any(axis=1)).any():
+            index["nonempty_sessions"] += 1
+        index["updated_at"] = timestamp
+        self._write_index(user_id, index)
+        return session_id
+
+    def _load_or_migrate(self, user_id: str) -> dict:
+        index = self._read_index(user_id)
+        if index is not None:
+            if index["features"] != FEATURES:
+                raise ValueError(f"Feature store for {user_id} has a different feature layout; rebuild it")
+            return index
+
+        with self._locked(user_id):
+            index = self._read_index(user_id)
+            if index is None:
+                index = self._migrate_csv_locked(user_id)
+        return index
+
+    def _migrate_csv_locked(self, user_id: str) -> dict:
+        index = self._empty_index()
+        user_dir = os.path.join(self.data_root, user_id)
+        sessions = []
+        if os.path.isdir(user_dir):
+            for filename in os.listdir(user_dir):
+                match = SESSION_FILE_RE.match(filename)
+                if match:
+                    sessions.append((int(match.group(1)), filename))
+
+        # Numeric order, so session_10 comes after session_9
+        for _, filename in sorted(sessions):
+            path = os.path.join(user_dir, filename)
+            self._append_locked(user_id, index, pd.read_csv(path), os.path.getmtime(path))
+
+        self._write_index(user_id, index)
+        if sessions:
+            print(f"[{user_id}] 📦 Migrated {len(sessions)} CSV sessions into the feature store")
+        return index
+
+    def append_session(self, user_id: str, frame: pd.DataFrame, timestamp: Optional[float] = None) -> int:
+        self._load_or_migrate(user_id)
+        with self._locked(user_id):
+            index = self._read_index(user_id) or self._empty_index()
+            return self._append_locked(user_id, index, frame, timestamp or time.time())
+
+    def info(self, user_id: str) -> dict:
+        return self._load_or_migrate(user_id)
+
+    def session_count(self, user_id: str) -> int:
+        return self.info(user_id)["session_count"]
+
+    def read_rows(self, user_id: str, start: int, stop: int) -> pd.DataFrame:
+        # Rows [start, stop) in append order, read with one seek
+        index = self.info(user_id)
+        start = max(0, start)
+        stop = min(stop, index["row_count"])
+        if stop <= start:
+            rows = np.zeros(0, dtype=ROW_DTYPE)
+        else:
+            rows = np.fromfile(self._rows_path(user_id), dtype=ROW_DTYPE, count=stop - start,
+                               offset=start * ROW_DTYPE.itemsize)
+
+        frame = pd.DataFrame(rows["features"], columns=FEATURES)
+        frame.insert(0, "timestamp", rows["timestamp"])
+        frame.insert(0, "session_id", rows["session_id"])
+        return frame
+
+    def tail(self, user_id: str, k: int) -> pd.DataFrame:
+        # Last k rows, oldest first; reads only the tail of rows.bin
+        row_count = self.info(user_id)["row_count"]
+        return self.read_rows(user_id, row_count - k, row_count)
+
+    def list_users(self):
+        return sorted(
+            name for name in os.listdir(self.root)
+            if os.path.isdir(os.path.join(self.root, name))
+        ) if os.path.isdir(self.root) else []
+
+    def delete_user(self, user_id: str) -> bool:
+        user_dir = self._user_dir(user_id)
+        if os.path.isdir(user_dir):
+            shutil.rmtree(user_dir)
+            return True
+        return False
+
+    def migrate_all(self) -> dict:
+        migrated = {}
+        if not os.path.isdir(self.data_root):
+            return migrated
+        for user_id in sorted(os.listdir(self.data_root)):
+            if os.path.isdir(os.path.join(self.data_root, user_id)):
+                migrated[user_id] = self.info(user_id)["session_count"]
+        return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-user feature store maintenance")
+    parser.add_argument("--root", default=FEATURE_DIR)
+    parser.add_argument("--data-root", default=DATA_DIR)
+    parser.add_argument("--migrate", action="store_true", help="import data/{user_id}/session_*.csv for every user")
+    parser.add_argument("--info", metavar="USER_ID")
+    args = parser.parse_args()
+
+    store = FeatureStore(args.root, args.data_root)
+    if args.migrate:
+        migrated = store.migrate_all()
+        print(f"Feature store ready for {len(migrated)} users ({sum(migrated.values())} sessions)")
+    if args.info:
+        print(json.dumps(store.info(args.info), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,78 @@
-import json
+from typing import List
+
+import numpy as np
+import orjson
+
+from app.feature_store import FEATURES
+
+# Where each feature sits in a posted snapshot: {"tap_data": {"tap_duration": ...}, ...}
+SNAPSHOT_GROUPS = {
+    "tap_data": ["tap_duration"],
+    "typing_data": ["inter_key_delay_avg", "key_press_duration_avg", "typing_error_rate"],
+    "swipe_data": ["swipe_speed", "swipe_angle"],
+    "scroll_data": ["scroll_distance", "scroll_velocity"],
+    "sensor_data": ["gyro_variance", "accelerometer_noise"],
+    "session_metadata": ["session_duration_sec", "session_start_hour", "screen_transition_count", "avg_dwell_time_per_screen"],
+}
+assert sorted(f for fields in SNAPSHOT_GROUPS.values() for f in fields) == sorted(FEATURES)
+
+# (group, [(field, column in FEATURES)]): one group lookup per group, values
+# written straight to their FEATURES position
+_GROUP_COLUMNS = [
+    (group, [(field, FEATURES.index(field)) for field in fields])
+    for group, fields in SNAPSHOT_GROUPS.items()
+]
+_EMPTY = {}
+
+
+def loads(body):
+    # Request bodies and NDJSON lines
+    return orjson.loads(body)
+
+
+def dumps(obj) -> bytes:
+    # numpy scalars/arrays are accepted as they are
+    return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def _snapshot_row(data: dict) -> list:
+    row = [None] * len(FEATURES)
+    for group, columns in _GROUP_COLUMNS:
+        values = data.get(group) or _EMPTY
+        for field, column in columns:
+            row[column] = values.get(field)
+    return row
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _as_array(rows) -> np.ndarray:
+    try:
+        return np.array(rows, dtype=float)
+    except (TypeError, ValueError):
+        # Something non-numeric was posted: treat it as missing
+        return np.array([[_to_float(v) for v in row] for row in rows], dtype=float)
+
+
+def snapshot_vector(data: dict) -> np.ndarray:
+    # One snapshot -> float64 vector in FEATURES order; missing values are NaN
+    return _as_array([_snapshot_row(data)])[0]
+
+
+def snapshot_matrix(snapshots: List[dict]) -> np.ndarray:
+    # A batch or session -> (n, len(FEATURES)) float64 matrix. float64, not
+    # float32: the scaler and calibration were fitted on float64 and the
+    # feature store keeps float64, so scores stay bit-identical.
+    if not snapshots:
+        return np.empty((0, len(FEATURES)))
+    return _as_array([_snapshot_row(data) for data in snapshots])
+
 
 def flatten_snapshot(data: dict) -> dict:
-    
-    return {
-        # tap data
-        "tap_duration": data.get("tap_data", {}).get("tap_duration"),
-
-        # typing data
-        "inter_key_delay_avg": data.get("typing_data", {}).get("inter_key_delay_avg"),
-        "key_press_duration_avg": data.get("typing_data", {}).get("key_press_duration_avg"),
-        "typing_error_rate": data.get("typing_data", {}).get("typing_error_rate"),
-
-        # swipe and scroll
-        "swipe_speed": data.get("swipe_data", {}).get("swipe_speed"),
-        "swipe_angle": data.get("swipe_data", {}).get("swipe_angle"),
-        "scroll_distance": data.get("scroll_data", {}).get("scroll_distance"),
-        "scroll_velocity": data.get("scroll_data", {}).get("scroll_velocity"),
-
-        # sensors
-        "gyro_variance": data.get("sensor_data", {}).get("gyro_variance"),
-        "accelerometer_noise": data.get("sensor_data", {}).get("accelerometer_noise"),
-
-        # session meta
-        "session_duration_sec": data.get("session_metadata", {}).get("session_duration_sec"),
-        "session_start_hour": data.get("session_metadata", {}).get("session_start_hour"),
-        "screen_transition_count": data.get("session_metadata", {}).get("screen_transition_count"),
-        "avg_dwell_time_per_screen": data.get("session_metadata", {}).get("avg_dwell_time_per_screen")
-    }
\ No newline at end of file
+    # Feature name -> raw value, for callers that want a record
+    return dict(zip(FEATURES, _snapshot_row(data)))
@@ -0,0 +1,156 @@
+import os
+import time
+from typing import List, Optional, Union
+
+import numpy as np
+
+from app.compiled_forest import CompiledForest
+
+# Train with the smallest forest that passes the agreement and latency
+# checks below instead of always 100 trees ("1" to enable)
+MODEL_AUTOTUNE = os.environ.get("MODEL_AUTOTUNE", "0") == "1"
+# Candidate grid, tried smallest first
+AUTOTUNE_N_ESTIMATORS = [int(n) for n in os.environ.get("AUTOTUNE_N_ESTIMATORS", "25,50,75,100").split(",")]
+AUTOTUNE_MAX_SAMPLES = os.environ.get("AUTOTUNE_MAX_SAMPLES", "32,64,auto").split(",")
+# Minimum Spearman rank correlation with the full model's scores on
+# held-out snapshots
+AUTOTUNE_MIN_AGREEMENT = float(os.environ.get("AUTOTUNE_MIN_AGREEMENT", "0.95"))
+# Single-row scoring budget for the compiled forest, in microseconds
+AUTOTUNE_LATENCY_BUDGET_US = float(os.environ.get("AUTOTUNE_LATENCY_BUDGET_US", "250"))
+# Newest share of the training window held out from the candidate fits
+AUTOTUNE_HOLDOUT_FRACTION = float(os.environ.get("AUTOTUNE_HOLDOUT_FRACTION", "0.2"))
+# Timed single-row calls per candidate; the median is kept
+AUTOTUNE_LATENCY_REPEAT = int(os.environ.get("AUTOTUNE_LATENCY_REPEAT", "30"))
+
+# The configuration every model was trained with before tuning existed,
+# and the one candidates are compared against
+REFERENCE_N_ESTIMATORS = 100
+REFERENCE_MAX_SAMPLES = "auto"
+
+
+def _parse_max_samples(value: str) -> Union[int, float, str]:
+    value = value.strip()
+    if value == "auto":
+        return value
+    return float(value) if "." in value else int(value)
+
+
+def fit_forest(X: np.ndarray, n_estimators: int, max_samples):
+    from sklearn.ensemble import IsolationForest
+
+    # max_samples above the row count would only make sklearn warn and clip
+    if isinstance(max_samples, int):
+        max_samples = min(max_samples, len(X))
+    return IsolationForest(
+        n_estimators=n_estimators, max_samples=max_samples, contamination=0.05, random_state=42
+    ).fit(X)
+
+
+def _ranks(values: np.ndarray) -> np.ndarray:
+    # Average ranks for ties, as Spearman's rho uses
+    order = np.argsort(values, kind="mergesort")
+    ranks = np.empty(len(values))
+    ranks[order] = np.arange(len(values), dtype=float)
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    sums = np.bincount(inverse, weights=ranks)
+    return (sums / counts)[inverse]
+
+
+def spearman(a: np.ndarray, b: np.ndarray) -> float:
+    ra, rb = _ranks(np.asarray(a, dtype=float)), _ranks(np.asarray(b, dtype=float))
+    ra -= ra.mean()
+    rb -= rb.mean()
+    denominator = np.sqrt((ra * ra).sum() * (rb * rb).sum())
+    return float((ra * rb).sum() / denominator) if denominator > 0 else 1.0
+
+
+def single_row_latency_us(forest: CompiledForest, X: np.ndarray, repeat: int = AUTOTUNE_LATENCY_REPEAT) -> float:
+    # What one /predict pays for decision_function on the compiled forest
+    rows = [X[i % len(X)].reshape(1, -1) for i in range(repeat)]
+    forest.decision_function(rows[0])  # warm up
+    timings = []
+    for row in rows:
+        start = time.perf_counter()
+        forest.decision_function(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1e6)
+
+
+def tune_forest(train_X: np.ndarray, holdout_X: Optional[np.ndarray] = None,
+                n_estimators_grid: Optional[List[int]] = None,
+                max_samples_grid: Optional[List[str]] = None,
+                min_agreement: float = AUTOTUNE_MIN_AGREEMENT,
+                latency_budget_us: float = AUTOTUNE_LATENCY_BUDGET_US) -> dict:
+    # train_X: the training window in time order, unscaled. The newest
+    # AUTOTUNE_HOLDOUT_FRACTION is held out (together with holdout_X, older
+    # clean rows outside the window); the reference and every candidate are
+    # fitted on the rest and compared on the held-out rows. Returns the
+    # chosen n_estimators / max_samples and every measurement.
+    from sklearn.preprocessing import StandardScaler
+
+    n_estimators_grid = sorted(n_estimators_grid or AUTOTUNE_N_ESTIMATORS)
+    max_samples_grid = [_parse_max_samples(m) for m in (max_samples_grid or AUTOTUNE_MAX_SAMPLES)]
+
+    train_X = np.asarray(train_X, dtype=float)
+    n_holdout = max(1, int(round(len(train_X) * AUTOTUNE_HOLDOUT_FRACTION)))
+    fit_X, evaluation_X = train_X[:-n_holdout], train_X[-n_holdout:]
+    if holdout_X is not None and len(holdout_X):
+        evaluation_X = np.vstack([np.asarray(holdout_X, dtype=float), evaluation_X])
+
+    scaler = StandardScaler().fit(fit_X)
+    fit_scaled, evaluation_scaled = scaler.transform(fit_X), scaler.transform(evaluation_X)
+
+    started = time.perf_counter()
+    reference = fit_forest(fit_scaled, REFERENCE_N_ESTIMATORS, REFERENCE_MAX_SAMPLES)
+    reference_scores = reference.decision_function(evaluation_scaled)
+    reference_latency = single_row_latency_us(CompiledForest.from_isolation_forest(reference), evaluation_scaled)
+
+    candidates = []
+    for n_estimators in n_estimators_grid:
+        for max_samples in max_samples_grid:
+            if n_estimators == REFERENCE_N_ESTIMATORS and max_samples == REFERENCE_MAX_SAMPLES:
+                model, scores, latency = reference, reference_scores, reference_latency
+            else:
+                model = fit_forest(fit_scaled, n_estimators, max_samples)
+                scores = model.decision_function(evaluation_scaled)
+                latency = single_row_latency_us(CompiledForest.from_isolation_forest(model), evaluation_scaled)
+            agreement = spearman(scores, reference_scores)
+            candidates.append({
+                "n_estimators": n_estimators,
+                "max_samples": max_samples,
+                "fitted_max_samples": int(model.max_samples_),
+                "agreement": round(agreement, 4),
+                "latency_us": round(latency, 1),
+                "meets_agreement": agreement >= min_agreement,
+                "meets_latency": latency <= latency_budget_us,
+            })
+
+    # Smallest forest first: fewest trees, then fewest samples per tree
+    by_size = sorted(candidates, key=lambda c: (c["n_estimators"], c["fitted_max_samples"]))
+    chosen = next((c for c in by_size if c["meets_agreement"] and c["meets_latency"]), None)
+    reason = "smallest_within_budget"
+    if chosen is None:
+        # Nothing fits the budget: keep agreement, take the fastest that has it
+        agreeing = [c for c in candidates if c["meets_agreement"]]
+        if agreeing:
+            chosen, reason = min(agreeing, key=lambda c: c["latency_us"]), "fastest_agreeing_over_budget"
+        else:
+            chosen = {"n_estimators": REFERENCE_N_ESTIMATORS, "max_samples": REFERENCE_MAX_SAMPLES}
+            reason = "reference_no_candidate_agreed"
+
+    return {
+        "n_estimators": chosen["n_estimators"],
+        "max_samples": chosen["max_samples"],
+        "reason": reason,
+        "min_agreement": min_agreement,
+        "latency_budget_us": latency_budget_us,
+        "fit_rows": len(fit_X),
+        "holdout_rows": len(evaluation_X),
+        "reference": {
+            "n_estimators": REFERENCE_N_ESTIMATORS,
+            "max_samples": REFERENCE_MAX_SAMPLES,
+            "latency_us": round(reference_latency, 1),
+        },
+        "candidates": candidates,
+        "duration_sec": round(time.perf_counter() - started, 3),
+    }
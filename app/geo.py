@@ -0,0 +1,81 @@
+import os
+from datetime import datetime
+from typing import Callable, List, Optional
+
+import numpy as np
+
+# "geodesic" (ellipsoidal, geopy) or "haversine" (spherical, vectorized)
+GEO_DISTANCE_BACKEND = os.environ.get("GEO_DISTANCE_BACKEND", "geodesic")
+
+# Mean Earth radius (IUGG), what geopy's great_circle uses as well
+EARTH_RADIUS_KM = 6371.0088
+
+# Fastest plausible travel speed before a location change looks impossible
+MAX_TRAVEL_KMH = 80
+
+
+def geodesic_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    # geopy solves each pair iteratively, so this is a Python loop. Imported
+    # here so workers on the haversine backend never load it
+    from geopy.distance import geodesic
+
+    return np.array([
+        geodesic((a, b), (c, d)).kilometers
+        for a, b, c, d in zip(np.atleast_1d(lat1), np.atleast_1d(lon1), np.atleast_1d(lat2), np.atleast_1d(lon2))
+    ], dtype=float)
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+DISTANCE_BACKENDS = {
+    "geodesic": geodesic_km,
+    "haversine": haversine_km,
+}
+
+
+def get_distance_backend(name: Optional[str] = None) -> Callable:
+    name = name or GEO_DISTANCE_BACKEND
+    if name not in DISTANCE_BACKENDS:
+        raise ValueError(f"Unknown distance backend {name!r}, expected one of {sorted(DISTANCE_BACKENDS)}")
+    return DISTANCE_BACKENDS[name]
+
+
+def geo_shift_scores(last_contexts: List[Optional[dict]], current_contexts: List[dict],
+                     backend: Optional[str] = None) -> np.ndarray:
+    # Impossible-travel score for each (previous, current) context pair,
+    # 0 when there is no previous context or it has no coordinates.
+    # Distances for all pairs come from one backend call.
+    scores = np.zeros(len(current_contexts))
+
+    pairs = []
+    for i, (last_context, context) in enumerate(zip(last_contexts, current_contexts)):
+        if not last_context:
+            continue
+        last_loc = last_context.get("location", {})
+        if "latitude" in last_loc and "longitude" in last_loc:
+            pairs.append((i, last_loc, context.get("location", {})))
+    if not pairs:
+        return scores
+
+    index = np.array([i for i, _, _ in pairs])
+    coords = np.array([
+        (last_loc["latitude"], last_loc["longitude"], current_loc["latitude"], current_loc["longitude"])
+        for _, last_loc, current_loc in pairs
+    ], dtype=float)
+    distance_km = get_distance_backend(backend)(coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3])
+
+    # Time deltas in seconds; non-positive deltas score 0
+    seconds = np.array([
+        (datetime.fromisoformat(current_loc.get("timestamp")) - datetime.fromisoformat(last_loc.get("timestamp"))).total_seconds()
+        for _, last_loc, current_loc in pairs
+    ], dtype=float)
+
+    moving = seconds > 0
+    time_diff_hours = np.abs(seconds[moving]) / 3600
+    expected_max_distance = time_diff_hours * MAX_TRAVEL_KMH
+    scores[index[moving]] = np.minimum((distance_km[moving] / expected_max_distance) * 100, 100)
+    return scores
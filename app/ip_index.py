@@ -0,0 +1,275 @@
+import os
+import sys
+import gzip
+import mmap
+import socket
+import struct
+import argparse
+import ipaddress
+import threading
+from array import array
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
+
+# Compiled IP -> ASN index (build it with --build from an ip2asn TSV)
+IP_INDEX_PATH = os.environ.get("IP_INDEX_PATH", os.path.join("ip_index", "ip2asn.bin"))
+# Distinct IPs whose lookups are kept per process
+IP_INDEX_CACHE_SIZE = int(os.environ.get("IP_INDEX_CACHE_SIZE", "65536"))
+
+# File layout, all little-endian:
+#   header   MAGIC, node_count, record_count, v4_root, v6_root, strings_size
+#   nodes    node_count x (child_0, child_1) uint32
+#   records  record_count x (asn uint32, country 2 bytes, name_offset uint32,
+#            name_size uint16, prefix_offset uint32, prefix_size uint16), one
+#            per source range
+#   strings  UTF-8 AS names (each stored once) and range labels
+# A child below node_count is another node, node_count means "no data", and
+# node_count + 1 + r is record r. IPv4 and IPv6 have separate roots in the
+# same node array, so a lookup walks at most 32 or 128 nodes.
+MAGIC = b"IPTRIE01"
+HEADER = struct.Struct("<8sIIIII")
+RECORD = struct.Struct("<I2sIHIH")
+# ::ffff:a.b.c.d is looked up as a.b.c.d
+IPV4_MAPPED = bytes(10) + b"\xff\xff"
+
+
+def range_label(first, last) -> str:
+    # The dataset range an address resolved to: a CIDR prefix when it is
+    # one, else "first-last" (ip2asn ranges need not be CIDR-aligned)
+    networks = list(ipaddress.summarize_address_range(first, last))
+    return str(networks[0]) if len(networks) == 1 else f"{first}-{last}"
+
+
+class IPIndexBuilder:
+    # Binary prefix trie built in memory from (first, last, asn, country, name)
+    # ranges, which are split into CIDR prefixes. ip2asn ranges do not
+    # overlap; where prefixes do, a more specific one added later wins for
+    # its addresses, and a broader one added later only fills the gaps.
+
+    def __init__(self):
+        # Children: 0 is "no data", n > 0 node n, -(r + 1) record r. Node 0
+        # and 1 are the roots and never anyone's child.
+        self.left = array("i")
+        self.right = array("i")
+        self.records = []
+        self.roots = {4: self._new_node(), 6: self._new_node()}
+
+    def _new_node(self, value: int = 0) -> int:
+        self.left.append(value)
+        self.right.append(value)
+        return len(self.left) - 1
+
+    def add_prefix(self, network, record: int):
+        value = -(record + 1)
+        bits = network.max_prefixlen
+        address = int(network.network_address)
+        node = self.roots[network.version]
+        if network.prefixlen == 0:
+            self._fill(node, value)
+            return
+        for depth in range(network.prefixlen):
+            branch = self.right if (address >> (bits - 1 - depth)) & 1 else self.left
+            child = branch[node]
+            if depth == network.prefixlen - 1:
+                if child > 0:
+                    # More specific prefixes below: keep them
+                    self._fill(child, value)
+                else:
+                    branch[node] = value
+                return
+            if child <= 0:
+                # Empty, or a record covering more than this prefix: push it down
+                child = self._new_node(child)
+                branch[node] = child
+            node = child
+
+    def _fill(self, node: int, value: int):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for branch in (self.left, self.right):
+                child = branch[node]
+                if child > 0:
+                    stack.append(child)
+                elif child == 0:
+                    branch[node] = value
+
+    def add_range(self, first: str, last: str, asn: int, country: str, name: str):
+        first_ip, last_ip = ipaddress.ip_address(first), ipaddress.ip_address(last)
+        record = len(self.records)
+        self.records.append((asn, country, name, first_ip, last_ip))
+        for network in ipaddress.summarize_address_range(first_ip, last_ip):
+            self.add_prefix(network, record)
+
+    def write(self, path: str):
+        node_count = len(self.left)
+        names = bytearray()
+        name_offsets = {}
+        records = bytearray()
+        for asn, country, name, first, last in self.records:
+            encoded = name.encode("utf-8")[:65535]
+            if encoded not in name_offsets:
+                name_offsets[encoded] = len(names)
+                names += encoded
+            label = range_label(first, last).encode("ascii")
+            records += RECORD.pack(asn, country.encode("ascii", "replace")[:2].ljust(2), name_offsets[encoded],
+                                   len(encoded), len(names), len(label))
+            names += label
+
+        def encode(child: int) -> int:
+            if child > 0:
+                return child
+            return node_count if child == 0 else node_count - child
+
+        nodes = array("I", bytes(8 * node_count))
+        for i in range(node_count):
+            nodes[2 * i] = encode(self.left[i])
+            nodes[2 * i + 1] = encode(self.right[i])
+        if sys.byteorder != "little":
+            nodes.byteswap()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, node_count, len(self.records), self.roots[4], self.roots[6], len(names)))
+            f.write(nodes.tobytes())
+            f.write(records)
+            f.write(names)
+        os.replace(tmp_path, path)
+
+
+def read_ip2asn(path: str) -> Iterable[Tuple[str, str, int, str, str]]:
+    # iptoasn.com-style TSV (optionally gzipped):
+    #   range_start  range_end  AS_number  country_code  AS_description
+    # AS 0 marks unrouted space and is skipped
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) < 3:
+                continue
+            asn = int(parts[2])
+            if asn == 0:
+                continue
+            country = parts[3] if len(parts) > 3 else ""
+            name = parts[4] if len(parts) > 4 else ""
+            yield parts[0], parts[1], asn, country, name
+
+
+def build_index(source: str, output: str) -> dict:
+    builder = IPIndexBuilder()
+    ranges = 0
+    for first, last, asn, country, name in read_ip2asn(source):
+        builder.add_range(first, last, asn, country, name)
+        ranges += 1
+    builder.write(output)
+    return {"ranges": ranges, "nodes": len(builder.left), "records": len(builder.records),
+            "bytes": os.path.getsize(output)}
+
+
+class IPIndex:
+    # Read-only view of a compiled index. The file is memory-mapped, so
+    # every worker shares one copy in the page cache and opening is O(1).
+
+    def __init__(self, path: str = IP_INDEX_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.node_count, self.record_count, v4_root, v6_root, _ = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compiled IP index")
+        if sys.byteorder != "little":
+            raise ValueError("Compiled IP indexes are little-endian")
+        # Keyed by packed address length
+        self._roots = {4: (v4_root, "032b"), 16: (v6_root, "0128b")}
+
+        self._view = view = memoryview(self._mmap)
+        nodes_start = HEADER.size
+        records_start = nodes_start + 8 * self.node_count
+        self._names_start = records_start + RECORD.size * self.record_count
+        self._nodes = view[nodes_start:records_start].cast("I")
+        self._records = view[records_start:self._names_start]
+        self.lookup = lru_cache(maxsize=IP_INDEX_CACHE_SIZE)(self._lookup)
+
+    def _record(self, record: int) -> dict:
+        asn, country, name_offset, name_size, prefix_offset, prefix_size = RECORD.unpack_from(
+            self._records, record * RECORD.size
+        )
+        strings = self._names_start
+        return {
+            "asn": asn,
+            "country": country.decode("ascii", "replace").strip(),
+            "as_name": self._mmap[strings + name_offset:strings + name_offset + name_size].decode("utf-8", "replace"),
+            "prefix": self._mmap[strings + prefix_offset:strings + prefix_offset + prefix_size].decode("ascii"),
+        }
+
+    def _lookup(self, ip: str) -> Optional[dict]:
+        # {"asn", "country", "as_name", "prefix"} for the range holding ip,
+        # or None for unparsable / unrouted addresses
+        try:
+            packed = socket.inet_pton(socket.AF_INET6 if ":" in ip else socket.AF_INET, ip)
+        except (OSError, TypeError, ValueError):
+            return None
+        if len(packed) == 16 and packed[:12] == IPV4_MAPPED:
+            packed = packed[12:]
+
+        node, bit_format = self._roots[len(packed)]
+        nodes = self._nodes
+        node_count = self.node_count
+        # One trie level per address bit, most significant first
+        for bit in format(int.from_bytes(packed, "big"), bit_format):
+            child = nodes[2 * node + (bit == "1")]
+            if child >= node_count:
+                return None if child == node_count else self._record(child - node_count - 1)
+            node = child
+        return None
+
+    def close(self):
+        self.lookup.cache_clear()
+        self._nodes.release()
+        self._records.release()
+        self._view.release()
+        self._mmap.close()
+
+
+_index = None
+_index_loaded = False
+_index_lock = threading.Lock()
+
+
+def get_ip_index() -> Optional[IPIndex]:
+    # The process-wide index, or None when no compiled file is present
+    global _index, _index_loaded
+    if not _index_loaded:
+        with _index_lock:
+            if not _index_loaded:
+                if os.path.exists(IP_INDEX_PATH):
+                    _index = IPIndex(IP_INDEX_PATH)
+                    print(f"🌐 Loaded IP index {IP_INDEX_PATH} ({_index.node_count} nodes, {_index.record_count} networks)")
+                else:
+                    print(f"⚠️ No IP index at {IP_INDEX_PATH}; network shift falls back to subnet comparison")
+                _index_loaded = True
+    return _index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile and query the local IP -> ASN index")
+    parser.add_argument("--build", metavar="TSV", help="ip2asn TSV (.tsv or .tsv.gz) to compile")
+    parser.add_argument("--output", default=IP_INDEX_PATH)
+    parser.add_argument("--lookup", nargs="*", metavar="IP")
+    args = parser.parse_args()
+
+    if args.build:
+        info = build_index(args.build, args.output)
+        print(f"🌐 Compiled {info['ranges']} ranges into {args.output}: "
+              f"{info['nodes']} nodes, {info['records']} networks, {info['bytes'] / 1e6:.1f} MB")
+    if args.lookup:
+        index = IPIndex(args.output)
+        for ip in args.lookup:
+            print(ip, index.lookup(ip))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,67 +1,120 @@
 import pandas as pd
 import os
 import json
+import asyncio
 
 from datetime import datetime
 from pydantic import BaseModel
-from fastapi import FastAPI, HTTPException, APIRouter
-from typing import List
-
-from app.model_manager import ModelManager
-from app.analyze_context import analyze_context
-from app.analyze_context import save_cached_context
-
-app = FastAPI()
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, ORJSONResponse
+from typing import List, Optional
+
+from app.model_manager import ModelManager, MODEL_DIR, training_lock
+from app.training_scheduler import TrainingScheduler, delete_job_status
+from app.risk_log import RiskLogStore
+from app.context_store import context_store
+from app.analyze_context import analyze_context, analyze_session_context
+from app.metrics import metrics, MetricsMiddleware
+from app.concurrency import run_cpu, run_io, user_lock
+from app.prewarm import start_prewarm, prewarm_status
+from app.session_stream import SessionStream, INVALID_SNAPSHOT_ERRORS
+from app.session_view import SessionView
+from app.flatten_snapshot import loads, dumps, snapshot_vector, snapshot_matrix
+from app.feature_store import FEATURES
+
+app = FastAPI(default_response_class=ORJSONResponse)
+app.add_middleware(MetricsMiddleware, registry=metrics)
 model_manager = ModelManager()
+training_scheduler = TrainingScheduler(model_manager)
+risk_log = RiskLogStore()
+session_view = SessionView(model_manager.sessions)
 
-DEVICE_PROFILE_DIR = "device_profiles"
-os.makedirs(DEVICE_PROFILE_DIR, exist_ok=True)
+# Sessions with a mean risk at or above this are quarantined, not stored
+QUARANTINE_RISK = 58
+# Largest page /all-users-meta serves
+ALL_USERS_MAX_PAGE = int(os.environ.get("ALL_USERS_MAX_PAGE", "1000"))
+# Most sessions one /session-data page serves
+SESSION_DATA_MAX_PAGE = int(os.environ.get("SESSION_DATA_MAX_PAGE", "100"))
 
 class DeviceInfo(BaseModel):
     os: str
     os_version: str
     device_model: str
 
-def flatten_snapshot(data: dict) -> dict:
-    
-    return {
-        # tap data
-        "tap_duration": data.get("tap_data", {}).get("tap_duration"),
-
-        # typing data
-        "inter_key_delay_avg": data.get("typing_data", {}).get("inter_key_delay_avg"),
-        "key_press_duration_avg": data.get("typing_data", {}).get("key_press_duration_avg"),
-        "typing_error_rate": data.get("typing_data", {}).get("typing_error_rate"),
-
-        # swipe and scroll
-        "swipe_speed": data.get("swipe_data", {}).get("swipe_speed"),
-        "swipe_angle": data.get("swipe_data", {}).get("swipe_angle"),
-        "scroll_distance": data.get("scroll_data", {}).get("scroll_distance"),
-        "scroll_velocity": data.get("scroll_data", {}).get("scroll_velocity"),
-
-        # sensors
-        "gyro_variance": data.get("sensor_data", {}).get("gyro_variance"),
-        "accelerometer_noise": data.get("sensor_data", {}).get("accelerometer_noise"),
-
-        # session meta
-        "session_duration_sec": data.get("session_metadata", {}).get("session_duration_sec"),
-        "session_start_hour": data.get("session_metadata", {}).get("session_start_hour"),
-        "screen_transition_count": data.get("session_metadata", {}).get("screen_transition_count"),
-        "avg_dwell_time_per_screen": data.get("session_metadata", {}).get("avg_dwell_time_per_screen")
-    }
+def collect_runtime_metrics():
+    cache = model_manager.cache_stats()
+    return [
+        ("counter", "model_cache_hits_total", cache["hits"]),
+        ("counter", "model_cache_misses_total", cache["misses"]),
+        ("counter", "model_cache_evictions_total", cache["evictions"]),
+        ("gauge", "model_cache_entries", cache["entries"]),
+        ("gauge", "model_cache_bytes", cache["bytes"]),
+        ("gauge", "training_queue_depth", training_scheduler.pending_count()),
+    ]
+
+
+metrics.register_collector(collect_runtime_metrics)
+
+
+@app.on_event("startup")
+def start_metrics():
+    metrics.start()
+
+
+@app.on_event("shutdown")
+def flush_metrics():
+    metrics.stop()
+
+
+@app.on_event("startup")
+def start_context_store():
+    context_store.start()
+
+
+@app.on_event("shutdown")
+def flush_context_store():
+    # Write back every pending context before the worker exits
+    context_store.stop()
+
+
+@app.on_event("startup")
+def migrate_risk_logs():
+    # One-off import of legacy risks/{user_id}.json files; a no-op once done
+    imported = risk_log.import_json_dir()
+    if imported:
+        print(f"📦 Imported legacy risk logs for {len(imported)} users")
+
+
+@app.on_event("startup")
+def build_user_index():
+    # One-off backfill of the user summary index from models/*_meta.json and
+    # the risk log; a no-op once built
+    count = model_manager.user_index.rebuild(MODEL_DIR, model_manager.has_model, force=False)
+    if count is not None:
+        print(f"📇 Built user summary index for {count} users")
+
+
+@app.on_event("startup")
+def start_model_prewarm():
+    # Background thread; the worker starts serving without waiting for it
+    start_prewarm(model_manager, risk_log)
+
+
+@app.on_event("shutdown")
+def shutdown_training():
+    # Let in-flight fits finish so their models get published
+    training_scheduler.shutdown(wait_for_jobs=True)
 
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "Behavior Auth API is running"}
 
 @app.post("/store-device-profile/{user_id}")
-def store_device_profile(user_id: str, device_info: DeviceInfo):
-    profile_path = os.path.join(DEVICE_PROFILE_DIR, f"{user_id}.json")
-    
+async def store_device_profile(user_id: str, device_info: DeviceInfo):
     try:
-        with open(profile_path, "w") as f:
-            json.dump(device_info.dict(), f, indent=4)
+        async with user_lock(user_id):
+            await run_io(context_store.set_profile, user_id, device_info.dict())
         return {"message": f"Device profile stored for user {user_id}."}
     
     except Exception as e:
@@ -69,12 +122,10 @@ def store_device_profile(user_id: str, device_info: DeviceInfo):
 
 
 @app.get("/device-profile/{user_id}")
-def get_device_profile(user_id: str):
-    profile_path = os.path.join("device_profiles", f"{user_id}.json")
+async def get_device_profile(user_id: str):
+    profile = await run_io(context_store.get_profile, user_id)
     
-    if os.path.exists(profile_path):
-        with open(profile_path, "r") as f:
-            profile = json.load(f)
+    if profile is not None:
         return {
             "user_id": user_id,
             "device_profile": profile
@@ -85,196 +136,351 @@ def get_device_profile(user_id: str):
             "message": "⚠️ Device profile not found. User may not be authenticated yet."
         }
 
+async def _read_json(request: Request) -> dict:
+    # orjson straight from the body bytes, skipping FastAPI's generic
+    # body parsing; errors keep FastAPI's 422 for a body that isn't a JSON
+    # object (as the old `data: dict` parameters returned)
+    try:
+        data = loads(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid JSON: {e}")
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=422, detail="Expected a JSON object")
+    return data
+
 @app.post("/predict")
-def predict(data: dict):
+async def predict(request: Request):
+    data = await _read_json(request)
     user_id = data["user_id"]
     
     context = data.get("context", {})
-    context_score = analyze_context(user_id, context)
+    with metrics.timer("flatten_snapshot"):
+        x = snapshot_vector(data)
+
+    # Context read -> score -> context write must not interleave with
+    # another request for the same user
+    async with user_lock(user_id):
+        with metrics.timer("analyze_context"):
+            context_score = await run_io(analyze_context, user_id, context)
     
-    snapshot = flatten_snapshot(data)
-    risk = model_manager.predict_risk(user_id, snapshot)
+        with metrics.timer("predict_risk"):
+            risk = await run_cpu(model_manager.predict_risk_vector, user_id, x)
     
-    os.makedirs("risks", exist_ok=True)
-    risk_log_path = os.path.join("risks", f"{user_id}.json")
-    log_entry = {"timestamp": datetime.now().isoformat(), "risk": risk, **context_score}
-    if os.path.exists(risk_log_path):
-        with open(risk_log_path, "r") as f:
-            log = json.load(f)
-    else:
-        log=[]
-    log.append(log_entry)
-    with open(risk_log_path, "w") as f:
-        json.dump(log[-20:], f, indent=2)
+        log_entry = {"timestamp": datetime.now().isoformat(), "risk": risk, **context_score}
+        with metrics.timer("risk_log_append"):
+            await run_io(risk_log.append, user_id, [log_entry])
     
-    return {"user_id": user_id, "risk_score": risk, **context_score}
-
-@app.post("/end-session")
-def end_session(data: dict):
-    user_id = data["user_id"]
-    snapshots: List[dict] = data["snapshots"]
-    
-    #Flatten all snapshots
-    flattened_snapshots = []
-    context_scores_list = []
-    risks = []
-
-    for snapshot in snapshots:
-        # Flatten core features
-        flat = flatten_snapshot(snapshot)
-        flattened_snapshots.append(flat)
-
-        # Analyze context
-        context_data = snapshot.get("context", {})
-        context_scores = analyze_context(user_id, context_data)
-        context_scores_list.append(context_scores)
-        
-        risk = model_manager.predict_risk(user_id, flat)
-        risks.append(risk)
+    return ORJSONResponse({"user_id": user_id, "risk_score": risk, **context_score})
+
+def _predict_user_batch(user_id: str, user_snapshots: List[dict]):
+    with metrics.timer("analyze_context"):
+        context_scores_list = analyze_session_context(
+            user_id, [snapshot.get("context", {}) for snapshot in user_snapshots]
+        )
+    with metrics.timer("flatten_snapshot"):
+        X = snapshot_matrix(user_snapshots)
+    with metrics.timer("predict_risk"):
+        risks = model_manager.predict_risk_matrix(user_id, X)
+    return risks, context_scores_list
+
+@app.post("/predict-batch")
+async def predict_batch(request: Request):
+    data = await _read_json(request)
+    snapshots: List[dict] = data.get("snapshots")
+    # Same check as the router's, so a bad body is a 400 either way
+    if not isinstance(snapshots, list) or not all(
+        isinstance(snapshot, dict) and isinstance(snapshot.get("user_id"), str) for snapshot in snapshots
+    ):
+        raise HTTPException(status_code=400, detail="Expected {\"snapshots\": [...]}, each with a user_id")
+
+    # Group by user, keeping arrival order inside each group so the
+    # context cache sees the snapshots in the same order as /predict would
+    user_indices = {}
+    for index, snapshot in enumerate(snapshots):
+        user_indices.setdefault(snapshot["user_id"], []).append(index)
+
+    results = [None] * len(snapshots)
+
+    async def score_user(user_id: str, indices: List[int]):
+        user_snapshots = [snapshots[i] for i in indices]
+        async with user_lock(user_id):
+            risks, context_scores_list = await run_cpu(_predict_user_batch, user_id, user_snapshots)
+
+            timestamp = datetime.now().isoformat()
+            with metrics.timer("risk_log_append"):
+                await run_io(risk_log.append, user_id, [
+                    {"timestamp": timestamp, "risk": risk, **context_scores}
+                    for risk, context_scores in zip(risks, context_scores_list)
+                ])
+
+        for index, risk, context_scores in zip(indices, risks, context_scores_list):
+            results[index] = {"user_id": user_id, "risk_score": risk, **context_scores}
+
+    # Different users run in parallel, each one in order
+    await asyncio.gather(*(score_user(user_id, indices) for user_id, indices in user_indices.items()))
+
+    return ORJSONResponse({"count": len(results), "results": results})
+
+def _score_session(user_id: str, snapshots: List[dict], base_profile, last_context):
+    # All snapshots as one float matrix in FEATURES order
+    with metrics.timer("flatten_snapshot"):
+        X = snapshot_matrix(snapshots)
+
+    # Analyze context in memory: each snapshot is compared with the one before it
+    with metrics.timer("analyze_context"):
+        context_scores_list = analyze_session_context(
+            user_id,
+            [snapshot.get("context", {}) for snapshot in snapshots],
+            base_profile=base_profile,
+            last_context=last_context,
+        )
         
-    session_df = pd.DataFrame(flattened_snapshots)
-    
+    session_df = pd.DataFrame(X, columns=FEATURES)
     
+    # Score the whole session in one pass
+    with metrics.timer("predict_risk"):
+        risks = model_manager.predict_risk_matrix(user_id, X)
+    return session_df, context_scores_list, risks
+
+def _load_session_state(user_id: str):
+    return context_store.get_profile(user_id), context_store.get_context(user_id)
+
+def _store_quarantined_session(user_id: str, session_df: pd.DataFrame) -> str:
+    # Numbered under the quarantine index lock, so concurrent workers never
+    # collide and nothing lists the directory
+    _, quarantine_path = model_manager.quarantine.add_session(user_id, session_df)
+    return quarantine_path
+
+def _store_session(user_id: str, session_df: pd.DataFrame) -> int:
+    # The feature store's session counter numbers the session (no listdir)
+    with metrics.timer("feature_store_append"):
+        next_session_number = model_manager.feature_store.append_session(user_id, session_df)
+    model_manager.sessions.write_session(user_id, next_session_number, session_df)
+    return next_session_number
+
+def _schedule_retrain(user_id: str, next_session_number: int):
+    training_status = None
+    if next_session_number >= 3:
+        # Retrain only on drift or staleness once a model exists
+        retrain, trigger = model_manager.retrain_decision(user_id)
+        if retrain:
+            print(f"\n📚 Scheduling retrain ({trigger['reason']}) on {min(next_session_number, 15)} most recent sessions")
+            training_status = training_scheduler.submit(user_id, trigger)
+        else:
+            print(f"\n✅ No drift for {user_id}, skipping retrain")
+    else:
+        print(f"\nNot enough sessions to retrain (have {next_session_number})")
+    return training_status
+
+async def _finalize_session(user_id: str, session_df: pd.DataFrame, context_scores_list: List[dict],
+                            risks: List[float], last_context: Optional[dict]):
+    # Store / quarantine / retrain for a scored session; the caller holds
+    # the user's lock
     session_risk = round(sum(risks) / len(risks), 2) if risks else 0
 
-    if snapshots:
-        last_snapshot = snapshots[-1]
-        context = last_snapshot.get("context", {})
-        save_cached_context(user_id, context)
+    if last_context is not None:
+        context_store.set_context(user_id, last_context)
     # Determine where to save based on risk
-    if session_risk >= 58:
-        quarantine_dir = os.path.join("quarantine", user_id)
-        os.makedirs(quarantine_dir, exist_ok=True)
-        existing_quarantine = [
-            f for f in os.listdir(quarantine_dir)
-            if f.startswith("session_") and f.endswith(".csv")
-        ]
-        next_quarantine_number = len(existing_quarantine) + 1
-        quarantine_path = os.path.join(quarantine_dir, f"session_{next_quarantine_number}.csv")
-        session_df.to_csv(quarantine_path, index=False)
-
+    if session_risk >= QUARANTINE_RISK:
+        await run_io(_store_quarantined_session, user_id, session_df)
         return {"message": f"⚠️ High-risk session quarantined. Risk = {session_risk:.2f}", "context_scores": context_scores_list}
-    
-    user_dir = os.path.join("data", user_id)
-    os.makedirs(user_dir, exist_ok=True)
-    
-    existing = [f for f in os.listdir(user_dir) if f.startswith("session_") and f.endswith(".csv")]
-    next_session_number = len(existing) + 1
-    session_path = os.path.join(user_dir, f"session_{next_session_number}.csv")
-    session_df.to_csv(session_path, index=False)
-    
-    if next_session_number >= 3:
-        print(f"\n📚 Retraining on {min(len(existing) + 1, 15)} most recent sessions")
-        model_manager._train_model(user_id)
-    else:
-        print(f"\nNot enough sessions to retrain (have {len(existing) + 1})")
+
+    next_session_number = await run_io(_store_session, user_id, session_df)
+    # Per-snapshot scores next to the stored session, for /session-data
+    await run_io(session_view.record, user_id, next_session_number, session_df, risks, context_scores_list)
+
+    with metrics.timer("drift_update"):
+        await run_cpu(model_manager.record_session, user_id, session_df)
+
+    training_status = await run_io(_schedule_retrain, user_id, next_session_number)
 
     return {
         "message": f"✅ Session {next_session_number} stored for {user_id}",
         "risk_score": session_risk,
-        "context_scores": context_scores_list
+        "context_scores": context_scores_list,
+        "training_status": training_status
     }
 
-@app.get("/model-meta/{user_id}")
-def get_model_metadata(user_id: str):
+@app.post("/end-session")
+async def end_session(request: Request):
+    data = await _read_json(request)
+    user_id = data["user_id"]
+    snapshots: List[dict] = data["snapshots"]
+
+    async with user_lock(user_id):
+        base_profile, last_context = await run_io(_load_session_state, user_id)
+        session_df, context_scores_list, risks = await run_cpu(
+            _score_session, user_id, snapshots, base_profile, last_context
+        )
+        return ORJSONResponse(await _finalize_session(
+            user_id, session_df, context_scores_list, risks,
+            snapshots[-1].get("context", {}) if snapshots else None,
+        ))
+
+async def _open_stream(user_id: str) -> SessionStream:
+    async with user_lock(user_id):
+        base_profile, last_context = await run_io(_load_session_state, user_id)
+    return await run_io(SessionStream, model_manager, user_id, base_profile, last_context)
+
+async def _finalize_stream(stream: SessionStream):
+    # Scoring already happened chunk by chunk; only storage is left, under
+    # the lock like /end-session
+    async with user_lock(stream.user_id):
+        result = await _finalize_session(
+            stream.user_id, stream.session_frame(), stream.context_scores, stream.risks, stream.last_context
+        )
+    return {**result, "snapshot_count": stream.snapshot_count}
+
+@app.websocket("/stream-session/{user_id}")
+async def stream_session_ws(websocket: WebSocket, user_id: str):
+    # Each message is a snapshot, or {"snapshots": [...]}; every one is
+    # answered with its scores and the running session aggregate.
+    # {"end": true} (or the client going away) finalizes the session.
+    await websocket.accept()
+    stream = await _open_stream(user_id)
+    connected = True
+    result = None
+    try:
+        while True:
+            try:
+                message = loads(await websocket.receive_text())
+            except ValueError as e:
+                await websocket.send_text(dumps({"error": f"Invalid JSON: {e}"}).decode())
+                continue
+            if not isinstance(message, dict):
+                await websocket.send_text(dumps({"error": "Each message must be a JSON object"}).decode())
+                continue
+            if message.get("end"):
+                break
+            snapshots = message["snapshots"] if "snapshots" in message else [message]
+            try:
+                scores = await run_cpu(stream.add, snapshots)
+            except INVALID_SNAPSHOT_ERRORS as e:
+                # Nothing from this message was kept; the session goes on
+                await websocket.send_text(dumps({"error": f"Invalid snapshot: {e}"}).decode())
+                continue
+            await websocket.send_text(dumps({"scores": scores, "session": stream.summary()}).decode())
+    except WebSocketDisconnect:
+        connected = False
+    finally:
+        # Snapshots scored so far are stored however the stream ended; an
+        # unexpected error still propagates afterwards
+        if stream.snapshot_count:
+            result = await _finalize_stream(stream)
+
+    if connected:
+        if result is None:
+            result = {"message": "No snapshots received, nothing stored"}
+        await websocket.send_text(dumps(result).decode())
+        await websocket.close()
+
+@app.post("/stream-session/{user_id}")
+async def stream_session_ndjson(user_id: str, request: Request):
+    # Chunked NDJSON upload, one snapshot per line. Lines are scored as
+    # each chunk arrives, so when the body ends only storage is left.
+    stream = await _open_stream(user_id)
+    buffer = b""
+    line_number = 0
+
+    async def score_lines(lines: List[bytes]):
+        nonlocal line_number
+        snapshots = []
+        for line in lines:
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                snapshot = loads(line)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid JSON on line {line_number}: {e}")
+            if not isinstance(snapshot, dict):
+                raise HTTPException(status_code=400, detail=f"Line {line_number} is not a JSON object")
+            snapshots.append(snapshot)
+        if snapshots:
+            try:
+                await run_cpu(stream.add, snapshots)
+            except INVALID_SNAPSHOT_ERRORS as e:
+                raise HTTPException(status_code=400, detail=f"Invalid snapshot before line {line_number + 1}: {e}")
+
+    async for chunk in request.stream():
+        buffer += chunk
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        await score_lines(lines)
+    await score_lines([buffer])
+
+    if stream.snapshot_count == 0:
+        raise HTTPException(status_code=400, detail="No snapshots received")
+    return ORJSONResponse(await _finalize_stream(stream))
+
+def _load_model_metadata(user_id: str):
     meta_path = os.path.join("models", f"{user_id}_meta.json")
+    training_job = training_scheduler.status(user_id)
     if os.path.exists(meta_path):
         with open(meta_path, "r") as f:
             metadata = json.load(f)
-        return metadata
+        return {**metadata, "training_job": training_job}
     else:
-        return {"message": "Metadata not available. Model may not be trained yet"}
+        return {"message": "Metadata not available. Model may not be trained yet", "training_job": training_job}
+
+@app.get("/model-meta/{user_id}")
+async def get_model_metadata(user_id: str):
+    return await run_io(_load_model_metadata, user_id)
     
 
+@app.get("/model-cache-stats")
+async def get_model_cache_stats():
+    return {"pid": os.getpid(), **model_manager.cache_stats(), "prewarm": prewarm_status}
+
+
 @app.get("/all-users-meta")
-def get_all_users_metadata():
-    user_metas = []
-    model_dir = "models"
-    risk_dir = "risks"
-    
-    for filename in os.listdir(model_dir):
-        if filename.endswith("_meta.json"):
-            user_id = filename.replace("_meta.json", "")
-            meta_path = os.path.join(model_dir, filename)
-            model_path = os.path.join(model_dir, f"{user_id}_model.pkl")
-            risk_path = os.path.join(risk_dir, f"{user_id}.json")
-            
-            with open(meta_path, "r") as f:
-                metadata = json.load(f)
-                
-            trained = os.path.exists(model_path)
-            latest_risk = None
-            if os.path.exists(risk_path):
-                with open(risk_path, "r") as rf:
-                    risk_log = json.load(rf)
-                    if risk_log:
-                        latest_risk = risk_log[-1]["risk"]
-            user_metas.append({
-                "user_id": user_id,
-                "trained": trained,
-                "latest_risk": latest_risk,
-                **metadata,
-            })
-    return user_metas
+async def get_all_users_metadata(limit: int = 100, cursor: Optional[str] = None, sort: str = "user_id",
+                                 order: str = "asc", trained: Optional[bool] = None,
+                                 include_untrained: bool = False):
+    if not 1 <= limit <= ALL_USERS_MAX_PAGE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {ALL_USERS_MAX_PAGE}")
+    try:
+        return await run_io(model_manager.user_index.page, limit, sort, order, trained, cursor, include_untrained)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/session-data/{user_id}")
-def get_session_data(user_id: str):
-    
-    user_dir = os.path.join("data", user_id)
-    session_data = []
-    
-    if not os.path.exists(user_dir):
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    # Prometheus text exposition, merged across all workers
+    return PlainTextResponse(await run_io(metrics.render), media_type="text/plain; version=0.0.4")
+
+def _load_session_data(user_id: str, limit: int, cursor: Optional[str], columns: Optional[List[str]]):
+    if not cursor and model_manager.sessions.count(user_id) == 0:
         return {"message": "User has no session data yet."}
-    
-    # load upto 10 sessions
-    session_files = sorted([
-        f for f in os.listdir(user_dir) if f.startswith("session_") and f.endswith(".csv")
-    ])[-10:]
-    
-    
-    # load full risk logs
-    risk_path = os.path.join("risks", f"{user_id}.json")
-    risk_log = []
-    if os.path.exists(risk_path):
-        with open(risk_path, "r") as rf:
-            risk_log = json.load(rf)
-            
-    all_snapshots = []
-    for filename in session_files:
-        path = os.path.join(user_dir, filename)
-        df = pd.read_csv(path)
-        snapshots = df.to_dict(orient="records")
-        all_snapshots.append((filename, snapshots))
-
-    # Reverse to keep most recent 10 entries (if >10 snapshots)
-    risk_log = risk_log[-sum(len(s) for _, s in all_snapshots):]
-
-    flat_index = 0
-    session_data = []
-
-    for filename, snapshots in all_snapshots:
-        for i in range(len(snapshots)):
-            if flat_index < len(risk_log):
-                context_entry = risk_log[flat_index]
-                snapshots[i]["risk"] = context_entry.get("risk", None)
-                snapshots[i]["geo_shift_score"] = context_entry.get("geo_shift_score", None)
-                snapshots[i]["network_shift_score"] = context_entry.get("network_shift_score", None)
-                snapshots[i]["device_mismatch_score"] = context_entry.get("device_mismatch_score", None)
-                flat_index += 1
-
-        session_data.append({
-            "filename": filename,
-            "snapshots": snapshots
-        })
 
+    page = session_view.page(user_id, limit, cursor, columns)
     return {
         "user_id": user_id,
-        "risk_log": risk_log[-10:],  # most recent 10 risk+context entries
-        "sessions": session_data
+        "risk_log": risk_log.last(user_id, 10),  # most recent 10 risk+context entries
+        **page,
     }
 
-@app.delete("/reset-user-data/{user_id}")
-def reset_user_data(user_id: str):
+@app.get("/session-data/{user_id}")
+async def get_session_data(user_id: str, limit: int = 10, cursor: Optional[str] = None, columns: Optional[str] = None):
+    # Sessions with per-snapshot scores, newest page first; columns is a
+    # comma-separated projection of the snapshot fields
+    if not 1 <= limit <= SESSION_DATA_MAX_PAGE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {SESSION_DATA_MAX_PAGE}")
+    selected = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+    try:
+        return await run_io(_load_session_data, user_id, limit, cursor, selected)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _delete_user_data(user_id: str):
+    training_scheduler.cancel(user_id)
+    # Bumping the generation waits out a model being published right now
+    # and makes any fit still queued or running, in any worker, drop its
+    # result instead of writing the user's files back
+    with training_lock(user_id, bump=True):
+        return _delete_user_files(user_id)
+
+def _delete_user_files(user_id: str):
     deleted = []
     user_session_dir = os.path.join("data", user_id)
     if os.path.exists(user_session_dir):
@@ -292,13 +498,34 @@ def reset_user_data(user_id: str):
             deleted.append(file_path)
         os.rmdir(quarantine_dir)
 
-    # Delete models and risk
-    for folder, suffix in [("models", "_model.pkl"), ("models", "_meta.json"), ("risks", ".json")]:
+    # Delete models and risk (.json.imported files are left over from
+    # earlier risk log migrations)
+    for folder, suffix in [("models", "_model.joblib"), ("models", "_model.pkl"), ("models", "_meta.json"), ("models", "_rescore.json"), ("risks", ".json"), ("risks", ".json.imported")]:
         path = os.path.join(folder, f"{user_id}{suffix}")
         if os.path.exists(path):
             os.remove(path)
             deleted.append(path)
+
+    if model_manager.feature_store.delete_user(user_id):
+        deleted.append(os.path.join(model_manager.feature_store.root, user_id))
+
+    removed_risks = risk_log.delete_user(user_id)
+    if removed_risks:
+        deleted.append(f"{risk_log.db_path}#{user_id} ({removed_risks} entries)")
+    model_manager.user_index.delete_user(user_id)
+    session_view.delete_user(user_id)
+
+    job_path = delete_job_status(user_id)
+    if job_path:
+        deleted.append(job_path)
+
+    # Drop this worker's cached model; other workers notice the missing file
+    model_manager.invalidate(user_id)
             
+    # Drop this worker's in-memory context state; other workers' pending
+    # flushes see the bumped generation and drop theirs
+    context_store.discard(user_id)
+
     # Delete device profile
     device_profile_path = os.path.join("device_profiles", f"{user_id}.json")
     if os.path.exists(device_profile_path):
@@ -311,3 +538,10 @@ def reset_user_data(user_id: str):
 
 
     return {"message": f"Reset completed for {user_id}", "deleted_files": deleted}
+
+@app.delete("/reset-user-data/{user_id}")
+async def reset_user_data(user_id: str):
+    # Waits for in-flight requests of this user, so none of them can write
+    # files back after the reset
+    async with user_lock(user_id):
+        return await run_io(_delete_user_data, user_id)
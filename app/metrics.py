@@ -0,0 +1,300 @@
+import os
+import json
+import time
+import atexit
+import bisect
+import threading
+from typing import Callable, Dict, List, Tuple
+
+METRICS_DIR = os.environ.get("METRICS_DIR", "metrics")
+# Seconds between dumps of this process's metrics for /metrics to merge
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "5.0"))
+# Another process's file not rewritten for this long is treated as left
+# over from a dead worker (covers pids reused after a restart)
+METRICS_STALE_AFTER = float(os.environ.get("METRICS_STALE_AFTER", "60"))
+METRICS_PREFIX = "behavior_auth_"
+
+# Upper bounds in seconds; +Inf is implicit
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_HELP = {
+    "request_duration_seconds": ("histogram", "HTTP request latency by route"),
+    "requests_total": ("counter", "HTTP requests by route and status"),
+    "stage_duration_seconds": ("histogram", "Latency of individual request stages"),
+    "model_cache_hits_total": ("counter", "Model cache hits"),
+    "model_cache_misses_total": ("counter", "Model cache misses, including stale versions"),
+    "model_cache_evictions_total": ("counter", "Models evicted by the LRU bounds"),
+    "model_cache_entries": ("gauge", "Models currently cached"),
+    "model_cache_bytes": ("gauge", "Approximate bytes of cached models"),
+    "retrain_requests_total": ("counter", "Retrains submitted, by trigger reason"),
+    "retrains_total": ("counter", "Finished retrain jobs, by outcome"),
+    "retrain_duration_seconds": ("histogram", "Wall time of background retrain jobs"),
+    "training_queue_depth": ("gauge", "Retrain jobs queued or running"),
+}
+
+
+def _label_key(labels: dict) -> Tuple:
+    return tuple(sorted(labels.items()))
+
+
+class Metrics:
+    # Per-process counters, histograms and collected gauges. Recording is a
+    # dict lookup and a few additions under a lock. Each gunicorn worker
+    # dumps its values to METRICS_DIR/metrics_{pid}.json periodically, and
+    # /metrics merges the files of live workers. Files of dead or stale
+    # workers are deleted when rendering, so their counters drop out the
+    # way a restarted process's would.
+
+    def __init__(self, directory: str = METRICS_DIR, flush_interval: float = METRICS_FLUSH_INTERVAL,
+                 stale_after: float = METRICS_STALE_AFTER):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.stale_after = max(stale_after, 2 * flush_interval)
+        self._counters: Dict[Tuple, float] = {}  # (name, label_key) -> value
+        self._histograms: Dict[Tuple, List[float]] = {}  # (name, label_key) -> bucket counts + [sum, count]
+        self._collectors: List[Callable] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # -------------------------------
+    # Recording
+    # -------------------------------
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        self._observe((name, _label_key(labels)), seconds)
+
+    def _observe(self, key: Tuple, seconds: float):
+        index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            values = self._histograms.get(key)
+            if values is None:
+                values = self._histograms[key] = [0.0] * (len(LATENCY_BUCKETS) + 3)
+            values[index] += 1
+            values[-2] += seconds
+            values[-1] += 1
+
+    def timer(self, stage: str) -> "StageTimer":
+        # with metrics.timer("decision_function"): ...
+        return StageTimer(self, ("stage_duration_seconds", (("stage", stage),)))
+
+    def register_collector(self, collector: Callable):
+        # collector() -> [(kind, name, value)], read only when metrics are
+        # dumped, for values the app already tracks (cache stats, queue depth)
+        self._collectors.append(collector)
+
+    # -------------------------------
+    # Per-process dump
+    # -------------------------------
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = [[name, dict(labels), value] for (name, labels), value in self._counters.items()]
+            histograms = [[name, dict(labels), list(values)] for (name, labels), values in self._histograms.items()]
+
+        gauges = []
+        for collector in self._collectors:
+            try:
+                for kind, name, value in collector():
+                    (counters if kind == "counter" else gauges).append([name, {}, float(value)])
+            except Exception as e:
+                print(f"⚠️ Metrics collector failed: {e}")
+
+        return {"pid": os.getpid(), "counters": counters, "histograms": histograms, "gauges": gauges}
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"metrics_{pid}.json")
+
+    def flush(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(os.getpid())
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        try:
+            self.flush()
+        except OSError as e:
+            print(f"⚠️ Failed to flush metrics: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"⚠️ Failed to flush metrics: {e}")
+
+    # -------------------------------
+    # Aggregation across workers
+    # -------------------------------
+    def _load_snapshots(self) -> List[dict]:
+        # This process's values are always current; other workers' are at
+        # most flush_interval old
+        snapshots = [self.snapshot()]
+        if not os.path.isdir(self.directory):
+            return snapshots
+
+        now = time.time()
+        for filename in os.listdir(self.directory):
+            if not (filename.startswith("metrics_") and filename.endswith(".json")):
+                continue
+            try:
+                pid = int(filename[len("metrics_"):-len(".json")])
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                stale = now - os.path.getmtime(path) > self.stale_after
+                if stale or not pid_alive(pid):
+                    os.remove(path)
+                    continue
+                with open(path, "r") as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self) -> str:
+        counters, gauges, histograms = {}, {}, {}
+        for data in self._load_snapshots():
+            for name, labels, value in data["counters"]:
+                key = (name, _label_key(labels))
+                counters[key] = counters.get(key, 0.0) + value
+            for name, labels, value in data["gauges"]:
+                key = (name, _label_key(labels))
+                gauges[key] = gauges.get(key, 0.0) + value
+            for name, labels, values in data["histograms"]:
+                key = (name, _label_key(labels))
+                merged = histograms.setdefault(key, [0.0] * len(values))
+                for i, v in enumerate(values):
+                    merged[i] += v
+
+        lines = []
+        series = {}
+        for (name, labels), value in counters.items():
+            series.setdefault(name, []).append(("counter", labels, value))
+        for (name, labels), value in gauges.items():
+            series.setdefault(name, []).append(("gauge", labels, value))
+        for (name, labels), values in histograms.items():
+            series.setdefault(name, []).append(("histogram", labels, values))
+
+        for name in sorted(series):
+            full_name = METRICS_PREFIX + name
+            kind, help_text = METRIC_HELP.get(name, (series[name][0][0], name))
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for kind, labels, value in sorted(series[name], key=lambda s: s[1]):
+                if kind != "histogram":
+                    lines.append(f"{full_name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                cumulative = 0.0
+                for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), value[:-2]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{full_name}_bucket{_format_labels(labels + (('le', le),))} {_format_value(cumulative)}")
+                lines.append(f"{full_name}_sum{_format_labels(labels)} {value[-2]!r}")
+                lines.append(f"{full_name}_count{_format_labels(labels)} {_format_value(value[-1])}")
+        return "\n".join(lines) + "\n"
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    # An exited child its parent has not reaped yet still takes signals
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except (OSError, IndexError):
+        return True
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class StageTimer:
+    # A plain class rather than @contextmanager: no generator per call
+    __slots__ = ("registry", "key", "started")
+
+    def __init__(self, registry: Metrics, key: Tuple):
+        self.registry = registry
+        self.key = key
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry._observe(self.key, time.perf_counter() - self.started)
+        return False
+
+
+class MetricsMiddleware:
+    # Plain ASGI middleware (no BaseHTTPMiddleware task overhead). Latency is
+    # labelled with the route template, e.g. /model-meta/{user_id}, so user
+    # ids never become label values.
+
+    def __init__(self, app, registry: "Metrics"):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            endpoint = getattr(route, "path", "unmatched")
+            self.registry.observe("request_duration_seconds", time.perf_counter() - started,
+                                  endpoint=endpoint, method=scope["method"])
+            self.registry.inc("requests_total", endpoint=endpoint, method=scope["method"], status=str(status["code"]))
+
+
+metrics = Metrics()
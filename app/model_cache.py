@@ -0,0 +1,95 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+MODEL_CACHE_SIZE = int(os.environ.get("MODEL_CACHE_SIZE", "256"))
+MODEL_CACHE_MAX_BYTES = int(os.environ.get("MODEL_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+class ModelCache:
+    # LRU cache of loaded models, bounded by entry count and by an
+    # approximate byte budget. Every entry carries the version it was loaded
+    # from; a lookup with a different version drops the stale entry.
+
+    def __init__(self, max_entries: int = MODEL_CACHE_SIZE, max_bytes: int = MODEL_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # user_id -> (value, version, nbytes)
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, user_id: str, version: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, cached_version, _ = entry
+            if cached_version != version:
+                self._remove(user_id)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return value
+
+    def put(self, user_id: str, value: Any, version: Hashable, nbytes: int = 0):
+        with self._lock:
+            if user_id in self._entries:
+                self._remove(user_id)
+
+            self._entries[user_id] = (value, version, nbytes)
+            self.current_bytes += nbytes
+
+            # Always keep the entry just added, even if it alone is over budget
+            while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes
+            ):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def pop(self, user_id: str, default=None) -> Optional[Any]:
+        with self._lock:
+            if user_id not in self._entries:
+                return default
+            value = self._entries[user_id][0]
+            self._remove(user_id)
+            self.invalidations += 1
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def _remove(self, user_id: str):
+        _, _, nbytes = self._entries.pop(user_id)
+        self.current_bytes -= nbytes
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -1,92 +1,191 @@
 import os
-import pickle
+import fcntl
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
-from typing import Tuple, List
-from scipy.stats import zscore, percentileofscore
+from typing import Dict, Tuple, List, Optional, TYPE_CHECKING
 import json
+from contextlib import contextmanager
 from datetime import datetime
 
+from app.model_cache import ModelCache
+from app.feature_store import FeatureStore, FEATURES
+from app.drift import DriftMonitor
+from app.model_store import atomic_write, save_model_bundle, load_model_bundle, load_legacy_pickle
+from app.compiled_forest import CompiledForest
+from app.calibration import CALIBRATION_VERSION, scale_features, apply_calibration
+from app.metrics import metrics
+from app.user_index import UserIndex
+from app.forest_tuning import MODEL_AUTOTUNE, REFERENCE_N_ESTIMATORS, REFERENCE_MAX_SAMPLES, fit_forest, tune_forest
+from app.session_archive import SessionArchive, QUARANTINE_DIR
+
+if TYPE_CHECKING:
+    # scikit-learn is only imported when a model is trained (or a legacy
+    # pickle is loaded), keeping it out of worker start-up
+    from sklearn.preprocessing import StandardScaler
+
 DATA_DIR = "data"
 MODEL_DIR = "models"
 
-FEATURES = [
-    "tap_duration", "swipe_speed", "swipe_angle",
-    "scroll_distance", "scroll_velocity", 
-    "inter_key_delay_avg", "key_press_duration_avg", "typing_error_rate", #done
-    "gyro_variance", "accelerometer_noise",
-    "screen_transition_count", "avg_dwell_time_per_screen",
-    "session_start_hour", "session_duration_sec"
-]
+# Rows read from the feature store per retrain; anomaly filtering and the
+# 100-row training window are taken from these, so retrain cost stays flat
+# however long a user's history gets
+TRAIN_WINDOW_ROWS = int(os.environ.get("TRAIN_WINDOW_ROWS", "1000"))
+
+
+@contextmanager
+def training_lock(user_id: str, bump: bool = False):
+    # Serializes a user's job status changes, training reads and publishes,
+    # and resets across every process. The lock file holds the user's
+    # generation, which a reset bumps (and never deletes), so a fit
+    # requested before the reset can tell not to publish. Yields the
+    # generation; not reentrant.
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    with open(os.path.join(MODEL_DIR, f"{user_id}_job.lock"), "a+") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            lock_file.seek(0)
+            generation = int(lock_file.read().strip() or 0)
+            if bump:
+                generation += 1
+                lock_file.seek(0)
+                lock_file.truncate()
+                lock_file.write(str(generation))
+                lock_file.flush()
+            yield generation
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
 
 class ModelManager:
     def __init__(self, dataset_root="data"):
         self.dataset_root = dataset_root
-        self.models = {}
+        self.feature_store = FeatureStore(data_root=dataset_root)
+        self.drift_monitor = DriftMonitor(self.feature_store.root)
+        self.models = ModelCache()
+        self.user_index = UserIndex()
+        # Session CSVs kept for inspection; counters come from their indexes
+        self.sessions = SessionArchive(dataset_root)
+        self.quarantine = SessionArchive(QUARANTINE_DIR)
+        # Why the last _train_model call for a user published nothing
+        self.skip_reasons: Dict[str, str] = {}
         
         os.makedirs(DATA_DIR, exist_ok=True)
         os.makedirs(MODEL_DIR, exist_ok=True)
         
     def _get_model_path(self, user_id: str) -> str:
+        return os.path.join(MODEL_DIR, f"{user_id}_model.joblib")
+
+    def _get_legacy_model_path(self, user_id: str) -> str:
         return os.path.join(MODEL_DIR, f"{user_id}_model.pkl")
-    
-    def _get_user_data_path(self, user_id: str) -> str:
-        return os.path.join(DATA_DIR, f"{user_id}.csv")
+
+    def _find_model_path(self, user_id: str):
+        for path in (self._get_model_path(user_id), self._get_legacy_model_path(user_id)):
+            if os.path.exists(path):
+                return path
+        return None
+
+    def has_model(self, user_id: str) -> bool:
+        return self._find_model_path(user_id) is not None
     
     def _get_meta_path(self, user_id: str) -> str:
         return os.path.join(MODEL_DIR, f"{user_id}_meta.json")
     
-    def _load_model(self, user_id: str) -> Tuple[IsolationForest, StandardScaler]:
-        with open(self._get_model_path(user_id), "rb") as f:
-            model, scaler, iso_score = pickle.load(f)
+    def _get_model_version(self, user_id: str):
+        # mtime + size of the model file identifies the version on disk, so a
+        # retrain in another process or a reset is noticed with one stat call
+        for path in (self._get_model_path(user_id), self._get_legacy_model_path(user_id)):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            return (path, stat.st_mtime_ns, stat.st_size)
+        return None
+
+    def _load_model(self, user_id: str) -> Tuple[CompiledForest, Optional["StandardScaler"], dict]:
+        version = self._get_model_version(user_id)
+        path = version[0]
+        with metrics.timer("model_load"):
+            if path == self._get_model_path(user_id):
+                model, scaler, calibration = load_model_bundle(path)
+            else:
+                model, scaler, calibration = load_legacy_pickle(path)
             
-        self.models[user_id] = (model, scaler, iso_score)
-        return model, scaler, iso_score
+        # The file size is a cheap stand-in for the model's memory footprint
+        self.models.put(user_id, (model, scaler, calibration), version, nbytes=version[2])
+        return model, scaler, calibration
     
-    def _get_model(self, user_id: str) -> Tuple[IsolationForest, StandardScaler]:
-        if user_id in self.models:
-            return self.models[user_id]
-        
-        if os.path.exists(self._get_model_path(user_id)):
-            return self._load_model(user_id)
-        
-        raise ValueError("Model not trained yet")
+    def _get_model(self, user_id: str) -> Tuple[CompiledForest, Optional["StandardScaler"], dict]:
+        version = self._get_model_version(user_id)
+        if version is None:
+            # Deleted or never trained: make sure no stale copy keeps serving
+            self.models.pop(user_id)
+            raise ValueError("Model not trained yet")
+
+        cached = self.models.get(user_id, version)
+        if cached is not None:
+            return cached
+
+        return self._load_model(user_id)
+
+    def invalidate(self, user_id: str):
+        self.models.pop(user_id)
+
+    def cache_stats(self) -> dict:
+        return self.models.stats()
     
-    def store_snapshot(self, user_id: str, snapshot: dict):
-        df = pd.DataFrame([snapshot])
-        user_data_path = self._get_user_data_path(user_id)
-        if os.path.exists(user_data_path):
-            existing = pd.read_csv(user_data_path)
-            df = pd.concat([existing, df], ignore_index=True)
-        df.to_csv(user_data_path, index=False)
-        
-        if len(df) >= 5:
-            self._train_model(user_id, df)
-            
-    def _train_model(self, user_id: str):
-        user_dir = os.path.join(self.dataset_root, user_id)
-        session_files = sorted(f for f in os.listdir(user_dir) if f.startswith("session_"))
+    def record_session(self, user_id: str, frame: pd.DataFrame):
+        # Fold a stored session into the user's drift statistics, scoring it
+        # under the current model for the rolling score distribution
+        X = frame.reindex(columns=FEATURES).to_numpy(dtype=float)
+        X = X[~np.isnan(X).any(axis=1)]
 
-        all_snapshots = []
+        iso_scores = None
+        if len(X):
+            try:
+                model, _, calibration = self._get_model(user_id)
+                iso_scores = model.decision_function(scale_features(calibration, X))
+            except ValueError:
+                pass
 
-        for file in session_files:
-            path = os.path.join(user_dir, file)
-            df = pd.read_csv(path)
-            df = df[FEATURES].dropna()
-            if not df.empty:
-                all_snapshots.append(df)
+        self.drift_monitor.update(user_id, X, iso_scores)
 
-        if len(all_snapshots) < 5:
-            print(f"[{user_id}] ⚠️ Not enough sessions to train.")
-            return
+    def retrain_decision(self, user_id: str) -> Tuple[bool, dict]:
+        try:
+            _, _, calibration = self._get_model(user_id)
+        except ValueError:
+            calibration = None
 
-        full_df = pd.concat(all_snapshots, ignore_index=True)
+        last_trained = self.drift_monitor.load(user_id)["trained_at"]
+        if last_trained is None and os.path.exists(self._get_meta_path(user_id)):
+            # Models trained before drift tracking: age from the metadata
+            with open(self._get_meta_path(user_id), "r") as f:
+                last_trained = datetime.fromisoformat(json.load(f)["last_trained"]).timestamp()
+
+        return self.drift_monitor.should_retrain(user_id, calibration, last_trained)
+
+    def _train_model(self, user_id: str, trigger: Optional[dict] = None, generation: Optional[int] = None):
+        # generation: the user's reset generation the retrain was requested
+        # under (default: the current one). If the user is reset before the
+        # data is read or the model published, nothing is written.
+        self.skip_reasons.pop(user_id, None)
+        with training_lock(user_id) as current:
+            if generation is None:
+                generation = current
+            if current != generation:
+                print(f"[{user_id}] 🛑 User was reset; training cancelled.")
+                self.skip_reasons[user_id] = "reset"
+                return
+            store_info = self.feature_store.info(user_id)
+
+            if store_info["nonempty_sessions"] < 5:
+                print(f"[{user_id}] ⚠️ Not enough sessions to train.")
+                self.skip_reasons[user_id] = "not_enough_sessions"
+                return
+
+            full_df = self.feature_store.tail(user_id, TRAIN_WINDOW_ROWS)[FEATURES].dropna().reset_index(drop=True)
 
         try:
-            model, scaler, _ = self._get_model(user_id)
-            X_all = scaler.transform(full_df[FEATURES])
+            model, _, calibration = self._get_model(user_id)
+            X_all = scale_features(calibration, full_df[FEATURES])
             scores = model.decision_function(X_all)
             low, high = np.percentile(scores, [5, 95])
             mask = (scores >= low) & (scores <= high)
@@ -98,52 +197,84 @@ class ModelManager:
         
         if full_df.shape[0] < 50:
             print(f"[{user_id}] ⚠️ Not enough clean snapshots ({full_df.shape[0]}) to train.")
+            self.skip_reasons[user_id] = "not_enough_clean_snapshots"
             return
 
+        from sklearn.preprocessing import StandardScaler
+
         # Use only the latest 100 snapshots (or all if less)
         train_df = full_df.tail(100)
 
+        forest = {"n_estimators": REFERENCE_N_ESTIMATORS, "max_samples": REFERENCE_MAX_SAMPLES, "autotuned": False}
+        if MODEL_AUTOTUNE:
+            # Older clean rows outside the window are held out as well
+            older_df = full_df.iloc[max(0, len(full_df) - len(train_df) - 200):len(full_df) - len(train_df)]
+            with metrics.timer("forest_autotune"):
+                tuning = tune_forest(train_df[FEATURES].to_numpy(dtype=float), older_df[FEATURES].to_numpy(dtype=float))
+            forest = {"n_estimators": tuning["n_estimators"], "max_samples": tuning["max_samples"],
+                      "autotuned": True, "tuning": tuning}
+            print(f"[{user_id}] 🌲 Auto-tuned forest: {forest['n_estimators']} trees, "
+                  f"max_samples={forest['max_samples']} ({tuning['reason']})")
+
         scaler = StandardScaler()
         X_scaled = scaler.fit_transform(train_df[FEATURES])
 
-        model = IsolationForest(n_estimators=100, contamination=0.05, random_state=42)
-        model.fit(X_scaled)
+        model = fit_forest(X_scaled, forest["n_estimators"], forest["max_samples"])
 
         raw_scores = model.decision_function(X_scaled)
         low, high = np.percentile(raw_scores, [5, 95])
         
         iso_scores = raw_scores[(raw_scores >= low) & (raw_scores <= high)]
 
-        # Save model to disk
-        with open(self._get_model_path(user_id), "wb") as f:
-            pickle.dump((model, scaler, iso_scores), f)
+        with training_lock(user_id) as current:
+            if current != generation:
+                print(f"[{user_id}] 🛑 User was reset during training; model discarded.")
+                self.skip_reasons[user_id] = "reset"
+                return
 
-        # Store in memory
-        self.models[user_id] = (model, scaler, iso_scores)
-        
-        # Enhanced etadata
-        quarantine_dir = os.path.join("quarantine", user_id)
-        num_quarantined = len([
-            f for f in os.listdir(quarantine_dir)
-            if f.startswith("session_") and f.endswith(".csv")
-        ]) if os.path.exists(quarantine_dir) else 0
-
-        metadata = {
-            "user_id": user_id,
-            "model_exists": True,
-            "last_trained": datetime.now().isoformat(),
-            "snapshot_count": len(train_df),
-            "num_sessions": len(session_files),
-            "num_quarantined_sessions": num_quarantined,
-            "model_type": "IsolationForest",
-            "model_version": self._get_next_version(user_id)
-        }
-        
-        with open(self._get_meta_path(user_id), "w") as f:
-            json.dump(metadata, f, indent=2)
+            # Save model to disk
+            save_model_bundle(self._get_model_path(user_id), model, scaler, iso_scores)
+
+            # The bundle supersedes any pickle from before the format change
+            legacy_path = self._get_legacy_model_path(user_id)
+            if os.path.exists(legacy_path):
+                os.remove(legacy_path)
+
+            # Store in memory, tagged with the version just written
+            self.models.pop(user_id)
+            _, _, calibration = self._load_model(user_id)
+
+            # Enhanced etadata
+            num_quarantined = self.quarantine.count(user_id)
+
+            metadata = {
+                "user_id": user_id,
+                "model_exists": True,
+                "last_trained": datetime.now().isoformat(),
+                "snapshot_count": len(train_df),
+                "num_sessions": store_info["session_count"],
+                "num_quarantined_sessions": num_quarantined,
+                "model_type": "IsolationForest",
+                "forest": forest,
+                "retrain_trigger": trigger,
+                "calibration": {
+                    "version": CALIBRATION_VERSION,
+                    "n_scores": len(iso_scores),
+                    "clip_low": float(calibration["clip_low"]),
+                    "clip_high": float(calibration["clip_high"]),
+                },
+                "model_version": self._get_next_version(user_id)
+            }
+
+            atomic_write(self._get_meta_path(user_id), "w", lambda f: json.dump(metadata, f, indent=2))
+            self.user_index.record_training(user_id, metadata)
+
+            # Drift is measured against the model just written
+            self.drift_monitor.reset(user_id)
 
         print(f"[{user_id}] ✅ Model trained and saved (snapshots: {len(train_df)})")
         print(f"[{user_id}] 🔢 Stored isolation scores: {len(iso_scores)}")
+        return metadata
 
     
     def _get_next_version(self, user_id: str) -> int:
@@ -157,57 +288,96 @@ class ModelManager:
     def sigmoid(self, x):
         return 1 / (1 + np.exp(-x))
 
+    def _score_rows(self, model, calibration, X) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        # Score a whole matrix with one decision_function call. Every step is
+        # elementwise or row-wise, so row i gets exactly the value a
+        # single-row call would produce.
+        with metrics.timer("decision_function"):
+            X_scaled = scale_features(calibration, X)
+            iso_score = model.decision_function(X_scaled)
+        iso_risk, z_risk, final_risk = apply_calibration(calibration, X_scaled, iso_score)
+        return iso_score, iso_risk, z_risk, final_risk
+
     def predict_risk(self, user_id: str, snapshot: dict) -> float:
+        # Flattened record (feature -> value)
         try:
-            model, scaler, iso_scores = self._get_model(user_id)
+            x = np.array([snapshot.get(f) for f in FEATURES], dtype=float)
+        except (TypeError, ValueError) as e:
+            print("Prediction error:", e)
+            return 0.0
+        return self.predict_risk_vector(user_id, x)
+
+    def predict_risk_vector(self, user_id: str, x: np.ndarray) -> float:
+        # One snapshot as a float vector in FEATURES order (NaN = missing)
+        try:
+            model, _, calibration = self._get_model(user_id)
         except:
             return 0.0
         
         try:
-            X = pd.DataFrame([snapshot])[FEATURES]
-            missing = [f for f in FEATURES if f not in snapshot or pd.isna(snapshot[f])]
+            missing = [f for f, value in zip(FEATURES, x) if np.isnan(value)]
             if missing:
                 print(f"[{user_id}] Warning: Missing features in snapshot: {missing}")
                 return 0.0
 
-            
-            X_scaled = scaler.transform(X)
-            iso_score = model.decision_function(X_scaled)[0]
+            iso_score, iso_risk, z_risk, final_risk = self._score_rows(model, calibration, x.reshape(1, -1))
 
-            # Improved normalization of IsolationForest score:
-            # Clip to range [-0.5, 0.5] and map to [100, 0] risk
-            
-            if iso_scores is not None and len(iso_scores) >= 10:
-                low, high = np.percentile(iso_scores, [5, 95])
-                clipped = np.clip(iso_score, low, high)
-                center = iso_score.mean()
-                scale = np.std(iso_score) if np.std(iso_score) > 0 else 0.01
-            
-                z_score = (clipped - center) / scale
-                norm_score = 1 / (1 + np.exp(-z_score * 1.5))  # sigmoid
-            else:
-                # fallback sigmoid normalization for early snapshots
-                norm_score = 1 / (1 + np.exp(-iso_score * 20))
+            print(f"[{user_id}] 📊 Isolation score: {iso_score[0]}")
+            print(f"[{user_id}] 📊 Iso-risk percentile: {iso_risk[0]}")
+            print(f"[{user_id}] 📊 Z-score risk: {z_risk[0]}")
+            print(f"[{user_id}] 📊 Final risk: {final_risk[0]}")
+
+            return float(final_risk[0])
+
+
+        except Exception as e:
+            print("Prediction error:", e)
+            return 0.0
 
-            # Convert to iso_risk (0 = safest, 70 = riskiest)
-            iso_risk = round((1 - norm_score) * 100, 2)
+    def predict_risk_batch(self, user_id: str, snapshots: List[dict]) -> List[float]:
+        # One float matrix for the whole group, missing values become NaN
+        X = np.array([[s.get(f) for f in FEATURES] for s in snapshots], dtype=float)
+        return self.predict_risk_matrix(user_id, X)
 
-            mus = scaler.mean_
-            sigmas = np.where(scaler.scale_ > 0, scaler.scale_, 0.01)
-            z_feats = np.abs((X_scaled[0] * sigmas + mus - mus) / sigmas)
+    def predict_risk_many(self, user_id: str, frame: pd.DataFrame) -> List[float]:
+        # Session-level scoring: absent FEATURES columns become NaN
+        X = frame.reindex(columns=FEATURES).to_numpy(dtype=float)
+        return self.predict_risk_matrix(user_id, X)
 
-            z_risk = round(z_feats.mean() * 10, 2)
-            final_risk = round(0.6 * iso_risk + 0.4 * z_risk, 2)
+    def predict_risk_matrix(self, user_id: str, X: np.ndarray) -> List[float]:
+        # Rows in FEATURES order (NaN = missing), e.g. from snapshot_matrix
+        if len(X) == 0:
+            return []
+        return self.predict_with_model(user_id, self.load_scoring_model(user_id), X)
 
-            print(f"[{user_id}] 📊 Isolation score: {iso_score}")
-            print(f"[{user_id}] 📊 Iso-risk percentile: {iso_risk}")
-            print(f"[{user_id}] 📊 Z-score risk: {round(z_risk, 2)}")
-            print(f"[{user_id}] 📊 Final risk: {final_risk}")
+    def load_scoring_model(self, user_id: str) -> Optional[Tuple[CompiledForest, dict]]:
+        # (model, calibration) for callers that score many times against
+        # one model version, e.g. a streamed session; None if untrained
+        try:
+            model, _, calibration = self._get_model(user_id)
+        except:
+            return None
+        return model, calibration
 
-            return min(final_risk, 100)
+    def predict_with_model(self, user_id: str, scoring_model: Optional[Tuple[CompiledForest, dict]],
+                           X: np.ndarray) -> List[float]:
+        risks = np.zeros(len(X))
+        if len(X) == 0 or scoring_model is None:
+            return risks.tolist()
+        model, calibration = scoring_model
 
+        try:
+            complete = ~np.isnan(X).any(axis=1)
+            if not complete.all():
+                print(f"[{user_id}] Warning: {int((~complete).sum())} snapshot(s) with missing features")
+
+            if complete.any():
+                _, _, _, final_risk = self._score_rows(model, calibration, X[complete])
+                risks[complete] = final_risk
+
+            print(f"[{user_id}] 📊 Scored {int(complete.sum())}/{len(X)} snapshots, mean risk: {round(float(risks.mean()), 2)}")
+            return risks.tolist()
 
         except Exception as e:
             print("Prediction error:", e)
-            return 0.0
-            
\ No newline at end of file
+            return np.zeros(len(X)).tolist()
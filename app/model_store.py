@@ -0,0 +1,68 @@
+import os
+import pickle
+import threading
+
+from app.compiled_forest import CompiledForest, compile_isolation_forest
+from app.calibration import build_calibration
+
+BUNDLE_FORMAT_VERSION = 4
+
+# Read-only memory mapping: every worker that loads the same bundle shares
+# the array pages through the OS page cache instead of holding a private copy
+MMAP_MODE = os.environ.get("MODEL_MMAP_MODE", "r") or None
+
+
+def atomic_write(path: str, mode: str, dump):
+    # Write to a temp file next to the target and swap it in, so readers in
+    # other processes only ever see the old or the new file. A reader that
+    # has the old file memory-mapped keeps its pages until it reloads. The
+    # temp name is per process and thread, so concurrent writers never share
+    # one.
+    tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, mode) as f:
+        dump(f)
+    os.replace(tmp_path, path)
+
+
+def save_model_bundle(path: str, model, scaler, iso_scores):
+    # Only plain arrays go into the scoring bundle (the scaler's mean/scale
+    # live in the calibration record), so loading it never imports
+    # scikit-learn; the compiled forest is read straight from the mapped
+    # pages at predict time
+    import joblib
+
+    bundle = {
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "forest": compile_isolation_forest(model),
+        "iso_scores": iso_scores,
+        "calibration": build_calibration(iso_scores, scaler),
+    }
+    # Uncompressed on purpose: compressed joblib files can't be memory-mapped
+    atomic_write(path, "wb", lambda f: joblib.dump(bundle, f))
+
+
+def load_model_bundle(path: str):
+    # Returns (forest, scaler, calibration) whatever the bundle format;
+    # scaler is None from format 4 on
+    import joblib
+
+    bundle = joblib.load(path, mmap_mode=MMAP_MODE)
+    if bundle["format_version"] == 1:
+        # First bundle format held the sklearn estimator itself
+        forest = CompiledForest.from_isolation_forest(bundle["model"])
+    else:
+        forest = CompiledForest(bundle["forest"])
+
+    calibration = bundle.get("calibration")
+    if calibration is None:
+        # Bundles written before calibration records existed
+        calibration = build_calibration(bundle["iso_scores"], bundle["scaler"])
+    return forest, bundle.get("scaler"), calibration
+
+
+def load_legacy_pickle(path: str):
+    # Models trained before the joblib bundle: a pickled
+    # (model, scaler, iso_scores) tuple, calibrated on load
+    with open(path, "rb") as f:
+        model, scaler, iso_scores = pickle.load(f)
+    return CompiledForest.from_isolation_forest(model), scaler, build_calibration(iso_scores, scaler)
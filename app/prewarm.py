@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from typing import List, Optional
+
+from app.model_manager import ModelManager, MODEL_DIR
+from app.risk_log import RiskLogStore
+from app.sharding import HashRing, SHARD_NODES, SHARD_SELF
+
+# Models loaded in the background after a worker starts; 0 disables
+PREWARM_MODELS = int(os.environ.get("PREWARM_MODELS", "0"))
+# Seconds to wait before prewarming, so the worker is already serving
+PREWARM_DELAY = float(os.environ.get("PREWARM_DELAY", "0.5"))
+
+prewarm_status = {"state": "disabled"}
+
+
+def _trained_users_by_recency() -> List[str]:
+    # Fallback ranking: newest last_trained in models/*_meta.json first
+    trained = []
+    if not os.path.isdir(MODEL_DIR):
+        return trained
+    for filename in os.listdir(MODEL_DIR):
+        if not filename.endswith("_meta.json"):
+            continue
+        try:
+            with open(os.path.join(MODEL_DIR, filename), "r") as f:
+                last_trained = json.load(f).get("last_trained")
+            trained.append((datetime.fromisoformat(last_trained).timestamp(), filename[:-len("_meta.json")]))
+        except (OSError, ValueError, TypeError):
+            continue
+    return [user_id for _, user_id in sorted(trained, reverse=True)]
+
+
+def recent_users(model_manager: ModelManager, risk_log: RiskLogStore, n: int) -> List[str]:
+    # Most recently scored users from the risk log, topped up with the most
+    # recently trained ones; only users that actually have a model. As a
+    # shard node behind app.router, only the users the ring sends here.
+    ring = HashRing(SHARD_NODES) if SHARD_SELF in SHARD_NODES else None
+    candidates = risk_log.recent_users(n if ring is None else n * len(SHARD_NODES))
+    users = []
+    for user_id in candidates + _trained_users_by_recency():
+        if len(users) >= n:
+            break
+        if ring is not None and ring.node_for(user_id) != SHARD_SELF:
+            continue
+        if user_id not in users and model_manager.has_model(user_id):
+            users.append(user_id)
+    return users
+
+
+def warm_imports():
+    # Modules kept out of the import graph for fast start-up, but needed by
+    # the first request of their kind
+    import joblib  # model loads
+
+    from app.ip_index import get_ip_index
+    get_ip_index()  # maps the IP index file
+
+    from app.geo import GEO_DISTANCE_BACKEND, get_distance_backend
+    if GEO_DISTANCE_BACKEND == "geodesic":
+        get_distance_backend()([0.0], [0.0], [0.0], [0.0])
+
+
+def prewarm_models(model_manager: ModelManager, risk_log: RiskLogStore, n: int) -> dict:
+    started = time.perf_counter()
+    warm_imports()
+
+    # Never load more than the cache keeps, or prewarm evicts its own work
+    n = min(n, model_manager.models.max_entries)
+    users = recent_users(model_manager, risk_log, n)
+
+    loaded, failed = 0, 0
+    for user_id in users:
+        try:
+            model_manager._get_model(user_id)
+            loaded += 1
+        except Exception as e:
+            failed += 1
+            print(f"[{user_id}] ⚠️ Prewarm failed: {e}")
+
+    return {
+        "state": "done",
+        "requested": n,
+        "loaded": loaded,
+        "failed": failed,
+        "elapsed_sec": round(time.perf_counter() - started, 3),
+    }
+
+
+def start_prewarm(model_manager: ModelManager, risk_log: RiskLogStore, n: int = PREWARM_MODELS,
+                  delay: float = PREWARM_DELAY) -> Optional[threading.Thread]:
+    if n <= 0:
+        return None
+
+    def run():
+        time.sleep(delay)
+        prewarm_status.update(state="running")
+        try:
+            prewarm_status.update(prewarm_models(model_manager, risk_log, n))
+            print(f"🔥 Prewarmed {prewarm_status['loaded']} models in {prewarm_status['elapsed_sec']}s")
+        except Exception as e:
+            prewarm_status.update(state="failed", error=str(e))
+            print(f"⚠️ Model prewarm failed: {e}")
+
+    prewarm_status.update(state="scheduled")
+    thread = threading.Thread(target=run, name="model-prewarm", daemon=True)
+    thread.start()
+    return thread
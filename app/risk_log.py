@@ -0,0 +1,207 @@
+import os
+import json
+import argparse
+import threading
+from typing import List, Optional
+
+from app.concurrency import SQLiteConnections
+
+RISK_DIR = "risks"
+RISK_DB_PATH = os.environ.get("RISK_DB_PATH", os.path.join(RISK_DIR, "risk_log.db"))
+
+# Entries kept per user; older rows are trimmed by periodic compaction
+RISK_LOG_MAX_ENTRIES = int(os.environ.get("RISK_LOG_MAX_ENTRIES", "1000"))
+# Compact a user's log after this many appends for them (per process)
+RISK_LOG_COMPACT_EVERY = int(os.environ.get("RISK_LOG_COMPACT_EVERY", "200"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS risk_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    risk REAL,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_risk_log_user_id ON risk_log (user_id, id);
+
+-- One row per user for /all-users-meta, kept current by risk log appends
+-- and retrains (see app/user_index.py). The *_sort columns are never NULL
+-- so they can back keyset pagination: -1 = no risk yet, 0 = never trained.
+CREATE TABLE IF NOT EXISTS user_summary (
+    user_id TEXT PRIMARY KEY,
+    trained INTEGER NOT NULL DEFAULT 0,
+    latest_risk REAL,
+    latest_risk_sort REAL NOT NULL DEFAULT -1,
+    latest_risk_at TEXT,
+    last_trained TEXT,
+    last_trained_sort REAL NOT NULL DEFAULT 0,
+    meta TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_user_summary_risk ON user_summary (latest_risk_sort, user_id);
+CREATE INDEX IF NOT EXISTS idx_user_summary_trained_at ON user_summary (last_trained_sort, user_id);
+CREATE INDEX IF NOT EXISTS idx_user_summary_trained ON user_summary (trained, user_id);
+CREATE INDEX IF NOT EXISTS idx_user_summary_trained_risk ON user_summary (trained, latest_risk_sort, user_id);
+CREATE INDEX IF NOT EXISTS idx_user_summary_trained_trained_at ON user_summary (trained, last_trained_sort, user_id);
+"""
+
+UPSERT_LATEST_RISK = """
+INSERT INTO user_summary (user_id, latest_risk, latest_risk_sort, latest_risk_at) VALUES (?, ?, ?, ?)
+ON CONFLICT (user_id) DO UPDATE SET
+    latest_risk = excluded.latest_risk,
+    latest_risk_sort = excluded.latest_risk_sort,
+    latest_risk_at = excluded.latest_risk_at
+"""
+
+
+def latest_risk_row(user_id: str, entries: List[dict]) -> tuple:
+    latest = entries[-1]
+    risk = latest.get("risk")
+    return (user_id, risk, -1 if risk is None else risk, latest.get("timestamp", ""))
+
+
+class RiskLogStore:
+    # Append-only risk log in SQLite (WAL mode). Appends are single inserts,
+    # reads are "last N" range scans on the (user_id, id) index, and WAL lets
+    # every gunicorn worker read while another one writes.
+
+    def __init__(self, db_path: str = RISK_DB_PATH):
+        self.db_path = db_path
+        self._connect = SQLiteConnections(db_path)
+        self._append_counts = {}
+        self._counts_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def append(self, user_id: str, entries: List[dict]):
+        if not entries:
+            return
+        rows = [
+            (user_id, entry.get("timestamp", ""), entry.get("risk"), json.dumps(entry))
+            for entry in entries
+        ]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO risk_log (user_id, timestamp, risk, entry) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            # Same transaction, so the summary never lags the log
+            conn.execute(UPSERT_LATEST_RISK, latest_risk_row(user_id, entries))
+
+        with self._counts_lock:
+            count = self._append_counts.get(user_id, 0) + len(entries)
+            self._append_counts[user_id] = count % RISK_LOG_COMPACT_EVERY
+        if count >= RISK_LOG_COMPACT_EVERY:
+            self.compact(user_id)
+
+    def last(self, user_id: str, n: int = 20) -> List[dict]:
+        # Oldest first, like the old JSON list
+        rows = self._connect().execute(
+            "SELECT entry FROM risk_log WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+            (user_id, n),
+        ).fetchall()
+        return [json.loads(row[0]) for row in reversed(rows)]
+
+    def latest_risk(self, user_id: str) -> Optional[float]:
+        row = self._connect().execute(
+            "SELECT risk FROM risk_log WHERE user_id = ? ORDER BY id DESC LIMIT 1",
+            (user_id,),
+        ).fetchone()
+        return row[0] if row else None
+
+    def recent_users(self, n: int) -> List[str]:
+        # Users with the newest entries first
+        rows = self._connect().execute(
+            "SELECT user_id FROM risk_log GROUP BY user_id ORDER BY MAX(id) DESC LIMIT ?",
+            (n,),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def compact(self, user_id: str, keep: int = RISK_LOG_MAX_ENTRIES) -> int:
+        with self._connect() as conn:
+            cursor = conn.execute(
+                """
+                DELETE FROM risk_log WHERE user_id = ? AND id < (
+                    SELECT COALESCE(MIN(id), 0) FROM (
+                        SELECT id FROM risk_log WHERE user_id = ? ORDER BY id DESC LIMIT ?
+                    )
+                )
+                """,
+                (user_id, user_id, keep),
+            )
+        return cursor.rowcount
+
+    def delete_user(self, user_id: str) -> int:
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM risk_log WHERE user_id = ?", (user_id,))
+        with self._counts_lock:
+            self._append_counts.pop(user_id, None)
+        return cursor.rowcount
+
+    def import_json_dir(self, risk_dir: str = RISK_DIR) -> dict:
+        # Migrate the old risks/{user_id}.json files. A file is imported only
+        # if the user has no rows yet, then deleted once the rows are
+        # committed (a reset must not find it on disk afterwards), so the
+        # migration is safe to re-run and to race between workers.
+        imported = {}
+        if not os.path.isdir(risk_dir):
+            return imported
+
+        for filename in sorted(os.listdir(risk_dir)):
+            if not filename.endswith(".json"):
+                continue
+            user_id = filename[:-len(".json")]
+            path = os.path.join(risk_dir, filename)
+            try:
+                with open(path, "r") as f:
+                    entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[{user_id}] ⚠️ Skipping risk log {path}: {e}")
+                continue
+
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                exists = conn.execute(
+                    "SELECT 1 FROM risk_log WHERE user_id = ? LIMIT 1", (user_id,)
+                ).fetchone()
+                if not exists:
+                    conn.executemany(
+                        "INSERT INTO risk_log (user_id, timestamp, risk, entry) VALUES (?, ?, ?, ?)",
+                        [
+                            (user_id, entry.get("timestamp", ""), entry.get("risk"), json.dumps(entry))
+                            for entry in entries
+                        ],
+                    )
+                    if entries:
+                        conn.execute(UPSERT_LATEST_RISK, latest_risk_row(user_id, entries))
+                    imported[user_id] = len(entries)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+        return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Risk log store maintenance")
+    parser.add_argument("--db", default=RISK_DB_PATH)
+    parser.add_argument("--import-json", metavar="DIR", help="import legacy risks/{user_id}.json files")
+    parser.add_argument("--compact", metavar="USER_ID", help="trim a user's log to RISK_LOG_MAX_ENTRIES")
+    args = parser.parse_args()
+
+    store = RiskLogStore(args.db)
+    if args.import_json:
+        imported = store.import_json_dir(args.import_json)
+        print(f"Imported {sum(imported.values())} entries for {len(imported)} users")
+    if args.compact:
+        print(f"Removed {store.compact(args.compact)} entries for {args.compact}")
+
+
+if __name__ == "__main__":
+    main()
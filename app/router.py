@@ -0,0 +1,270 @@
+import os
+import re
+import hmac
+import asyncio
+import argparse
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response
+
+from app.sharding import HashRing, moved_fraction, SHARD_NODES
+from app.flatten_snapshot import loads, dumps
+
+# Seconds to wait on a backend
+ROUTER_TIMEOUT = float(os.environ.get("ROUTER_TIMEOUT", "60"))
+# Nodes tried per request: the owner, then the next ones on the ring if it
+# refuses connections
+ROUTER_FAILOVER_NODES = int(os.environ.get("ROUTER_FAILOVER_NODES", "2"))
+# Shared secret for /router/nodes, sent as X-Admin-Token; when unset,
+# membership changes are only accepted from loopback clients
+ROUTER_ADMIN_TOKEN = os.environ.get("ROUTER_ADMIN_TOKEN", "")
+LOOPBACK_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+# Endpoints that carry the user id in the path: /{endpoint}/{user_id}
+USER_PATH = re.compile(r"^/(model-meta|session-data|reset-user-data|device-profile|store-device-profile|stream-session)/([^/]+)$")
+# Endpoints that carry it in the JSON body
+USER_BODY_PATHS = {"/predict", "/end-session"}
+# Hop-by-hop and length headers are set again by the proxying client/server
+DROP_HEADERS = {"host", "content-length", "transfer-encoding", "connection", "keep-alive"}
+
+app = FastAPI()
+ring = HashRing(SHARD_NODES)
+stats = {"requests": {}, "failovers": {}, "errors": {}, "membership_changes": []}
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _count(kind: str, node: str, value: int = 1):
+    stats[kind][node] = stats[kind].get(node, 0) + value
+
+
+@app.on_event("startup")
+async def start_client():
+    global _client
+    _client = httpx.AsyncClient(timeout=ROUTER_TIMEOUT, limits=httpx.Limits(max_keepalive_connections=64))
+
+
+@app.on_event("shutdown")
+async def close_client():
+    await _client.aclose()
+
+
+async def _send(node: str, request: Request, path: str, content) -> httpx.Response:
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in DROP_HEADERS}
+    return await _client.request(
+        request.method, node + path, params=request.query_params, headers=headers, content=content
+    )
+
+
+async def _forward(nodes: List[str], request: Request, path: str, content) -> Response:
+    # Fail over only while the body can be re-sent (buffered, not a stream)
+    attempts = nodes if isinstance(content, (bytes, type(None))) else nodes[:1]
+    for attempt, node in enumerate(attempts):
+        try:
+            upstream = await _send(node, request, path, content)
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            _count("errors", node)
+            if attempt + 1 < len(attempts):
+                _count("failovers", node)
+                continue
+            raise HTTPException(status_code=502, detail=f"Shard {node} unavailable: {e}")
+        _count("requests", node)
+        headers = {k: v for k, v in upstream.headers.items() if k.lower() not in DROP_HEADERS | {"content-encoding"}}
+        headers["X-Shard-Node"] = node
+        return Response(content=upstream.content, status_code=upstream.status_code, headers=headers)
+
+
+def _nodes_for(user_id: Optional[str]) -> List[str]:
+    if not ring.nodes:
+        raise HTTPException(status_code=503, detail="No shard nodes configured")
+    if user_id is None:
+        # Not user-specific: any node will do, keep it deterministic
+        return ring.nodes[:ROUTER_FAILOVER_NODES]
+    return ring.nodes_for(user_id, ROUTER_FAILOVER_NODES)
+
+
+async def _predict_batch(request: Request, body: bytes) -> Response:
+    # Split a mixed-user batch by shard, forward the parts concurrently and
+    # put the results back in request order
+    try:
+        data = loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+    snapshots = data.get("snapshots") if isinstance(data, dict) else None
+    if not isinstance(snapshots, list) or not all(
+        isinstance(snapshot, dict) and isinstance(snapshot.get("user_id"), str) for snapshot in snapshots
+    ):
+        raise HTTPException(status_code=400, detail="Expected {\"snapshots\": [...]}, each with a user_id")
+    if not ring.nodes:
+        raise HTTPException(status_code=503, detail="No shard nodes configured")
+
+    parts: Dict[str, List[int]] = {}
+    for index, snapshot in enumerate(snapshots):
+        parts.setdefault(ring.node_for(snapshot["user_id"]), []).append(index)
+
+    async def forward_part(node: str, indices: List[int]):
+        part_body = dumps({"snapshots": [snapshots[i] for i in indices]})
+        response = await _forward(
+            _nodes_for(snapshots[indices[0]]["user_id"]), request, "/predict-batch", part_body
+        )
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=response.body.decode())
+        return indices, loads(response.body)["results"]
+
+    results = [None] * len(snapshots)
+    for indices, part_results in await asyncio.gather(*(forward_part(n, i) for n, i in parts.items())):
+        for index, result in zip(indices, part_results):
+            results[index] = result
+    return Response(content=dumps({"count": len(results), "results": results}), media_type="application/json")
+
+
+async def _fetch_cache_stats(node: str) -> dict:
+    # Nodes run one worker each, so its /model-cache-stats is the node's
+    try:
+        response = await _client.get(node + "/model-cache-stats")
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        return {"error": str(e)}
+    cache = response.json()
+    hits, misses = cache.get("hits", 0), cache.get("misses", 0)
+    return {
+        "pid": cache.get("pid"),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+        "entries": cache.get("entries"),
+        "bytes": cache.get("bytes"),
+    }
+
+
+@app.get("/router/stats")
+async def router_stats():
+    shares = ring.shares()
+    caches = await asyncio.gather(*(_fetch_cache_stats(node) for node in ring.nodes))
+    hits = sum(cache.get("hits", 0) for cache in caches)
+    misses = sum(cache.get("misses", 0) for cache in caches)
+    return {
+        "vnodes": ring.vnodes,
+        "cache_hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+        "nodes": [
+            {
+                "node": node,
+                "keyspace_share": round(shares[node], 4),
+                "requests": stats["requests"].get(node, 0),
+                "failovers": stats["failovers"].get(node, 0),
+                "errors": stats["errors"].get(node, 0),
+                "model_cache": cache,
+            }
+            for node, cache in zip(ring.nodes, caches)
+        ],
+        "membership_changes": stats["membership_changes"],
+    }
+
+
+@app.get("/router/route/{user_id}")
+async def route_user(user_id: str):
+    # Header-style routing for clients or load balancers that connect to
+    # the node themselves (e.g. the /stream-session WebSocket)
+    nodes = _nodes_for(user_id)
+    return Response(
+        content=dumps({"user_id": user_id, "node": nodes[0], "failover": nodes[1:]}),
+        media_type="application/json",
+        headers={"X-Shard-Node": nodes[0]},
+    )
+
+
+def _change_membership(action: str, node: str) -> dict:
+    old = HashRing(ring.nodes, ring.vnodes)
+    if action == "add":
+        ring.add(node)
+    else:
+        ring.remove(node)
+    change = {
+        "action": action,
+        "node": node,
+        "nodes": list(ring.nodes),
+        "moved_fraction": round(moved_fraction(old, ring), 4),
+        "at": datetime.now().isoformat(),
+    }
+    stats["membership_changes"].append(change)
+    print(f"🔀 Shard {action} {node}: {change['moved_fraction']:.1%} of users moved")
+    return change
+
+
+def _admin_node(request: Request, data: dict) -> str:
+    # The node URL of a membership change, once the caller is allowed to
+    # make one
+    if ROUTER_ADMIN_TOKEN:
+        if not hmac.compare_digest(request.headers.get("x-admin-token", ""), ROUTER_ADMIN_TOKEN):
+            raise HTTPException(status_code=403, detail="Invalid or missing X-Admin-Token")
+    elif request.client is None or request.client.host not in LOOPBACK_HOSTS:
+        raise HTTPException(status_code=403, detail="Set ROUTER_ADMIN_TOKEN to change shard nodes remotely")
+
+    node = data.get("node")
+    if not isinstance(node, str) or not re.match(r"^https?://[^/]+", node):
+        raise HTTPException(status_code=400, detail="Expected {\"node\": \"http://host:port\"}")
+    return node.rstrip("/")
+
+
+@app.post("/router/nodes")
+async def add_node(data: dict, request: Request):
+    return _change_membership("add", _admin_node(request, data))
+
+
+@app.delete("/router/nodes")
+async def remove_node(data: dict, request: Request):
+    node = _admin_node(request, data)
+    if node not in ring.nodes:
+        raise HTTPException(status_code=404, detail=f"Unknown shard node {node}")
+    return _change_membership("remove", node)
+
+
+@app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
+async def proxy(path: str, request: Request):
+    path = "/" + path
+    if path == "/predict-batch" and request.method == "POST":
+        return await _predict_batch(request, await request.body())
+
+    match = USER_PATH.match(path)
+    if match:
+        user_id = match.group(2)
+        # Stream bodies through (NDJSON session uploads) rather than buffer
+        content = request.stream() if match.group(1) == "stream-session" else await request.body()
+        return await _forward(_nodes_for(user_id), request, path, content)
+
+    body = await request.body()
+    user_id = None
+    if path in USER_BODY_PATHS and body:
+        try:
+            user_id = loads(body).get("user_id")
+        except (ValueError, AttributeError):
+            # Not a JSON object; the node answers with its own 422
+            user_id = None
+        if user_id is not None and not isinstance(user_id, str):
+            raise HTTPException(status_code=400, detail="Expected a string user_id")
+    return await _forward(_nodes_for(user_id), request, path, body or None)
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="User-affinity router in front of several app processes")
+    parser.add_argument("--nodes", help="comma-separated backend URLs (default: SHARD_NODES)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    args = parser.parse_args()
+
+    if args.nodes:
+        for node in ring.nodes[:]:
+            ring.remove(node)
+        for node in args.nodes.split(","):
+            if node.strip():
+                ring.add(node.strip().rstrip("/"))
+    print(f"🔀 Routing users over {len(ring.nodes)} nodes: {', '.join(ring.nodes)}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
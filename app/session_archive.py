@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import argparse
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+from app.concurrency import file_lock
+from app.feature_store import FeatureStore, SESSION_FILE_RE, DATA_DIR
+from app.metrics import metrics
+from app.model_store import atomic_write
+
+QUARANTINE_DIR = "quarantine"
+
+# Newest sessions kept as plain CSV files per user directory (/session-data
+# shows the last 10, so keep at least that many)
+SESSION_HOT_SESSIONS = max(10, int(os.environ.get("SESSION_HOT_SESSIONS", "20")))
+# Sessions rolled into one gzip archive segment once that many have aged
+# out of the hot set
+SESSION_SEGMENT_SESSIONS = int(os.environ.get("SESSION_SEGMENT_SESSIONS", "50"))
+# Archive segments kept per user directory, oldest dropped first, so a
+# directory holds at most hot + (max + 1) * segment sessions; 0 keeps all
+SESSION_ARCHIVE_MAX_SEGMENTS = int(os.environ.get("SESSION_ARCHIVE_MAX_SEGMENTS", "4"))
+
+
+class SessionArchive:
+    # Session CSVs of one kind (data/ or quarantine/) for every user:
+    #   {root}/{user_id}/session_{n}.csv              the hot set
+    #   {root}/{user_id}/archive_{first}_{last}.csv.gz older sessions, one
+    #                                                  frame with a "session" column
+    #   {root}/{user_id}/index.json                   counters and file lists
+    # Numbering, counting and "latest N" come from the index, so nothing on
+    # the request path lists the directory, and compaction keeps the number
+    # of files per user bounded however long the user has been around.
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _user_dir(self, user_id: str) -> str:
+        return os.path.join(self.root, user_id)
+
+    def _index_path(self, user_id: str) -> str:
+        return os.path.join(self._user_dir(user_id), "index.json")
+
+    def session_path(self, user_id: str, number: int) -> str:
+        return os.path.join(self._user_dir(user_id), f"session_{number}.csv")
+
+    def _locked(self, user_id: str):
+        # Serializes numbering and compaction for one user across processes
+        return file_lock(os.path.join(self._user_dir(user_id), ".lock"))
+
+    def _read_index(self, user_id: str) -> Optional[dict]:
+        path = self._index_path(user_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def _write_index(self, user_id: str, index: dict):
+        atomic_write(self._index_path(user_id), "w", lambda f: json.dump(index, f))
+
+    def _scan_locked(self, user_id: str) -> dict:
+        # One-off index for a directory written before the archive existed
+        numbers = []
+        user_dir = self._user_dir(user_id)
+        if os.path.isdir(user_dir):
+            for filename in os.listdir(user_dir):
+                match = SESSION_FILE_RE.match(filename)
+                if match:
+                    numbers.append(int(match.group(1)))
+        numbers.sort()
+        index = {
+            "latest": numbers[-1] if numbers else 0,
+            "count": len(numbers),
+            "hot": numbers,
+            "archived_through": 0,
+            "archived_sessions": 0,
+            "dropped_sessions": 0,
+            "segments": [],
+        }
+        self._write_index(user_id, index)
+        return index
+
+    def _load_locked(self, user_id: str) -> dict:
+        index = self._read_index(user_id)
+        return index if index is not None else self._scan_locked(user_id)
+
+    def info(self, user_id: str) -> dict:
+        index = self._read_index(user_id)
+        if index is None:
+            if not os.path.isdir(self._user_dir(user_id)):
+                return self._empty_info()
+            with self._locked(user_id):
+                index = self._load_locked(user_id)
+        return index
+
+    def _empty_info(self) -> dict:
+        return {"latest": 0, "count": 0, "hot": [], "archived_through": 0, "archived_sessions": 0,
+                "dropped_sessions": 0, "segments": []}
+
+    def count(self, user_id: str) -> int:
+        return self.info(user_id)["count"]
+
+    def recent(self, user_id: str, n: int) -> List[Tuple[int, str]]:
+        # (number, path) of the newest n hot sessions, oldest first
+        return [(number, self.session_path(user_id, number)) for number in self.info(user_id)["hot"][-n:]]
+
+    def write_session(self, user_id: str, number: int, frame: pd.DataFrame) -> str:
+        # A session numbered by the caller (data/: the feature store counter)
+        with self._locked(user_id):
+            index = self._load_locked(user_id)
+            path = self.session_path(user_id, number)
+            with metrics.timer("session_write"):
+                frame.to_csv(path, index=False)
+            self._record_locked(user_id, index, number)
+        return path
+
+    def add_session(self, user_id: str, frame: pd.DataFrame) -> Tuple[int, str]:
+        # A session numbered here (quarantine/): next number under the lock
+        with self._locked(user_id):
+            index = self._load_locked(user_id)
+            number = index["latest"] + 1
+            path = self.session_path(user_id, number)
+            with metrics.timer("session_write"):
+                frame.to_csv(path, index=False)
+            self._record_locked(user_id, index, number)
+        return number, path
+
+    def _record_locked(self, user_id: str, index: dict, number: int):
+        if number not in index["hot"]:
+            index["hot"].append(number)
+            index["count"] += 1
+        index["latest"] = max(index["latest"], number)
+        if len(index["hot"]) >= SESSION_HOT_SESSIONS + SESSION_SEGMENT_SESSIONS:
+            self._compact_locked(user_id, index)
+        self._write_index(user_id, index)
+
+    def _compact_locked(self, user_id: str, index: dict):
+        # Roll the oldest SESSION_SEGMENT_SESSIONS hot files into one gzip
+        # segment at a time, leaving SESSION_HOT_SESSIONS as files. The index
+        # is written before the CSVs are removed, so a crash in between
+        # leaves stray files, never a session that is in neither place.
+        with metrics.timer("session_compaction"):
+            while len(index["hot"]) >= SESSION_HOT_SESSIONS + SESSION_SEGMENT_SESSIONS:
+                numbers = index["hot"][:SESSION_SEGMENT_SESSIONS]
+                frames = []
+                for number in numbers:
+                    try:
+                        frame = pd.read_csv(self.session_path(user_id, number))
+                    except FileNotFoundError:
+                        continue
+                    except pd.errors.EmptyDataError:
+                        frame = pd.DataFrame()
+                    frame.insert(0, "session", number)
+                    frames.append(frame)
+
+                filename = f"archive_{numbers[0]}_{numbers[-1]}.csv.gz"
+                path = os.path.join(self._user_dir(user_id), filename)
+                segment = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["session"])
+                atomic_write(path, "wb", lambda f: segment.to_csv(f, index=False, compression="gzip"))
+
+                index["segments"].append({
+                    "file": filename,
+                    "first": numbers[0],
+                    "last": numbers[-1],
+                    "sessions": len(frames),
+                    "rows": len(segment),
+                    "bytes": os.path.getsize(path),
+                    "created_at": time.time(),
+                })
+                index["hot"] = index["hot"][len(numbers):]
+                index["archived_through"] = numbers[-1]
+                index["archived_sessions"] += len(frames)
+
+                while SESSION_ARCHIVE_MAX_SEGMENTS and len(index["segments"]) > SESSION_ARCHIVE_MAX_SEGMENTS:
+                    dropped = index["segments"].pop(0)
+                    index["dropped_sessions"] += dropped["sessions"]
+                    try:
+                        os.remove(os.path.join(self._user_dir(user_id), dropped["file"]))
+                    except FileNotFoundError:
+                        pass
+
+                self._write_index(user_id, index)
+                for number in numbers:
+                    try:
+                        os.remove(self.session_path(user_id, number))
+                    except FileNotFoundError:
+                        pass
+                print(f"[{user_id}] 🗜️ Archived sessions {numbers[0]}-{numbers[-1]} of {self.root}/ into {filename}")
+
+    def compact(self, user_id: str) -> dict:
+        with self._locked(user_id):
+            index = self._load_locked(user_id)
+            if len(index["hot"]) >= SESSION_HOT_SESSIONS + SESSION_SEGMENT_SESSIONS:
+                self._compact_locked(user_id, index)
+                self._write_index(user_id, index)
+        return index
+
+    def read_archived(self, user_id: str) -> pd.DataFrame:
+        # Every archived session still kept, oldest first, with "session"
+        frames = [
+            pd.read_csv(os.path.join(self._user_dir(user_id), segment["file"]), compression="gzip")
+            for segment in self.info(user_id)["segments"]
+        ]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["session"])
+
+    def list_users(self) -> List[str]:
+        return sorted(
+            name for name in os.listdir(self.root)
+            if os.path.isdir(os.path.join(self.root, name))
+        ) if os.path.isdir(self.root) else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Session CSV retention and compaction")
+    parser.add_argument("--data-root", default=DATA_DIR)
+    parser.add_argument("--quarantine-root", default=QUARANTINE_DIR)
+    parser.add_argument("--compact-all", action="store_true", help="index and compact every user's sessions")
+    parser.add_argument("--info", metavar="USER_ID")
+    args = parser.parse_args()
+
+    archives = {"data": SessionArchive(args.data_root), "quarantine": SessionArchive(args.quarantine_root)}
+    if args.compact_all:
+        # Legacy users must be in the feature store before their CSVs move
+        feature_store = FeatureStore(data_root=args.data_root)
+        for kind, archive in archives.items():
+            users = archive.list_users()
+            archived = 0
+            for user_id in users:
+                if kind == "data":
+                    feature_store.info(user_id)
+                archived += archive.compact(user_id)["archived_sessions"]
+            print(f"{kind}: {len(users)} users, {archived} sessions archived")
+    if args.info:
+        print(json.dumps({kind: archive.info(args.info) for kind, archive in archives.items()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
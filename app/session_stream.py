@@ -0,0 +1,81 @@
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.feature_store import FEATURES
+from app.flatten_snapshot import snapshot_matrix
+from app.analyze_context import analyze_session_context
+from app.model_manager import ModelManager
+from app.metrics import metrics
+
+# What a malformed snapshot raises while being scored
+INVALID_SNAPSHOT_ERRORS = (ValueError, KeyError, TypeError, AttributeError)
+
+
+class SessionStream:
+    # One session streamed snapshot by snapshot. The device profile, the
+    # previous context and the model are resolved once when the stream
+    # opens; each chunk is scored against them as it arrives, chaining the
+    # context from the chunk before, so the final risks and context scores
+    # equal what /end-session computes for the same snapshots in one body.
+
+    def __init__(self, model_manager: ModelManager, user_id: str, base_profile: Optional[dict],
+                 last_context: Optional[dict]):
+        self.model_manager = model_manager
+        self.user_id = user_id
+        self.base_profile = base_profile
+        self.last_context = last_context
+        self.scoring_model = model_manager.load_scoring_model(user_id)
+
+        self.matrices: List[np.ndarray] = []
+        self.context_scores: List[dict] = []
+        self.risks: List[float] = []
+        # Running total for progress updates; the stored session risk is
+        # computed from self.risks exactly as end_session does
+        self.risk_sum = 0.0
+        self.max_risk = 0.0
+
+    def add(self, snapshots: List[dict]) -> List[dict]:
+        # Raises ValueError / KeyError / TypeError / AttributeError on a
+        # malformed chunk, before any of the stream's state has changed, so
+        # the caller can reject it and carry on
+        if not isinstance(snapshots, list) or not all(isinstance(s, dict) for s in snapshots):
+            raise TypeError("snapshots must be a list of JSON objects")
+        if not snapshots:
+            return []
+        contexts = [snapshot.get("context", {}) for snapshot in snapshots]
+        with metrics.timer("analyze_context"):
+            context_scores = analyze_session_context(
+                self.user_id, contexts, base_profile=self.base_profile, last_context=self.last_context
+            )
+
+        with metrics.timer("flatten_snapshot"):
+            X = snapshot_matrix(snapshots)
+        with metrics.timer("predict_risk"):
+            risks = self.model_manager.predict_with_model(self.user_id, self.scoring_model, X)
+
+        self.last_context = contexts[-1]
+        self.matrices.append(X)
+        self.context_scores.extend(context_scores)
+        self.risks.extend(risks)
+        for risk in risks:
+            self.risk_sum += risk
+        self.max_risk = max([self.max_risk] + risks)
+        return [{"risk_score": risk, **scores} for risk, scores in zip(risks, context_scores)]
+
+    @property
+    def snapshot_count(self) -> int:
+        return len(self.risks)
+
+    def summary(self) -> dict:
+        # Running aggregate sent back after every chunk
+        return {
+            "snapshot_count": self.snapshot_count,
+            "risk_score": round(self.risk_sum / len(self.risks), 2) if self.risks else 0,
+            "max_risk": round(self.max_risk, 2),
+        }
+
+    def session_frame(self) -> pd.DataFrame:
+        # Same frame end_session builds for the whole session
+        return pd.DataFrame(np.vstack(self.matrices), columns=FEATURES)
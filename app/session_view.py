@@ -0,0 +1,246 @@
+import os
+import sqlite3
+import argparse
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.concurrency import SQLiteConnections
+from app.feature_store import FEATURES
+from app.risk_log import RISK_DB_PATH
+from app.session_archive import SessionArchive
+from app.user_index import encode_cursor, decode_cursor
+
+# Newest stored sessions kept in the view per user
+SESSION_VIEW_SESSIONS = int(os.environ.get("SESSION_VIEW_SESSIONS", "50"))
+
+SCORE_COLUMNS = ["risk", "geo_shift_score", "network_shift_score", "device_mismatch_score"]
+# Everything a snapshot in /session-data can carry, in response order
+VIEW_COLUMNS = FEATURES + SCORE_COLUMNS
+
+# Snapshots clustered by (user_id, session, position), so a page of
+# sessions is one range scan. Feature and score names are fixed
+# identifiers, never user input.
+SESSION_VIEW_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS session_view_sessions (
+    user_id TEXT NOT NULL,
+    session INTEGER NOT NULL,
+    snapshot_count INTEGER NOT NULL,
+    session_risk REAL,
+    max_risk REAL,
+    stored_at TEXT NOT NULL,
+    PRIMARY KEY (user_id, session)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS session_snapshots (
+    user_id TEXT NOT NULL,
+    session INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    {", ".join(f"{column} REAL" for column in VIEW_COLUMNS)},
+    PRIMARY KEY (user_id, session, position)
+) WITHOUT ROWID;
+-- Users whose pre-existing session CSVs have been imported
+CREATE TABLE IF NOT EXISTS session_view_users (
+    user_id TEXT PRIMARY KEY,
+    backfilled_at TEXT NOT NULL
+);
+"""
+
+INSERT_SESSION = """
+INSERT OR {conflict} INTO session_view_sessions (user_id, session, snapshot_count, session_risk, max_risk, stored_at)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+INSERT_SNAPSHOT = (
+    f"INSERT OR {{conflict}} INTO session_snapshots (user_id, session, position, {', '.join(VIEW_COLUMNS)}) "
+    f"VALUES (?, ?, ?, {', '.join('?' for _ in VIEW_COLUMNS)})"
+)
+
+
+def _nullable(value) -> Optional[float]:
+    return None if value is None or value != value else float(value)
+
+
+def _session_rows(user_id: str, session: int, frame: pd.DataFrame, risks: Optional[List[float]],
+                  context_scores: Optional[List[dict]]) -> tuple:
+    X = frame.reindex(columns=FEATURES).to_numpy(dtype=float)
+    n = len(X)
+    risks = list(risks) if risks is not None else [None] * n
+    context_scores = list(context_scores) if context_scores is not None else [{}] * n
+
+    snapshots = []
+    for position, (features, risk, scores) in enumerate(zip(X.tolist(), risks, context_scores)):
+        snapshots.append((
+            user_id, session, position, *features, _nullable(risk),
+            *(_nullable(scores.get(column)) for column in SCORE_COLUMNS[1:]),
+        ))
+    known = [r for r in risks if r is not None]
+    session_row = (
+        user_id, session, n,
+        round(float(np.mean(known)), 2) if known else None,
+        float(max(known)) if known else None,
+        datetime.now().isoformat(),
+    )
+    return session_row, snapshots
+
+
+class SessionView:
+    # /session-data served from the risk log database: every stored session
+    # with its snapshots' features, risk and context scores as they were
+    # scored at /end-session. Pages are keyset ranges over (session,
+    # position), so a dashboard refresh reads one index range instead of
+    # re-reading session CSVs and re-joining them with the risk log.
+
+    def __init__(self, sessions: SessionArchive, db_path: str = RISK_DB_PATH):
+        self.sessions = sessions
+        self.db_path = db_path
+        self._connect = SQLiteConnections(db_path)
+        with self._connect() as conn:
+            conn.executescript(SESSION_VIEW_SCHEMA)
+
+    def _is_backfilled(self, conn: sqlite3.Connection, user_id: str) -> bool:
+        return conn.execute("SELECT 1 FROM session_view_users WHERE user_id = ?", (user_id,)).fetchone() is not None
+
+    def _read_stored_sessions(self, user_id: str, skip: Optional[int] = None) -> list:
+        # Sessions stored before the view existed: the hot CSVs still on
+        # disk, without scores. Parsed before any write transaction opens,
+        # so other writers to the database never wait on pandas.
+        prepared = []
+        for number, path in self.sessions.recent(user_id, SESSION_VIEW_SESSIONS):
+            if number == skip:
+                continue
+            try:
+                frame = pd.read_csv(path)
+            except (FileNotFoundError, pd.errors.EmptyDataError):
+                continue
+            prepared.append(_session_rows(user_id, number, frame, None, None))
+        return prepared
+
+    def _backfill_locked(self, conn: sqlite3.Connection, user_id: str, prepared: list):
+        # Once per user, inside the caller's write transaction; rows already
+        # present win
+        if self._is_backfilled(conn, user_id):
+            return
+        for session_row, snapshots in prepared:
+            conn.execute(INSERT_SESSION.format(conflict="IGNORE"), session_row)
+            conn.executemany(INSERT_SNAPSHOT.format(conflict="IGNORE"), snapshots)
+        conn.execute("INSERT INTO session_view_users (user_id, backfilled_at) VALUES (?, ?)",
+                     (user_id, datetime.now().isoformat()))
+
+    def record(self, user_id: str, session: int, frame: pd.DataFrame, risks: List[float], context_scores: List[dict]):
+        # Called after the session CSV is written, under the user's lock. A
+        # user's first session has nothing older to import.
+        session_row, snapshots = _session_rows(user_id, session, frame, risks, context_scores)
+        conn = self._connect()
+        prepared = []
+        if session > 1 and not self._is_backfilled(conn, user_id):
+            prepared = self._read_stored_sessions(user_id, skip=session)
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._backfill_locked(conn, user_id, prepared)
+            conn.execute("DELETE FROM session_snapshots WHERE user_id = ? AND session = ?", (user_id, session))
+            conn.execute(INSERT_SESSION.format(conflict="REPLACE"), session_row)
+            conn.executemany(INSERT_SNAPSHOT.format(conflict="REPLACE"), snapshots)
+            # Keep the newest SESSION_VIEW_SESSIONS sessions
+            for table in ("session_snapshots", "session_view_sessions"):
+                conn.execute(f"DELETE FROM {table} WHERE user_id = ? AND session <= ?",
+                             (user_id, session - SESSION_VIEW_SESSIONS))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _ensure_backfilled(self, user_id: str):
+        conn = self._connect()
+        if self._is_backfilled(conn, user_id):
+            return
+        prepared = self._read_stored_sessions(user_id)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._backfill_locked(conn, user_id, prepared)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def page(self, user_id: str, limit: int = 10, cursor: Optional[str] = None,
+             columns: Optional[List[str]] = None) -> dict:
+        # The newest `limit` sessions older than the cursor, returned oldest
+        # first; next_cursor continues further back. columns projects the
+        # snapshot fields (default: all of VIEW_COLUMNS).
+        columns = list(columns) if columns else VIEW_COLUMNS
+        unknown = [column for column in columns if column not in VIEW_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)} (expected any of {', '.join(VIEW_COLUMNS)})")
+
+        before = None
+        if cursor:
+            before, cursor_user = decode_cursor(cursor)
+            if cursor_user != user_id or not isinstance(before, int):
+                raise ValueError(f"Invalid cursor: {cursor}")
+
+        self._ensure_backfilled(user_id)
+        conn = self._connect()
+        sessions = conn.execute(
+            "SELECT session, snapshot_count, session_risk, max_risk, stored_at FROM session_view_sessions "
+            "WHERE user_id = ? AND session < ? ORDER BY session DESC LIMIT ?",
+            (user_id, before if before is not None else 2 ** 62, limit + 1),
+        ).fetchall()
+        has_more = len(sessions) > limit
+        sessions = sessions[:limit][::-1]
+
+        snapshots = {}
+        if sessions:
+            rows = conn.execute(
+                f"SELECT session, {', '.join(columns)} FROM session_snapshots "
+                "WHERE user_id = ? AND session BETWEEN ? AND ? ORDER BY session, position",
+                (user_id, sessions[0][0], sessions[-1][0]),
+            ).fetchall()
+            for row in rows:
+                snapshots.setdefault(row[0], []).append(dict(zip(columns, row[1:])))
+
+        return {
+            "sessions": [
+                {
+                    "session": session,
+                    "filename": f"session_{session}.csv",
+                    "snapshot_count": snapshot_count,
+                    "session_risk": session_risk,
+                    "max_risk": max_risk,
+                    "stored_at": stored_at,
+                    "snapshots": snapshots.get(session, []),
+                }
+                for session, snapshot_count, session_risk, max_risk, stored_at in sessions
+            ],
+            "next_cursor": encode_cursor(sessions[0][0], user_id) if has_more else None,
+        }
+
+    def delete_user(self, user_id: str) -> bool:
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM session_view_sessions WHERE user_id = ?", (user_id,))
+            conn.execute("DELETE FROM session_snapshots WHERE user_id = ?", (user_id,))
+            conn.execute("DELETE FROM session_view_users WHERE user_id = ?", (user_id,))
+        return cursor.rowcount > 0
+
+
+def main():
+    from app.feature_store import DATA_DIR
+
+    parser = argparse.ArgumentParser(description="Per-session /session-data view maintenance")
+    parser.add_argument("--db", default=RISK_DB_PATH)
+    parser.add_argument("--data-root", default=DATA_DIR)
+    parser.add_argument("--backfill", action="store_true", help="import stored session CSVs for every user")
+    args = parser.parse_args()
+
+    sessions = SessionArchive(args.data_root)
+    view = SessionView(sessions, args.db)
+    if args.backfill:
+        users = sessions.list_users()
+        for user_id in users:
+            view._ensure_backfilled(user_id)
+        print(f"Checked {len(users)} users")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import os
+import bisect
+import hashlib
+from typing import Dict, Iterable, List
+
+# Points per node on the ring; more points = more even key shares
+SHARD_VNODES = int(os.environ.get("SHARD_VNODES", "160"))
+# Comma-separated backend base URLs, e.g. http://127.0.0.1:9001,http://127.0.0.1:9002
+SHARD_NODES = [node.strip().rstrip("/") for node in os.environ.get("SHARD_NODES", "").split(",") if node.strip()]
+# This process's own URL among SHARD_NODES when it runs as a shard node
+SHARD_SELF = os.environ.get("SHARD_SELF", "").strip().rstrip("/")
+
+RING_SIZE = 2 ** 64
+
+
+def ring_hash(key: str) -> int:
+    # md5 for an even spread (crc32 is too clustered for ring points),
+    # truncated to 64 bits; stable across processes and restarts
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    # Consistent hashing of user ids onto nodes. Each node owns the arcs
+    # ending at its SHARD_VNODES points, so adding or removing a node only
+    # moves the users on the arcs it gains or loses (about 1/N of them).
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = SHARD_VNODES):
+        self.vnodes = vnodes
+        self.nodes: List[str] = []
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    def _rebuild(self):
+        points = sorted(
+            (ring_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(self.vnodes)
+        )
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def add(self, node: str):
+        if node not in self.nodes:
+            self.nodes.append(node)
+            self._rebuild()
+
+    def remove(self, node: str):
+        if node in self.nodes:
+            self.nodes.remove(node)
+            self._rebuild()
+
+    def _owner_at(self, point: int) -> str:
+        index = bisect.bisect_left(self._points, point)
+        return self._owners[index % len(self._owners)]
+
+    def node_for(self, user_id: str) -> str:
+        if not self.nodes:
+            raise LookupError("Hash ring has no nodes")
+        return self._owner_at(ring_hash(user_id))
+
+    def nodes_for(self, user_id: str, count: int) -> List[str]:
+        # Owner first, then the next distinct nodes clockwise: the failover
+        # order, which is also where the user lands if the owner is removed
+        if not self.nodes:
+            raise LookupError("Hash ring has no nodes")
+        start = bisect.bisect_left(self._points, ring_hash(user_id))
+        found = []
+        for offset in range(len(self._owners)):
+            node = self._owners[(start + offset) % len(self._owners)]
+            if node not in found:
+                found.append(node)
+                if len(found) == count:
+                    break
+        return found
+
+    def shares(self) -> Dict[str, float]:
+        # Fraction of the hash space (and so, on average, of users) per node
+        shares = {node: 0.0 for node in self.nodes}
+        for i, point in enumerate(self._points):
+            previous = self._points[i - 1] if i else self._points[-1] - RING_SIZE
+            shares[self._owners[i]] += (point - previous) / RING_SIZE
+        return shares
+
+
+def moved_fraction(old: HashRing, new: HashRing) -> float:
+    # Exact fraction of the hash space whose owner differs between two
+    # rings: walk the arcs between the union of both rings' points
+    if not old.nodes or not new.nodes:
+        return 1.0
+    points = sorted(set(old._points) | set(new._points))
+    moved = 0
+    for i, point in enumerate(points):
+        previous = points[i - 1] if i else points[-1] - RING_SIZE
+        # Keys on (previous, point] are owned by whoever owns `point`
+        if old._owner_at(point) != new._owner_at(point):
+            moved += point - previous
+    return moved / RING_SIZE
@@ -0,0 +1,221 @@
+import os
+import json
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Dict, Optional
+
+from app.model_manager import ModelManager, MODEL_DIR, training_lock
+from app.model_store import atomic_write
+from app.metrics import metrics, pid_alive
+
+# 0 trains inline on the request thread (handy for local debugging)
+TRAINING_WORKERS = int(os.environ.get("TRAINING_WORKERS", "1"))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+# Outcome of a job whose user was reset before it could publish
+JOB_CANCELLED = "cancelled"
+
+
+def _get_job_path(user_id: str) -> str:
+    return os.path.join(MODEL_DIR, f"{user_id}_job.json")
+
+
+def write_job_status(user_id: str, status: str, **extra):
+    job = {"user_id": user_id, "status": status, "updated_at": datetime.now().isoformat(), **extra}
+    atomic_write(_get_job_path(user_id), "w", lambda f: json.dump(job, f, indent=2))
+
+
+def load_job_status(user_id: str) -> Optional[dict]:
+    job_path = _get_job_path(user_id)
+    if not os.path.exists(job_path):
+        return None
+    try:
+        with open(job_path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def delete_job_status(user_id: str) -> Optional[str]:
+    job_path = _get_job_path(user_id)
+    if os.path.exists(job_path):
+        os.remove(job_path)
+        return job_path
+    return None
+
+
+def _job_active(job: Optional[dict]) -> bool:
+    # Queued or running in a process that still exists; the pid is the
+    # submitting worker (the job's owner) while queued and the pool
+    # process while running
+    return (job is not None and job["status"] in (JOB_QUEUED, JOB_RUNNING)
+            and job.get("pid") is not None and pid_alive(job["pid"]))
+
+
+def run_training_job(user_id: str, dataset_root: str, trigger: Optional[dict] = None,
+                     generation: Optional[int] = None, owner: Optional[int] = None) -> dict:
+    # Runs inside the pool process, so status changes are visible to every
+    # gunicorn worker through the job file. A retrain requested by any
+    # worker while this one runs sets "rerun" on the job, and the fit is
+    # repeated here before the job is marked done.
+    manager = ModelManager(dataset_root)
+    started = datetime.now()
+    while True:
+        with training_lock(user_id) as current:
+            if generation is None:
+                generation = current
+            if current != generation:
+                return {"user_id": user_id, "cancelled": True}
+            write_job_status(user_id, JOB_RUNNING, trigger=trigger, pid=os.getpid(), owner=owner,
+                             generation=generation)
+
+        try:
+            metadata = manager._train_model(user_id, trigger, generation)
+        except Exception as e:
+            with training_lock(user_id) as current:
+                if current != generation:
+                    # The reset removed files from under the fit
+                    return {"user_id": user_id, "cancelled": True}
+                write_job_status(user_id, JOB_FAILED, error=str(e))
+            raise
+
+        with training_lock(user_id) as current:
+            if current != generation:
+                return {"user_id": user_id, "cancelled": True}
+            job = load_job_status(user_id) or {}
+            if not job.get("rerun"):
+                duration = round((datetime.now() - started).total_seconds(), 3)
+                # A skipped fit (too little data) is still done, but says so
+                # and why, so a client can tell it from a published model
+                outcome = {"trained": True} if metadata is not None else {
+                    "trained": False, "reason": manager.skip_reasons.get(user_id)}
+                write_job_status(user_id, JOB_DONE, duration_sec=duration, **outcome)
+                return {"user_id": user_id, "duration_sec": duration, **outcome}
+            trigger = job.get("trigger")
+
+
+class TrainingScheduler:
+    def __init__(self, model_manager: ModelManager, max_workers: int = TRAINING_WORKERS):
+        self.model_manager = model_manager
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Future] = {}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn, not fork: the parent is a threaded uvicorn worker
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def submit(self, user_id: str, trigger: Optional[dict] = None) -> str:
+        metrics.inc("retrain_requests_total", reason=(trigger or {}).get("reason", "manual"))
+        if self.max_workers <= 0:
+            result = run_training_job(user_id, self.model_manager.dataset_root, trigger)
+            if result.get("cancelled"):
+                metrics.inc("retrains_total", outcome=JOB_CANCELLED)
+                return JOB_CANCELLED
+            metrics.observe("retrain_duration_seconds", result["duration_sec"])
+            metrics.inc("retrains_total", outcome=JOB_DONE)
+            self._publish(user_id)
+            return JOB_DONE
+
+        with self._lock, training_lock(user_id) as generation:
+            # The job file is the source of truth, so a job queued or running
+            # for this user in any gunicorn worker's pool is reused
+            current = load_job_status(user_id)
+            if _job_active(current):
+                if current["status"] == JOB_RUNNING:
+                    # The running fit has already read its data; train once
+                    # more when it finishes instead of queueing a duplicate
+                    extra = {k: v for k, v in current.items() if k not in ("user_id", "status", "updated_at")}
+                    write_job_status(user_id, JOB_RUNNING, **{**extra, "rerun": True, "trigger": trigger})
+                # A queued job will pick up the new session anyway
+                return JOB_QUEUED
+
+            write_job_status(user_id, JOB_QUEUED, trigger=trigger, pid=os.getpid(), owner=os.getpid(),
+                             generation=generation)
+            args = (run_training_job, user_id, self.model_manager.dataset_root, trigger, generation, os.getpid())
+            try:
+                job = self._get_executor().submit(*args)
+            except BrokenProcessPool:
+                # A pool process died (e.g. OOM); start a fresh pool
+                self._executor = None
+                job = self._get_executor().submit(*args)
+            self._jobs[user_id] = job
+
+        job.add_done_callback(lambda f, user_id=user_id: self._on_done(user_id, f))
+        return JOB_QUEUED
+
+    def cancel(self, user_id: str):
+        # Drops this worker's queued job for the user; a running one (or one
+        # queued elsewhere) notices the reset's generation bump instead
+        with self._lock:
+            job = self._jobs.get(user_id)
+        if job is not None:
+            job.cancel()
+
+    def _on_done(self, user_id: str, job: Future):
+        with self._lock:
+            if self._jobs.get(user_id) is job:
+                del self._jobs[user_id]
+
+        if job.cancelled():
+            return
+        error = job.exception()
+        if error is not None:
+            print(f"[{user_id}] ❌ Background training failed: {error!r}")
+            metrics.inc("retrains_total", outcome=JOB_FAILED)
+            if isinstance(error, BrokenProcessPool):
+                # The pool process died mid-fit and never recorded it
+                self._mark_failed(user_id, "training process died")
+        elif job.result().get("cancelled"):
+            metrics.inc("retrains_total", outcome=JOB_CANCELLED)
+        else:
+            metrics.observe("retrain_duration_seconds", job.result()["duration_sec"])
+            metrics.inc("retrains_total", outcome=JOB_DONE)
+            self._publish(user_id)
+
+    def _mark_failed(self, user_id: str, error: str):
+        with training_lock(user_id):
+            current = load_job_status(user_id)
+            # Leave a job another worker has taken over since
+            if (current is not None and current["status"] in (JOB_QUEUED, JOB_RUNNING)
+                    and current.get("owner") == os.getpid()):
+                write_job_status(user_id, JOB_FAILED, error=error)
+
+    def _publish(self, user_id: str):
+        # The new pickle was swapped in atomically; drop our stale copy so
+        # the next prediction loads it
+        self.model_manager.invalidate(user_id)
+
+    def status(self, user_id: str) -> Optional[dict]:
+        return load_job_status(user_id)
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._jobs)
+
+    def wait(self, timeout: Optional[float] = None):
+        while True:
+            with self._lock:
+                jobs = list(self._jobs.values())
+            if not jobs:
+                return
+            done, not_done = wait(jobs, timeout=timeout)
+            if not_done:
+                return
+
+    def shutdown(self, wait_for_jobs: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait_for_jobs, cancel_futures=not wait_for_jobs)
+            self._executor = None
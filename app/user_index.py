@@ -0,0 +1,204 @@
+import os
+import json
+import base64
+import argparse
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from app.concurrency import SQLiteConnections
+from app.risk_log import RISK_DB_PATH, SCHEMA
+
+# Sort keys accepted by /all-users-meta -> user_summary column
+SORT_COLUMNS = {
+    "user_id": "user_id",
+    "latest_risk": "latest_risk_sort",
+    "last_trained": "last_trained_sort",
+}
+
+UPSERT_TRAINING = """
+INSERT INTO user_summary (user_id, trained, last_trained, last_trained_sort, meta) VALUES (?, 1, ?, ?, ?)
+ON CONFLICT (user_id) DO UPDATE SET
+    trained = 1,
+    last_trained = excluded.last_trained,
+    last_trained_sort = excluded.last_trained_sort,
+    meta = excluded.meta
+"""
+
+
+def _trained_at(last_trained) -> float:
+    try:
+        return datetime.fromisoformat(last_trained).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def encode_cursor(sort_value, user_id: str) -> str:
+    raw = json.dumps([sort_value, user_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, user_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(user_id, str):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return sort_value, user_id
+
+
+class UserIndex:
+    # Per-user summary (trained flag, latest risk, last training metadata)
+    # in the risk log database. Risk log appends update it in the same
+    # transaction and _train_model upserts after writing _meta.json, so
+    # /all-users-meta reads one indexed page instead of every meta file.
+
+    def __init__(self, db_path: str = RISK_DB_PATH):
+        self.db_path = db_path
+        self._connect = SQLiteConnections(db_path)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            conn.execute("CREATE TABLE IF NOT EXISTS user_summary_state (key TEXT PRIMARY KEY, value TEXT)")
+
+    def record_training(self, user_id: str, metadata: dict):
+        last_trained = metadata.get("last_trained")
+        with self._connect() as conn:
+            conn.execute(UPSERT_TRAINING, (user_id, last_trained, _trained_at(last_trained), json.dumps(metadata)))
+
+    def delete_user(self, user_id: str) -> bool:
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM user_summary WHERE user_id = ?", (user_id,))
+        return cursor.rowcount > 0
+
+    def page(self, limit: int = 100, sort: str = "user_id", order: str = "asc",
+             trained: Optional[bool] = None, cursor: Optional[str] = None,
+             include_untrained: bool = False) -> dict:
+        # Keyset pagination: the cursor holds the (sort value, user_id) of
+        # the last row served, so every page is one range scan on an index
+        # whatever its position. Like the old models/*_meta.json listing,
+        # only users with training metadata are included unless
+        # include_untrained (users only seen in the risk log) is set.
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Unknown sort key: {sort} (expected one of {', '.join(SORT_COLUMNS)})")
+        if order not in ("asc", "desc"):
+            raise ValueError(f"Unknown order: {order} (expected asc or desc)")
+        column = SORT_COLUMNS[sort]
+        direction, op = ("ASC", ">") if order == "asc" else ("DESC", "<")
+
+        where, params = [], []
+        if not include_untrained:
+            where.append("meta IS NOT NULL")
+        if trained is not None:
+            where.append("trained = ?")
+            params.append(int(trained))
+        if cursor:
+            sort_value, user_id = decode_cursor(cursor)
+            if column == "user_id":
+                where.append(f"user_id {op} ?")
+                params.append(user_id)
+            else:
+                where.append(f"({column}, user_id) {op} (?, ?)")
+                params.extend([sort_value, user_id])
+
+        order_by = f"user_id {direction}" if column == "user_id" else f"{column} {direction}, user_id {direction}"
+        sql = (
+            f"SELECT user_id, trained, latest_risk, meta, {column} FROM user_summary"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + f" ORDER BY {order_by} LIMIT ?"
+        )
+        # One extra row tells whether there is a next page
+        rows = self._connect().execute(sql, params + [limit + 1]).fetchall()
+
+        users = []
+        for user_id, is_trained, latest_risk, meta, _ in rows[:limit]:
+            users.append({
+                "user_id": user_id,
+                "trained": bool(is_trained),
+                "latest_risk": latest_risk,
+                **(json.loads(meta) if meta else {}),
+            })
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor(last[4], last[0])
+        return {"users": users, "next_cursor": next_cursor}
+
+    def _read_meta_files(self, model_dir: str, has_model: Callable[[str], bool]) -> List[tuple]:
+        summaries = []
+        if not os.path.isdir(model_dir):
+            return summaries
+        for filename in os.listdir(model_dir):
+            if not filename.endswith("_meta.json"):
+                continue
+            user_id = filename[:-len("_meta.json")]
+            try:
+                with open(os.path.join(model_dir, filename), "r") as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[{user_id}] ⚠️ Skipping metadata {filename}: {e}")
+                continue
+            last_trained = metadata.get("last_trained")
+            summaries.append((
+                user_id, int(has_model(user_id)), last_trained, _trained_at(last_trained), json.dumps(metadata),
+            ))
+        return summaries
+
+    def rebuild(self, model_dir: str, has_model: Callable[[str], bool], force: bool = True) -> Optional[int]:
+        # Repopulate from models/*_meta.json and the newest risk log row of
+        # each user. Only needed once for data written before the index
+        # existed (force=False: skipped if already built), or to repair it.
+        # The meta files are read under the write lock, so a retrain that
+        # finishes meanwhile waits and then upserts on top of the rebuild.
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            built = conn.execute("SELECT value FROM user_summary_state WHERE key = 'built_at'").fetchone()
+            if built and not force:
+                conn.execute("COMMIT")
+                return None
+
+            conn.execute("DELETE FROM user_summary")
+            conn.executemany(
+                "INSERT INTO user_summary (user_id, trained, last_trained, last_trained_sort, meta) VALUES (?, ?, ?, ?, ?)",
+                self._read_meta_files(model_dir, has_model),
+            )
+            # "AND true": SQLite needs a WHERE to parse INSERT ... SELECT ... ON CONFLICT
+            conn.execute(
+                """
+                INSERT INTO user_summary (user_id, latest_risk, latest_risk_sort, latest_risk_at)
+                SELECT user_id, risk, COALESCE(risk, -1), timestamp FROM risk_log
+                WHERE id IN (SELECT MAX(id) FROM risk_log GROUP BY user_id) AND true
+                ON CONFLICT (user_id) DO UPDATE SET
+                    latest_risk = excluded.latest_risk,
+                    latest_risk_sort = excluded.latest_risk_sort,
+                    latest_risk_at = excluded.latest_risk_at
+                """
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO user_summary_state (key, value) VALUES ('built_at', ?)",
+                (datetime.now().isoformat(),),
+            )
+            count = conn.execute("SELECT COUNT(*) FROM user_summary").fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return count
+
+def main():
+    from app.model_manager import ModelManager, MODEL_DIR
+
+    parser = argparse.ArgumentParser(description="User summary index maintenance")
+    parser.add_argument("--db", default=RISK_DB_PATH)
+    parser.add_argument("--rebuild", action="store_true", help="repopulate from models/*_meta.json and the risk log")
+    args = parser.parse_args()
+
+    index = UserIndex(args.db)
+    if args.rebuild:
+        count = index.rebuild(MODEL_DIR, ModelManager().has_model)
+        print(f"Indexed {count} users")
+
+
+if __name__ == "__main__":
+    main()
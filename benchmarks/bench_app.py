@@ -0,0 +1,359 @@
+# End-to-end load and latency benchmark with synthetic users.
+#
+# Seeds a throwaway working directory with trained synthetic users, times
+# retraining and cold model loads directly, then drives /predict and
+# /end-session either in-process (ASGI calls, no sockets) or through a
+# uvicorn server, at a fixed concurrency. Results are written as JSON so
+# runs can be compared across commits:
+#
+#   python -m benchmarks.bench_app                          # in-process
+#   python -m benchmarks.bench_app --mode uvicorn --server-workers 4
+#   python -m benchmarks.bench_app --compare benchmarks/results/<previous>.json
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import FEATURE_RANGES, make_users
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+
+def summarize(latencies, elapsed: float, errors: int = 0) -> dict:
+    ms = np.asarray(latencies, dtype=float) * 1000
+    if len(ms) == 0:
+        return {"count": 0, "errors": errors}
+    return {
+        "count": int(len(ms)),
+        "errors": errors,
+        "throughput_per_s": round(len(ms) / elapsed, 2) if elapsed > 0 else None,
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# -------------------------------
+# Seeding and offline timings
+# -------------------------------
+def seed_users(users, sessions: int, snapshots: int) -> dict:
+    # Runs inside the working directory; app modules create their
+    # directories relative to the cwd, so they're imported only now
+    from app.model_manager import ModelManager
+    from app.context_store import ContextStore
+
+    profiles = ContextStore()
+    manager = ModelManager()
+    for user in users:
+        profiles.set_profile(user.user_id, user.device)
+        for _ in range(sessions):
+            frame = pd.DataFrame(user.feature_rows(snapshots), columns=list(FEATURE_RANGES))
+            manager.feature_store.append_session(user.user_id, frame)
+
+    retrain = []
+    started = time.perf_counter()
+    for user in users:
+        t0 = time.perf_counter()
+        manager._train_model(user.user_id, {"reason": "benchmark"})
+        retrain.append(time.perf_counter() - t0)
+    retrain_elapsed = time.perf_counter() - started
+
+    # Cold load: empty in-process cache (the OS page cache is warm)
+    manager.models.clear()
+    cold = []
+    started = time.perf_counter()
+    for user in users:
+        t0 = time.perf_counter()
+        manager._get_model(user.user_id)
+        cold.append(time.perf_counter() - t0)
+    cold_elapsed = time.perf_counter() - started
+
+    # predict_risk straight on the manager, warm cache, no HTTP or context
+    from app.flatten_snapshot import snapshot_vector
+    probes = [(user.user_id, snapshot_vector(s)) for user in users for s in user.snapshots(5)]
+    direct = []
+    started = time.perf_counter()
+    for user_id, snapshot in probes:
+        t0 = time.perf_counter()
+        manager.predict_risk_vector(user_id, snapshot)
+        direct.append(time.perf_counter() - t0)
+    direct_elapsed = time.perf_counter() - started
+
+    return {
+        "retrain": summarize(retrain, retrain_elapsed),
+        "cold_model_load": summarize(cold, cold_elapsed),
+        "predict_risk_direct": summarize(direct, direct_elapsed),
+    }
+
+
+def build_workload(users, rng, n_predict: int, n_end_session: int, snapshots: int) -> dict:
+    # Payloads are generated up front so only request handling is timed
+    predict = [("/predict", users[rng.integers(len(users))].snapshots(1)[0]) for _ in range(n_predict)]
+    end_session = []
+    for _ in range(n_end_session):
+        user = users[rng.integers(len(users))]
+        end_session.append(("/end-session", {"user_id": user.user_id, "snapshots": user.snapshots(snapshots)}))
+    return {"predict": predict, "end_session": end_session}
+
+
+# -------------------------------
+# In-process driver
+# -------------------------------
+async def asgi_post(app, path: str, payload) -> int:
+    # payload: a dict, or an already encoded body
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 0), "server": ("benchmark", 80),
+    }
+    received = False
+    status = {"code": 500}
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+
+    await app(scope, receive, send)
+    return status["code"]
+
+
+async def drive_inprocess(app, requests, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(path, payload):
+        nonlocal errors
+        async with semaphore:
+            t0 = time.perf_counter()
+            code = await asgi_post(app, path, payload)
+            latencies.append(time.perf_counter() - t0)
+            if code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(path, payload) for path, payload in requests))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+def run_inprocess(workload: dict, concurrency: int) -> dict:
+    from app.main import app, training_scheduler
+
+    async def run():
+        await app.router.startup()
+        try:
+            results = {}
+            for name, requests in workload.items():
+                results[name] = await drive_inprocess(app, requests, concurrency)
+            return results
+        finally:
+            await app.router.shutdown()
+
+    results = asyncio.run(run())
+    training_scheduler.wait()
+    return results
+
+
+# -------------------------------
+# uvicorn driver
+# -------------------------------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir: str, port: int, workers: int) -> subprocess.Popen:
+    import requests
+
+    env = {**os.environ, "PYTHONPATH": REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {server.returncode}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return server
+        except requests.RequestException:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("uvicorn did not become ready within 60s")
+
+
+def drive_http(base_url: str, requests_list, concurrency: int) -> dict:
+    import requests
+
+    local = threading.local()
+
+    def one(item):
+        path, payload = item
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        t0 = time.perf_counter()
+        try:
+            ok = session.post(base_url + path, json=payload, timeout=60).status_code == 200
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - t0, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, requests_list))
+    elapsed = time.perf_counter() - started
+    return summarize([t for t, _ in outcomes], elapsed, sum(1 for _, ok in outcomes if not ok))
+
+
+def run_uvicorn(workdir: str, workload: dict, concurrency: int, workers: int) -> dict:
+    port = free_port()
+    server = start_server(workdir, port, workers)
+    try:
+        return {
+            name: drive_http(f"http://127.0.0.1:{port}", requests_list, concurrency)
+            for name, requests_list in workload.items()
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+# -------------------------------
+# Reporting
+# -------------------------------
+def print_table(title: str, results: dict):
+    print(f"\n{title}")
+    print(f"  {'benchmark':<22} {'count':>6} {'err':>4} {'per_s':>9} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9}")
+    for name, r in results.items():
+        if not r.get("count"):
+            continue
+        print(f"  {name:<22} {r['count']:>6} {r['errors']:>4} {r['throughput_per_s']:>9.1f} "
+              f"{r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f}")
+
+
+def print_comparison(previous: dict, current: dict):
+    print(f"\nvs {previous['meta'].get('git_commit')} ({previous['meta'].get('timestamp')})")
+    for section, results in current["results"].items():
+        for name, r in results.items():
+            old = previous["results"].get(section, {}).get(name)
+            if not old or not old.get("count") or not r.get("count"):
+                continue
+            deltas = " ".join(
+                f"{key[:-3]} {(r[key] - old[key]) / old[key]:+.1%}"
+                for key in ("p50_ms", "p95_ms", "p99_ms") if old[key]
+            )
+            label = f"{section}/{name}"
+            print(f"  {label:<32} {deltas}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load and latency benchmark with synthetic users")
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn", "both"], default="inprocess")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--sessions", type=int, default=6, help="sessions seeded per user before training")
+    parser.add_argument("--snapshots", type=int, default=20, help="snapshots per session")
+    parser.add_argument("--predict-requests", type=int, default=500)
+    parser.add_argument("--end-session-requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--server-workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="results JSON (default: benchmarks/results/bench_app_<time>_<commit>.json)")
+    parser.add_argument("--compare", metavar="JSON", help="print latency changes against an earlier run")
+    parser.add_argument("--keep", action="store_true", help="keep the working directory")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_app_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    print(f"🧪 Working directory: {workdir}")
+
+    try:
+        users = make_users(args.users, args.seed)
+        rng = np.random.default_rng(args.seed)
+
+        print(f"🌱 Seeding {args.users} users x {args.sessions} sessions x {args.snapshots} snapshots")
+        results = {"offline": seed_users(users, args.sessions, args.snapshots)}
+        print_table("offline", results["offline"])
+
+        workload = build_workload(users, rng, args.predict_requests, args.end_session_requests, args.snapshots)
+        if args.mode in ("inprocess", "both"):
+            results["inprocess"] = run_inprocess(workload, args.concurrency)
+            print_table(f"in-process, concurrency {args.concurrency}", results["inprocess"])
+        if args.mode in ("uvicorn", "both"):
+            # Fresh payloads: contexts carry timestamps, so replaying the
+            # in-process workload would look like time travel
+            workload = build_workload(users, rng, args.predict_requests, args.end_session_requests, args.snapshots)
+            results["uvicorn"] = run_uvicorn(workdir, workload, args.concurrency, args.server_workers)
+            print_table(f"uvicorn x{args.server_workers}, concurrency {args.concurrency}", results["uvicorn"])
+    finally:
+        os.chdir(cwd)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "benchmark": "bench_app",
+            "timestamp": datetime.now().isoformat(),
+            "git_commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"bench_app_{datetime.now():%Y%m%d-%H%M%S}_{commit or 'nogit'}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            print_comparison(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# Worker cold start: import time of app.main, and time-to-first-response of
+# a fresh uvicorn server, with and without background model prewarming.
+#
+#   python -m benchmarks.bench_cold_start [--users 20] [--runs 3]
+#
+# "ready" is the first 200 from GET /, "first predict" the latency of the
+# first /predict for a trained user sent right after that, and "predict
+# after prewarm" the first /predict for another user sent --settle seconds
+# later, when a prewarming worker has had time to load the models.
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.bench_app import REPO_ROOT, RESULTS_DIR, free_port, git_commit, seed_users
+from benchmarks.synthetic import make_users
+
+
+def measure_import(runs: int) -> dict:
+    code = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    env = {**os.environ, "PYTHONPATH": REPO_ROOT}
+    workdir = tempfile.mkdtemp(prefix="bench_import_")
+    try:
+        seconds = [
+            float(subprocess.check_output([sys.executable, "-c", code], cwd=workdir, env=env, text=True).split()[-1])
+            for _ in range(runs)
+        ]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {"median_ms": round(float(np.median(seconds)) * 1000, 1), "runs_ms": [round(s * 1000, 1) for s in seconds]}
+
+
+def measure_start(workdir: str, users, prewarm: int, settle: float) -> dict:
+    import requests
+
+    port = free_port()
+    env = {
+        **os.environ,
+        "PYTHONPATH": REPO_ROOT,
+        "PREWARM_MODELS": str(prewarm),
+        "PREWARM_DELAY": "0",
+    }
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with {server.returncode}")
+            if time.perf_counter() - started > 60:
+                raise RuntimeError("uvicorn did not become ready within 60s")
+            try:
+                if requests.get(base_url + "/", timeout=1).status_code == 200:
+                    break
+            except requests.RequestException:
+                time.sleep(0.01)
+        ready = time.perf_counter() - started
+
+        t0 = time.perf_counter()
+        requests.post(base_url + "/predict", json=users[0].snapshots(1)[0], timeout=60).raise_for_status()
+        first_predict = time.perf_counter() - t0
+
+        time.sleep(settle)
+        t0 = time.perf_counter()
+        requests.post(base_url + "/predict", json=users[1].snapshots(1)[0], timeout=60).raise_for_status()
+        settled_predict = time.perf_counter() - t0
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    return {
+        "ready_ms": round(ready * 1000, 1),
+        "first_predict_ms": round(first_predict * 1000, 1),
+        "first_response_total_ms": round((ready + first_predict) * 1000, 1),
+        "predict_after_settle_ms": round(settled_predict * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker import time and time-to-first-response")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--settle", type=float, default=2.0, help="seconds before the second /predict")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="results JSON (default: benchmarks/results/bench_cold_start_<time>_<commit>.json)")
+    args = parser.parse_args()
+
+    results = {"import_app_main": measure_import(args.runs)}
+    print(f"import app.main: {results['import_app_main']['median_ms']} ms (median of {args.runs})")
+
+    workdir = tempfile.mkdtemp(prefix="bench_cold_start_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        users = make_users(max(args.users, 2), args.seed)
+        print(f"🌱 Seeding {len(users)} trained users")
+        seed_users(users, sessions=6, snapshots=20)
+
+        for label, prewarm in (("no_prewarm", 0), ("prewarm", len(users))):
+            runs = [measure_start(workdir, users, prewarm, args.settle) for _ in range(args.runs)]
+            results[label] = {key: round(float(np.median([r[key] for r in runs])), 1) for key in runs[0]}
+            results[label]["runs"] = runs
+            r = results[label]
+            print(f"{label:<11} ready {r['ready_ms']:>7.1f} ms | first predict {r['first_predict_ms']:>7.1f} ms "
+                  f"| first response {r['first_response_total_ms']:>7.1f} ms "
+                  f"| predict after {args.settle:g}s {r['predict_after_settle_ms']:>6.1f} ms")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "benchmark": "bench_cold_start",
+            "timestamp": datetime.now().isoformat(),
+            "git_commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"bench_cold_start_{datetime.now():%Y%m%d-%H%M%S}_{commit or 'nogit'}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# Compare sklearn IsolationForest.decision_function with the compiled
+# flat-array evaluator used by ModelManager.predict_risk.
+#
+#   python -m benchmarks.bench_compiled_forest [--repeat 200]
+
+import argparse
+import time
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+from app.compiled_forest import CompiledForest
+from app.model_manager import FEATURES
+
+TOLERANCE = 1e-9
+
+
+def time_call(fn, X, repeat):
+    fn(X)  # warm up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(X)
+        timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--train-rows", type=int, default=100)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    X_train = rng.normal(size=(args.train_rows, len(FEATURES)))
+    model = IsolationForest(n_estimators=100, contamination=0.05, random_state=42).fit(X_train)
+    forest = CompiledForest.from_isolation_forest(model)
+
+    X_check = rng.normal(scale=2.0, size=(10_000, len(FEATURES)))
+    max_diff = np.abs(model.decision_function(X_check) - forest.decision_function(X_check)).max()
+    print(f"max |sklearn - compiled| over {len(X_check)} rows: {max_diff:.3e}")
+    if max_diff > TOLERANCE:
+        raise SystemExit(f"compiled forest differs from sklearn by more than {TOLERANCE}")
+
+    print(f"{'rows':>6} {'sklearn ms':>12} {'compiled ms':>12} {'speedup':>8}")
+    for n_rows in (1, 100):
+        X = rng.normal(size=(n_rows, len(FEATURES)))
+        sk_ms = time_call(model.decision_function, X, args.repeat)
+        compiled_ms = time_call(forest.decision_function, X, args.repeat)
+        print(f"{n_rows:>6} {sk_ms:>12.3f} {compiled_ms:>12.3f} {sk_ms / compiled_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# Request decoding and response encoding for large /end-session payloads.
+#
+#   python -m benchmarks.bench_decoding [--sizes 100,1000,5000] [--repeat 20]
+#
+# "legacy" is the path before the decoding layer: json.loads, a dict per
+# snapshot from chained .get() lookups, a DataFrame, then the FEATURES
+# matrix; responses through FastAPI's jsonable_encoder + json.dumps.
+# "fast" is orjson straight into the float matrix (app/flatten_snapshot.py)
+# and orjson responses. --e2e also times whole /end-session requests
+# in-process against a trained synthetic user.
+
+import os
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app.feature_store import FEATURES
+from benchmarks.bench_app import RESULTS_DIR, asgi_post, git_commit, seed_users, summarize
+from benchmarks.synthetic import make_users
+
+
+def legacy_flatten(data: dict) -> dict:
+    return {
+        "tap_duration": data.get("tap_data", {}).get("tap_duration"),
+        "inter_key_delay_avg": data.get("typing_data", {}).get("inter_key_delay_avg"),
+        "key_press_duration_avg": data.get("typing_data", {}).get("key_press_duration_avg"),
+        "typing_error_rate": data.get("typing_data", {}).get("typing_error_rate"),
+        "swipe_speed": data.get("swipe_data", {}).get("swipe_speed"),
+        "swipe_angle": data.get("swipe_data", {}).get("swipe_angle"),
+        "scroll_distance": data.get("scroll_data", {}).get("scroll_distance"),
+        "scroll_velocity": data.get("scroll_data", {}).get("scroll_velocity"),
+        "gyro_variance": data.get("sensor_data", {}).get("gyro_variance"),
+        "accelerometer_noise": data.get("sensor_data", {}).get("accelerometer_noise"),
+        "session_duration_sec": data.get("session_metadata", {}).get("session_duration_sec"),
+        "session_start_hour": data.get("session_metadata", {}).get("session_start_hour"),
+        "screen_transition_count": data.get("session_metadata", {}).get("screen_transition_count"),
+        "avg_dwell_time_per_screen": data.get("session_metadata", {}).get("avg_dwell_time_per_screen"),
+    }
+
+
+def legacy_decode(body: bytes) -> np.ndarray:
+    data = json.loads(body)
+    frame = pd.DataFrame([legacy_flatten(s) for s in data["snapshots"]])
+    return frame.reindex(columns=FEATURES).to_numpy(dtype=float)
+
+
+def fast_decode(body: bytes) -> np.ndarray:
+    from app.flatten_snapshot import loads, snapshot_matrix
+    return snapshot_matrix(loads(body)["snapshots"])
+
+
+def legacy_encode(response: dict) -> bytes:
+    from fastapi.encoders import jsonable_encoder
+    return json.dumps(jsonable_encoder(response), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def fast_encode(response: dict) -> bytes:
+    from app.flatten_snapshot import dumps
+    return dumps(response)
+
+
+def time_calls(fn, arg, repeat: int) -> dict:
+    seconds = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(arg)
+        seconds.append(time.perf_counter() - t0)
+    return summarize(seconds, sum(seconds))
+
+
+def end_session_body(user, size: int) -> bytes:
+    return json.dumps({"user_id": user.user_id, "snapshots": user.snapshots(size)}).encode()
+
+
+def run_micro(sizes, repeat: int, seed: int) -> dict:
+    user = make_users(1, seed)[0]
+    results = {}
+    for size in sizes:
+        body = end_session_body(user, size)
+        # Risk and context scores per snapshot, like the /end-session response
+        response = {
+            "message": "✅ Session 1 stored", "risk_score": 12.5,
+            "context_scores": [
+                {"geo_shift_score": 0.1, "network_shift_score": 0.0, "device_mismatch_score": 0.0} for _ in range(size)
+            ],
+            "training_status": None,
+        }
+        assert np.array_equal(legacy_decode(body), fast_decode(body), equal_nan=True)
+        assert json.loads(legacy_encode(response)) == json.loads(fast_encode(response))
+        results[size] = {
+            "body_kb": round(len(body) / 1024, 1),
+            "decode_legacy": time_calls(legacy_decode, body, repeat),
+            "decode_fast": time_calls(fast_decode, body, repeat),
+            "encode_legacy": time_calls(legacy_encode, response, repeat),
+            "encode_fast": time_calls(fast_encode, response, repeat),
+        }
+    return results
+
+
+def run_e2e(sizes, repeat: int, seed: int) -> dict:
+    workdir = tempfile.mkdtemp(prefix="bench_decoding_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        user = make_users(1, seed)[0]
+        seed_users([user], sessions=6, snapshots=20)
+        from app.main import app
+
+        async def run():
+            results = {}
+            for size in sizes:
+                bodies = [end_session_body(user, size) for _ in range(repeat)]
+                seconds, errors = [], 0
+                for body in bodies:
+                    t0 = time.perf_counter()
+                    errors += await asgi_post(app, "/end-session", body) != 200
+                    seconds.append(time.perf_counter() - t0)
+                results[size] = summarize(seconds, sum(seconds), errors)
+            return results
+
+        return asyncio.run(run())
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot decoding / response encoding for large sessions")
+    parser.add_argument("--sizes", default="100,1000,5000", help="snapshots per /end-session body")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--e2e", action="store_true", help="also time whole /end-session requests in-process")
+    parser.add_argument("--e2e-only", action="store_true", help="only the /end-session timing (e.g. on an older tree)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="results JSON (default: benchmarks/results/bench_decoding_<time>_<commit>.json)")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    results = {}
+    if not args.e2e_only:
+        results["micro"] = run_micro(sizes, args.repeat, args.seed)
+        print(f"{'snapshots':>9} {'body_kb':>8} | {'decode legacy':>13} {'decode fast':>11} | {'encode legacy':>13} {'encode fast':>11}  (p50 ms)")
+        for size, r in results["micro"].items():
+            print(f"{size:>9} {r['body_kb']:>8} | {r['decode_legacy']['p50_ms']:>13.2f} {r['decode_fast']['p50_ms']:>11.2f} "
+                  f"| {r['encode_legacy']['p50_ms']:>13.2f} {r['encode_fast']['p50_ms']:>11.2f}")
+    if args.e2e or args.e2e_only:
+        results["end_session"] = run_e2e(sizes, args.repeat, args.seed)
+        for size, r in results["end_session"].items():
+            print(f"/end-session {size:>5} snapshots: p50 {r['p50_ms']:>8.2f} ms  p95 {r['p95_ms']:>8.2f} ms  errors {r['errors']}")
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "benchmark": "bench_decoding",
+            "timestamp": datetime.now().isoformat(),
+            "git_commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"bench_decoding_{datetime.now():%Y%m%d-%H%M%S}_{commit or 'nogit'}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Forest size auto-tuning (MODEL_AUTOTUNE=1) on synthetic users: the
+# configuration chosen per user, its agreement with the 100-tree forest,
+# the tuning cost added to a retrain, and single-row scoring latency of the
+# chosen forests against the 100-tree default.
+#
+#   python -m benchmarks.bench_forest_tuning [--users 20] [--budget-us 250]
+
+import os
+import json
+import argparse
+import platform
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+
+from app.compiled_forest import CompiledForest
+from app.forest_tuning import (
+    AUTOTUNE_MIN_AGREEMENT, REFERENCE_MAX_SAMPLES, REFERENCE_N_ESTIMATORS,
+    fit_forest, single_row_latency_us, tune_forest,
+)
+from benchmarks.bench_app import RESULTS_DIR, git_commit
+from benchmarks.synthetic import make_users
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency-budgeted forest size selection")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--train-rows", type=int, default=100, help="training window, as _train_model uses")
+    parser.add_argument("--older-rows", type=int, default=200, help="older clean rows also held out")
+    parser.add_argument("--budget-us", type=float, default=250.0)
+    parser.add_argument("--min-agreement", type=float, default=AUTOTUNE_MIN_AGREEMENT)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="results JSON (default: benchmarks/results/bench_forest_tuning_<time>_<commit>.json)")
+    args = parser.parse_args()
+
+    per_user = []
+    for user in make_users(args.users, args.seed):
+        rows = user.feature_rows(args.older_rows + args.train_rows)
+        older, window = rows[:args.older_rows], rows[args.older_rows:]
+        tuning = tune_forest(window, older, min_agreement=args.min_agreement, latency_budget_us=args.budget_us)
+
+        # Latency of the forest each configuration would actually serve
+        mean, scale = window.mean(axis=0), window.std(axis=0)
+        scaled = (window - mean) / np.where(scale > 0, scale, 1.0)
+        default = CompiledForest.from_isolation_forest(fit_forest(scaled, REFERENCE_N_ESTIMATORS, REFERENCE_MAX_SAMPLES))
+        tuned = CompiledForest.from_isolation_forest(fit_forest(scaled, tuning["n_estimators"], tuning["max_samples"]))
+        chosen = next((c for c in tuning["candidates"]
+                       if (c["n_estimators"], c["max_samples"]) == (tuning["n_estimators"], tuning["max_samples"])), {})
+        per_user.append({
+            "user_id": user.user_id,
+            "n_estimators": tuning["n_estimators"],
+            "max_samples": tuning["max_samples"],
+            "reason": tuning["reason"],
+            "agreement": chosen.get("agreement"),
+            "tuning_sec": tuning["duration_sec"],
+            "default_latency_us": round(single_row_latency_us(default, scaled, 200), 1),
+            "tuned_latency_us": round(single_row_latency_us(tuned, scaled, 200), 1),
+        })
+
+    configs = Counter(f"{u['n_estimators']}x{u['max_samples']}" for u in per_user)
+    default_us = float(np.median([u["default_latency_us"] for u in per_user]))
+    tuned_us = float(np.median([u["tuned_latency_us"] for u in per_user]))
+    results = {
+        "configs": dict(configs),
+        "median_agreement": float(np.median([u["agreement"] for u in per_user if u["agreement"] is not None] or [1.0])),
+        "median_tuning_sec": float(np.median([u["tuning_sec"] for u in per_user])),
+        "default_latency_us_p50": default_us,
+        "tuned_latency_us_p50": tuned_us,
+        "users": per_user,
+    }
+    print(f"chosen configurations (trees x max_samples): {dict(configs.most_common())}")
+    print(f"median agreement with the 100-tree forest: {results['median_agreement']:.4f} "
+          f"(threshold {args.min_agreement})")
+    print(f"single-row decision_function p50: default {default_us:.1f} us, tuned {tuned_us:.1f} us "
+          f"({default_us / tuned_us if tuned_us else float('nan'):.2f}x)")
+    print(f"tuning adds {results['median_tuning_sec']:.2f} s per retrain (median)")
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "benchmark": "bench_forest_tuning",
+            "timestamp": datetime.now().isoformat(),
+            "git_commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"bench_forest_tuning_{datetime.now():%Y%m%d-%H%M%S}_{commit or 'nogit'}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
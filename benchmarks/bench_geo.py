@@ -0,0 +1,71 @@
+# Accuracy and throughput of the geo distance backends used for
+# impossible-travel scoring.
+#
+#   python -m benchmarks.bench_geo [--pairs 20000]
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.geo import geodesic_km, haversine_km, geo_shift_scores
+
+
+def random_session(rng, n_points, spread_deg):
+    # A random walk of location contexts, one per minute
+    start = datetime(2025, 7, 11, 9, 0, 0)
+    lat = 28.6 + np.cumsum(rng.normal(0, spread_deg, n_points))
+    lon = 77.2 + np.cumsum(rng.normal(0, spread_deg, n_points))
+    return [
+        {"location": {
+            "latitude": float(np.clip(la, -89, 89)),
+            "longitude": float((lo + 180) % 360 - 180),
+            "timestamp": (start + timedelta(minutes=i)).isoformat(),
+        }}
+        for i, (la, lo) in enumerate(zip(lat, lon))
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pairs", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    lat1, lat2 = rng.uniform(-85, 85, (2, args.pairs))
+    lon1, lon2 = rng.uniform(-180, 180, (2, args.pairs))
+
+    start = time.perf_counter()
+    exact = geodesic_km(lat1, lon1, lat2, lon2)
+    geodesic_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    approx = haversine_km(lat1, lon1, lat2, lon2)
+    haversine_s = time.perf_counter() - start
+
+    relative = np.abs(approx - exact) / np.maximum(exact, 1e-9)
+    print(f"distance, {args.pairs} global pairs")
+    print(f"  geodesic : {args.pairs / geodesic_s:>12,.0f} pairs/s")
+    print(f"  haversine: {args.pairs / haversine_s:>12,.0f} pairs/s ({geodesic_s / haversine_s:.0f}x)")
+    print(f"  relative error: median {np.median(relative):.4%}, max {relative.max():.4%}")
+
+    # Effect on the scores we actually serve: a local session and a
+    # session with large jumps, scored with each backend
+    for label, spread in (("local session", 0.01), ("travelling session", 2.0)):
+        contexts = random_session(rng, 500, spread)
+        previous = [None] + contexts[:-1]
+        timings = {}
+        scores = {}
+        for backend in ("geodesic", "haversine"):
+            start = time.perf_counter()
+            scores[backend] = geo_shift_scores(previous, contexts, backend=backend)
+            timings[backend] = time.perf_counter() - start
+        diff = np.abs(np.round(scores["geodesic"], 2) - np.round(scores["haversine"], 2))
+        print(f"{label}, 500 snapshots")
+        print(f"  geodesic {timings['geodesic'] * 1000:.1f} ms, haversine {timings['haversine'] * 1000:.1f} ms")
+        print(f"  geo_shift_score difference: max {diff.max():.2f}, mean {diff.mean():.3f} points")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# IP -> ASN lookups through the compiled, memory-mapped prefix trie used for
+# network shift scoring.
+#
+#   python -m benchmarks.bench_ip_index [--ranges 200000] [--lookups 200000]
+#   python -m benchmarks.bench_ip_index --dataset ip2asn-combined.tsv.gz
+#
+# Without --dataset a synthetic ip2asn file is generated: non-overlapping
+# IPv4 and IPv6 ranges (a quarter not aligned to CIDR boundaries), 1 in 5
+# of them IPv6. Lookups are checked against a binary search over the
+# source ranges, then timed uncached and through the per-process LRU.
+# benchmarks/fixtures/ip2asn-sample.tsv is a small real-shaped dataset.
+
+import os
+import json
+import time
+import bisect
+import shutil
+import argparse
+import platform
+import tempfile
+import ipaddress
+from datetime import datetime
+
+import numpy as np
+
+from app.ip_index import IPIndex, build_index, read_ip2asn
+from benchmarks.bench_app import RESULTS_DIR, git_commit
+
+
+def synthetic_dataset(path: str, n_ranges: int, rng) -> None:
+    # Ranges are carved out of disjoint slots of the address space, so they
+    # never overlap; sizes vary from a single address to a /12 (IPv4)
+    n_v6 = n_ranges // 5
+    n_v4 = n_ranges - n_v6
+    with open(path, "w") as f:
+        for version, count, bits in ((4, n_v4, 32), (6, n_v6, 128)):
+            slot_bits = bits - int(np.ceil(np.log2(count + 1)))
+            address_class = ipaddress.IPv4Address if version == 4 else ipaddress.IPv6Address
+            for slot in range(count):
+                base = slot << slot_bits
+                if version == 4:
+                    size_bits = int(rng.integers(0, min(slot_bits, 20) + 1))
+                else:
+                    size_bits = int(rng.integers(64, min(slot_bits, 96) + 1))
+                first, last = base, base + (1 << size_bits) - 1
+                if rng.random() < 0.25 and size_bits > 2:
+                    # Not CIDR-aligned
+                    first += int(rng.integers(1, 1 << min(size_bits - 1, 62)))
+                asn = int(rng.integers(1, 400000))
+                f.write(f"{address_class(first)}\t{address_class(last)}\t{asn}\tZZ\tAS{asn}-SYNTHETIC\n")
+
+
+def reference(path: str):
+    # Sorted (first, last, asn) per family for a bisect-based check
+    tables = {4: [], 6: []}
+    for first, last, asn, _, _ in read_ip2asn(path):
+        first_ip = ipaddress.ip_address(first)
+        tables[first_ip.version].append((int(first_ip), int(ipaddress.ip_address(last)), asn))
+    for table in tables.values():
+        table.sort()
+    starts = {version: [r[0] for r in table] for version, table in tables.items()}
+
+    def lookup(ip: str):
+        address = ipaddress.ip_address(ip)
+        table, value = tables[address.version], int(address)
+        i = bisect.bisect_right(starts[address.version], value) - 1
+        return table[i][2] if i >= 0 and table[i][1] >= value else None
+
+    return tables, lookup
+
+
+def sample_ips(tables: dict, n: int, rng) -> list:
+    # 90% inside a range, the rest anywhere (mostly unrouted)
+    ips = []
+    v4, v6 = tables[4], tables[6]
+    for _ in range(n):
+        roll = rng.random()
+        if roll < 0.9 and (v4 or v6):
+            version = 6 if v6 and (not v4 or rng.random() < len(v6) / (len(v4) + len(v6))) else 4
+            table = tables[version]
+            first, last, _ = table[int(rng.integers(len(table)))]
+            value = first + int(rng.integers(0, min(last - first, 2 ** 62) + 1))
+        elif roll < 0.95:
+            version, value = 4, int(rng.integers(0, 2 ** 32))
+        else:
+            version, value = 6, int(rng.integers(0, 2 ** 62)) << 66
+        ips.append(str(ipaddress.IPv4Address(value) if version == 4 else ipaddress.IPv6Address(value)))
+    return ips
+
+
+def timed(fn, ips) -> float:
+    start = time.perf_counter()
+    for ip in ips:
+        fn(ip)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compiled IP index build size and lookup throughput")
+    parser.add_argument("--dataset", help="ip2asn TSV (default: a synthetic one)")
+    parser.add_argument("--ranges", type=int, default=200000, help="synthetic ranges")
+    parser.add_argument("--lookups", type=int, default=200000)
+    parser.add_argument("--distinct", type=int, default=2000, help="distinct IPs for the cached run")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="results JSON (default: benchmarks/results/bench_ip_index_<time>_<commit>.json)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    workdir = tempfile.mkdtemp(prefix="bench_ip_index_")
+    try:
+        dataset = args.dataset
+        if dataset is None:
+            dataset = os.path.join(workdir, "ip2asn.tsv")
+            synthetic_dataset(dataset, args.ranges, rng)
+
+        compiled = os.path.join(workdir, "ip2asn.bin")
+        start = time.perf_counter()
+        built = build_index(dataset, compiled)
+        build_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index = IPIndex(compiled)
+        open_ms = (time.perf_counter() - start) * 1000
+
+        tables, reference_lookup = reference(dataset)
+        ips = sample_ips(tables, args.lookups, rng)
+        mismatches = 0
+        for ip in ips[:20000]:
+            found = index._lookup(ip)
+            if (found["asn"] if found else None) != reference_lookup(ip):
+                mismatches += 1
+
+        uncached_s = timed(index._lookup, ips)
+        reference_s = timed(reference_lookup, ips)
+        hot = [ips[int(i)] for i in rng.integers(min(args.distinct, len(ips)), size=len(ips))]
+        timed(index.lookup, hot)  # fill the LRU
+        cached_s = timed(index.lookup, hot)
+        hits = sum(1 for ip in ips if index._lookup(ip))
+        index.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "ranges": built["ranges"],
+        "nodes": built["nodes"],
+        "index_mb": round(built["bytes"] / 1e6, 2),
+        "build_s": round(build_s, 2),
+        "open_ms": round(open_ms, 3),
+        "mismatches": mismatches,
+        "resolved_fraction": round(hits / len(ips), 4),
+        "uncached_lookups_per_s": round(len(ips) / uncached_s),
+        "uncached_us_per_lookup": round(uncached_s / len(ips) * 1e6, 2),
+        "bisect_reference_lookups_per_s": round(len(ips) / reference_s),
+        "cached_lookups_per_s": round(len(hot) / cached_s),
+    }
+    print(f"{results['ranges']} ranges -> {results['nodes']} nodes, {results['index_mb']} MB, "
+          f"built in {results['build_s']} s, opened in {results['open_ms']} ms")
+    print(f"  uncached : {results['uncached_lookups_per_s']:>12,} lookups/s ({results['uncached_us_per_lookup']} us)")
+    print(f"  cached   : {results['cached_lookups_per_s']:>12,} lookups/s ({args.distinct} distinct IPs)")
+    print(f"  bisect   : {results['bisect_reference_lookups_per_s']:>12,} lookups/s (in-memory reference)")
+    print(f"  mismatches vs reference: {mismatches} of {min(20000, len(ips))}, resolved {results['resolved_fraction']:.1%}")
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "benchmark": "bench_ip_index",
+            "timestamp": datetime.now().isoformat(),
+            "git_commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"bench_ip_index_{datetime.now():%Y%m%d-%H%M%S}_{commit or 'nogit'}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# User-affinity sharding: model cache hit rate and /predict latency for
+# several single-worker uvicorn nodes on one machine, first with requests
+# spread randomly over the nodes (what gunicorn's shared socket does), then
+# through app.router's consistent-hash routing. Also reports how many users
+# move when a node joins or leaves the ring.
+#
+#   python -m benchmarks.bench_sharding [--nodes 3] [--users 60] [--requests 600]
+#
+# --cache-size defaults to a bit more than one shard's users, so a node can
+# keep its own users hot but not everyone's.
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+import numpy as np
+
+from app.sharding import HashRing, moved_fraction, ring_hash
+from benchmarks.bench_app import REPO_ROOT, RESULTS_DIR, drive_http, free_port, git_commit, seed_users, start_server
+from benchmarks.synthetic import make_users
+
+
+def start_router(workdir: str, port: int, nodes) -> subprocess.Popen:
+    import requests
+
+    env = {**os.environ, "PYTHONPATH": REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    router = subprocess.Popen(
+        [sys.executable, "-m", "app.router", "--host", "127.0.0.1", "--port", str(port), "--nodes", ",".join(nodes)],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if router.poll() is not None:
+            raise RuntimeError(f"router exited with {router.returncode}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return router
+        except requests.RequestException:
+            time.sleep(0.2)
+    router.terminate()
+    raise RuntimeError("router did not become ready within 60s")
+
+
+def cache_stats(nodes) -> dict:
+    import requests
+
+    stats = {}
+    for node in nodes:
+        cache = requests.get(node + "/model-cache-stats", timeout=10).json()
+        stats[node] = {key: cache[key] for key in ("hits", "misses", "entries")}
+    return stats
+
+
+def hit_rate(stats: dict) -> float:
+    hits = sum(s["hits"] for s in stats.values())
+    misses = sum(s["misses"] for s in stats.values())
+    return round(hits / (hits + misses), 4) if hits + misses else 0.0
+
+
+def run_phase(workdir: str, n_nodes: int, workload, concurrency: int, routed: bool, rng) -> dict:
+    servers, nodes = [], []
+    try:
+        for _ in range(n_nodes):
+            port = free_port()
+            servers.append(start_server(workdir, port, 1))
+            nodes.append(f"http://127.0.0.1:{port}")
+
+        if routed:
+            router_port = free_port()
+            servers.append(start_router(workdir, router_port, nodes))
+            base = f"http://127.0.0.1:{router_port}"
+            items = [(base + "/predict", payload) for payload in workload]
+        else:
+            # No affinity: every request picks a node at random
+            items = [(nodes[rng.integers(n_nodes)] + "/predict", payload) for payload in workload]
+
+        latency = drive_http("", items, concurrency)
+        stats = cache_stats(nodes)
+    finally:
+        for server in servers:
+            server.terminate()
+        for server in servers:
+            server.wait(timeout=30)
+
+    return {"predict": latency, "cache_hit_rate": hit_rate(stats), "nodes": list(stats.values())}
+
+
+def ring_movement(n_nodes: int, n_keys: int = 20000) -> dict:
+    # Users moved by one node joining / leaving, against mod-N hashing
+    keys = [f"user_{i}" for i in range(n_keys)]
+    nodes = [f"node{i}" for i in range(n_nodes)]
+
+    before = HashRing(nodes)
+    grown = HashRing(nodes + [f"node{n_nodes}"])
+    shrunk = HashRing(nodes[:-1])
+    owners = [before.node_for(k) for k in keys]
+
+    def observed(ring: HashRing) -> float:
+        return round(sum(1 for k, o in zip(keys, owners) if ring.node_for(k) != o) / n_keys, 4)
+
+    modulo_moved = sum(1 for k in keys if ring_hash(k) % n_nodes != ring_hash(k) % (n_nodes + 1)) / n_keys
+    shares = list(before.shares().values())
+    return {
+        "keyspace_share_min": round(min(shares), 4),
+        "keyspace_share_max": round(max(shares), 4),
+        "add_node_moved": observed(grown),
+        "add_node_moved_exact": round(moved_fraction(before, grown), 4),
+        "remove_node_moved": observed(shrunk),
+        "remove_node_moved_exact": round(moved_fraction(before, shrunk), 4),
+        "ideal_add_moved": round(1 / (n_nodes + 1), 4),
+        "modulo_add_moved": round(modulo_moved, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache locality with and without user-affinity routing")
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--users", type=int, default=60)
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--cache-size", type=int, help="MODEL_CACHE_SIZE per node (default: 1.2x users per node)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="results JSON (default: benchmarks/results/bench_sharding_<time>_<commit>.json)")
+    args = parser.parse_args()
+
+    cache_size = args.cache_size or int(np.ceil(1.2 * args.users / args.nodes))
+    os.environ["MODEL_CACHE_SIZE"] = str(cache_size)
+    rng = np.random.default_rng(args.seed)
+
+    results = {"ring": ring_movement(args.nodes)}
+    r = results["ring"]
+    print(f"ring: add a node moves {r['add_node_moved']:.1%} of users (ideal {r['ideal_add_moved']:.1%}, "
+          f"mod-N hashing {r['modulo_add_moved']:.1%}); remove one moves {r['remove_node_moved']:.1%}")
+
+    workdir = tempfile.mkdtemp(prefix="bench_sharding_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        users = make_users(args.users, args.seed)
+        print(f"🌱 Seeding {len(users)} trained users")
+        seed_users(users, sessions=6, snapshots=20)
+        workload = [users[i].snapshots(1)[0] for i in rng.integers(len(users), size=args.requests)]
+
+        for label, routed in (("random", False), ("affinity", True)):
+            results[label] = run_phase(workdir, args.nodes, workload, args.concurrency, routed, rng)
+            p = results[label]["predict"]
+            print(f"{label:<9} cache hit rate {results[label]['cache_hit_rate']:>6.1%} | predict p50 {p['p50_ms']:>6.1f} ms "
+                  f"p99 {p['p99_ms']:>6.1f} ms | {p['throughput_per_s']:>6.1f} req/s")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "benchmark": "bench_sharding",
+            "timestamp": datetime.now().isoformat(),
+            "git_commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {**vars(args), "cache_size": cache_size},
+        },
+        "results": results,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"bench_sharding_{datetime.now():%Y%m%d-%H%M%S}_{commit or 'nogit'}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Synthetic users for the benchmarks: each user has their own typical
+# behaviour (a mean per feature) and a home location / network, and emits
+# snapshots in the same nested shape the mobile client posts.
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.feature_store import FEATURES
+from app.flatten_snapshot import SNAPSHOT_GROUPS
+
+# (low, high) range a user's typical value is drawn from, and the relative
+# per-snapshot noise around it
+FEATURE_RANGES = {
+    "tap_duration": (0.08, 0.30, 0.20),
+    "swipe_speed": (300.0, 1500.0, 0.25),
+    "swipe_angle": (0.0, 360.0, 0.15),
+    "scroll_distance": (100.0, 2000.0, 0.30),
+    "scroll_velocity": (100.0, 3000.0, 0.30),
+    "inter_key_delay_avg": (0.10, 0.40, 0.15),
+    "key_press_duration_avg": (0.05, 0.15, 0.15),
+    "typing_error_rate": (0.0, 0.10, 0.40),
+    "gyro_variance": (0.001, 0.05, 0.30),
+    "accelerometer_noise": (0.01, 0.20, 0.30),
+    "screen_transition_count": (1.0, 20.0, 0.30),
+    "avg_dwell_time_per_screen": (2.0, 60.0, 0.30),
+    "session_start_hour": (0.0, 23.0, 0.05),
+    "session_duration_sec": (30.0, 1800.0, 0.30),
+}
+INTEGER_FEATURES = {"screen_transition_count", "session_start_hour"}
+assert set(FEATURE_RANGES) == set(FEATURES)
+
+HOME_CITIES = [(28.61, 77.21), (19.08, 72.88), (12.97, 77.59), (40.71, -74.01), (51.51, -0.13), (35.68, 139.69)]
+DEVICES = [("Android", "13", "Pixel 6"), ("Android", "14", "Galaxy S23"), ("iOS", "17.5", "iPhone 14")]
+ISPS = ["Jio", "Airtel", "Vodafone", "Comcast", "BT"]
+
+
+class SyntheticUser:
+    def __init__(self, user_id: str, rng: np.random.Generator):
+        self.user_id = user_id
+        self.rng = rng
+        self.means = np.array([rng.uniform(low, high) for low, high, _ in FEATURE_RANGES.values()])
+        self.noise = np.array([noise for _, _, noise in FEATURE_RANGES.values()])
+        os_name, os_version, device_model = DEVICES[rng.integers(len(DEVICES))]
+        self.device = {"os": os_name, "os_version": os_version, "device_model": device_model}
+        self.home = HOME_CITIES[rng.integers(len(HOME_CITIES))]
+        self.subnet = f"{rng.integers(11, 223)}.{rng.integers(0, 256)}"
+        self.isp = ISPS[rng.integers(len(ISPS))]
+        self.clock = datetime(2025, 7, 1, 9, 0, 0)
+
+    def feature_rows(self, n: int, drift: float = 0.0) -> np.ndarray:
+        # drift shifts every feature by that many noise-widths (anomalies)
+        scale = np.maximum(np.abs(self.means) * self.noise, 1e-3)
+        rows = self.means + (self.rng.normal(0, 1, (n, len(FEATURE_RANGES))) + drift) * scale
+        for i, name in enumerate(FEATURE_RANGES):
+            if name in INTEGER_FEATURES:
+                rows[:, i] = np.round(rows[:, i])
+        return np.abs(rows)
+
+    def context(self) -> dict:
+        self.clock += timedelta(seconds=int(self.rng.integers(20, 90)))
+        return {
+            "device_info": dict(self.device),
+            "network_info": {
+                "network_type": "wifi" if self.rng.random() < 0.8 else "mobile",
+                "ip_address": f"{self.subnet}.{self.rng.integers(0, 256)}.{self.rng.integers(1, 255)}",
+                "isp": self.isp,
+            },
+            "location": {
+                "latitude": self.home[0] + float(self.rng.normal(0, 0.01)),
+                "longitude": self.home[1] + float(self.rng.normal(0, 0.01)),
+                "timestamp": self.clock.isoformat(),
+            },
+        }
+
+    def snapshots(self, n: int, drift: float = 0.0) -> list:
+        snapshots = []
+        for row in self.feature_rows(n, drift):
+            values = dict(zip(FEATURE_RANGES, row.tolist()))
+            snapshot = {"user_id": self.user_id, "context": self.context()}
+            for group, names in SNAPSHOT_GROUPS.items():
+                snapshot[group] = {name: values[name] for name in names}
+            snapshots.append(snapshot)
+        return snapshots
+
+
+def make_users(n_users: int, seed: int = 42) -> list:
+    rng = np.random.default_rng(seed)
+    return [SyntheticUser(f"bench_user_{i:04d}", np.random.default_rng(rng.integers(2 ** 32))) for i in range(n_users)]
@@ -1,4 +1,22 @@
 #!/bin/bash
 
+# SHARD_WORKERS=N: N single-worker uvicorn processes behind the
+# consistent-hash router, so each user's requests (and model) stay on one
+# process
+if [ "${SHARD_WORKERS:-0}" -gt 0 ]; then
+    NODES=""
+    for i in $(seq 1 "$SHARD_WORKERS"); do
+        NODES="$NODES,http://127.0.0.1:$(( ${SHARD_BASE_PORT:-9000} + i ))"
+    done
+    NODES="${NODES#,}"
+    for i in $(seq 1 "$SHARD_WORKERS"); do
+        NODE_PORT=$(( ${SHARD_BASE_PORT:-9000} + i ))
+        # SHARD_SELF lets each node prewarm only the users it owns
+        SHARD_NODES="$NODES" SHARD_SELF="http://127.0.0.1:$NODE_PORT" \
+            uvicorn app.main:app --host 127.0.0.1 --port "$NODE_PORT" &
+    done
+    exec python -m app.router --port "$PORT" --nodes "$NODES"
+fi
+
 # Run the FastAPI app using gunicorn with uvicorn workers
 exec gunicorn -w 4 -k uvicorn.workers.UvicornWorker app.main:app --bind 0.0.0.0:$PORT
\ No newline at end of file
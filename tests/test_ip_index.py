@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+from app import analyze_context
+from app.analyze_context import compute_network_shift_score
+from app.ip_index import IPIndex, build_index
+
+FIXTURE = os.path.join(os.path.dirname(__file__), os.pardir, "benchmarks", "fixtures", "ip2asn-sample.tsv")
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("ip_index") / "ip2asn.bin")
+    build_index(FIXTURE, path)
+    ip_index = IPIndex(path)
+    yield ip_index
+    ip_index.close()
+
+
+def net(ip, network_type="wifi"):
+    return {"ip_address": ip, "network_type": network_type}
+
+
+def test_ipv4_lookup(index):
+    assert index.lookup("8.8.8.8") == {"asn": 15169, "country": "US", "as_name": "GOOGLE", "prefix": "8.8.8.0/24"}
+    # A /12 range and one that is not CIDR-aligned
+    assert index.lookup("49.40.1.1")["prefix"] == "49.32.0.0/12"
+    assert index.lookup("203.0.113.50")["prefix"] == "203.0.113.10-203.0.113.200"
+    assert index.lookup("203.0.113.5") is None
+
+
+def test_ipv6_lookup(index):
+    google = index.lookup("2001:4860:4860::8888")
+    assert (google["asn"], google["prefix"]) == (15169, "2001:4860::/32")
+    jio = index.lookup("2405:205:1::1")
+    assert (jio["asn"], jio["country"], jio["prefix"]) == (55836, "IN", "2405:200::/29")
+
+
+def test_ipv4_mapped_lookup(index):
+    assert index.lookup("::ffff:8.8.8.8") == index.lookup("8.8.8.8")
+    assert index.lookup("::ffff:10.1.2.3") is None
+
+
+@pytest.mark.parametrize("ip", ["10.1.2.3", "192.168.1.1", "192.0.2.1", "2001:db9::1", "not-an-ip", ""])
+def test_unresolved_lookup(index, ip):
+    # Unrouted (AS 0), missing from the dataset, or not an address
+    assert index.lookup(ip) is None
+
+
+@pytest.mark.parametrize("last_ip, current_ip, expected", [
+    ("8.8.8.1", "8.8.8.200", 0.0),          # same range
+    ("8.8.8.8", "8.8.4.4", 30.0),           # prefix change within one ASN
+    ("8.8.8.8", "1.1.1.1", 50.0),           # prefix and ASN change
+    ("2405:200::1", "2405:205::1", 0.0),    # one IPv6 range
+    ("::ffff:8.8.8.8", "8.8.8.9", 0.0),     # IPv4-mapped resolves like IPv4
+])
+def test_network_shift_with_index(monkeypatch, index, last_ip, current_ip, expected):
+    monkeypatch.setattr(analyze_context, "get_ip_index", lambda: index)
+    assert compute_network_shift_score(net(last_ip), net(current_ip)) == expected
+
+
+@pytest.mark.parametrize("last_ip, current_ip, expected", [
+    ("10.0.0.1", "10.0.9.1", 0.0),          # unrouted, same /16
+    ("10.0.0.1", "10.1.0.1", 30.0),         # unrouted, different /16
+    ("8.8.8.8", "192.168.1.1", 30.0),       # only one side resolves: no ASN signal
+    ("2001:db9::1", "2001:db9:0:1::1", 0.0),  # unresolved IPv6, same /48
+])
+def test_network_shift_falls_back_to_subnet(monkeypatch, index, last_ip, current_ip, expected):
+    monkeypatch.setattr(analyze_context, "get_ip_index", lambda: index)
+    assert compute_network_shift_score(net(last_ip), net(current_ip)) == expected
+
+
+def test_network_shift_without_index(monkeypatch):
+    monkeypatch.setattr(analyze_context, "get_ip_index", lambda: None)
+    assert compute_network_shift_score(net("8.8.8.8"), net("8.8.4.4")) == 0.0
+    assert compute_network_shift_score(net("8.8.8.8"), net("1.1.1.1")) == 30.0
+    assert compute_network_shift_score(net("8.8.8.8"), net("1.1.1.1", "mobile")) == 80.0